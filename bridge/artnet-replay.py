@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Art-Net Replay
+Sends a recording made with artnet-to-serial-sender.py --record back over
+UDP, with its original timing or faster
+
+Usage:
+    python artnet-replay.py RECORDING [options]
+
+Examples:
+    python artnet-replay.py show.artrec
+    python artnet-replay.py show.artrec --speed 4
+    python artnet-replay.py show.artrec --max --loop 10
+    python artnet-replay.py show.artrec --target 192.168.1.50
+"""
+
+import argparse
+import socket
+import time
+
+from artnet_recording import ArtnetRecording, RecordingError
+from bridge_util import wait_until
+
+ARTNET_PORT = 6454
+
+
+def replay(recording: ArtnetRecording, sock: socket.socket, target, speed: float = 1.0):
+    """Send every packet of a recording once
+
+    speed 0 sends as fast as possible. Returns (packets, seconds taken,
+    worst lateness in seconds).
+    """
+    packets = 0
+    worst_late = 0.0
+    start = time.perf_counter()
+    for timestamp, packet in recording:
+        if speed:
+            due = start + timestamp / 1e9 / speed
+            wait_until(due)
+            worst_late = max(worst_late, time.perf_counter() - due)
+        sock.sendto(packet, target)
+        packets += 1
+    return packets, time.perf_counter() - start, worst_late
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Replay a recorded Art-Net session over UDP")
+    parser.add_argument("recording", help="file written by artnet-to-serial-sender.py --record")
+    parser.add_argument("--target", default="127.0.0.1",
+                        help="address to send to (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=ARTNET_PORT,
+                        help="UDP port to send to (default: %(default)s)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="playback rate, 2 plays twice as fast (default: %(default)s)")
+    parser.add_argument("--max", action="store_true",
+                        help="send as fast as possible, ignoring the recorded timing")
+    parser.add_argument("--loop", type=int, default=1,
+                        help="times to play the recording, 0 repeats until stopped (default: %(default)s)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        recording = ArtnetRecording(args.recording)
+    except (OSError, RecordingError) as e:
+        print(f"Could not open recording: {e}")
+        return
+
+    speed = 0 if args.max else args.speed
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    target = (args.target, args.port)
+
+    print(f"Replaying {args.recording} to {args.target}:{args.port} "
+          f"at {'max speed' if args.max else f'{args.speed:g}x'}")
+    print("Press Ctrl+C to stop\n")
+
+    total_packets = 0
+    total_time = 0.0
+    runs = 0
+    try:
+        while not args.loop or runs < args.loop:
+            packets, elapsed, worst_late = replay(recording, sock, target, speed)
+            runs += 1
+            total_packets += packets
+            total_time += elapsed
+            print(f"Run {runs}: {packets} packets in {elapsed:.2f}s "
+                  f"({packets / max(elapsed, 1e-9):.0f} packets/s, worst lateness {worst_late * 1000:.2f} ms)")
+    except KeyboardInterrupt:
+        print("\nStopping replay...")
+    finally:
+        sock.close()
+        recording.close()
+
+    if runs > 1:
+        print(f"Total: {total_packets} packets in {total_time:.2f}s over {runs} runs")
+
+if __name__ == "__main__":
+    main()
@@ -4,64 +4,166 @@ Artnet to OPC Serial Bridge
 Receives Artnet data from Resolume and forwards it via OPC over Serial to Teensy
 
 Usage:
-    python artnet-to-serial-sender.py [COM_PORT]
+    python artnet-to-serial-sender.py [COM_PORT] [options]
 
 Examples:
     python artnet-to-serial-sender.py COM3
     python artnet-to-serial-sender.py /dev/ttyACM0
+    python artnet-to-serial-sender.py --scan
+    python artnet-to-serial-sender.py COM3 --delta
+    python artnet-to-serial-sender.py COM3 --host-color --gamma 2.2
+    python artnet-to-serial-sender.py COM3 --record show.artrec
+    python artnet-to-serial-sender.py COM3 --host-color --capture-sd output.bin
+    python artnet-to-serial-sender.py --outputs COM3:2 COM4:1
+    python artnet-to-serial-sender.py COM3 --rate-control
+    python artnet-to-serial-sender.py COM3 --ack-window 2
+    python artnet-to-serial-sender.py COM3 --cadence 30
+    python artnet-to-serial-sender.py COM3 --upconvert 3 --upconvert-motion
+    python artnet-to-serial-sender.py --help
+
+Frames are released on ArtSync when the sender uses it, otherwise when all
+universes arrived, a newer Art-Net sequence number shows up, or the frame
+deadline passes (missing universes then repeat the previous frame).
 """
 
 import serial
 import serial.tools.list_ports
+import argparse
+import asyncio
+import os
 import socket
 import time
-import sys
 import struct
+import itertools
 import threading
-from typing import Tuple, List, Dict
+import queue
+import xml.etree.ElementTree as ET
+from typing import Tuple, List, Union
+
+from opc_protocol import (OPC_CHANNEL, OPC_HEADER_SIZE, OPC_MAX_LENGTH, OPC_COMMAND_SET_PIXELS,
+                          OPC_COMMAND_SET_PIXELS_DELTA, OPC_COMMAND_SET_PIXELS_RLE,
+                          OPTION_HOST_COLOR, OPTION_TELEMETRY, OPTION_ACK, encode_delta, encode_rle, pack_options)
+from color_pipeline import ColorPipeline
+from artnet_layout import DEFAULT_PRESET, LayoutError, PixelLayout, load_layout
+from artnet_recording import ArtnetRecorder
+from sdcard_format import SdcardFormatError, SdcardWriter
+from frame_cadence import DEFAULT_DEPTH, FrameCadence
+from frame_upconversion import DEFAULT_SEARCH, MAX_FACTOR, MAX_SEARCH, FrameUpconverter
+from serial_telemetry import AckWindow, DeviceTelemetry, RateController, TelemetryReader
+from bridge_metrics import BridgeMetrics, MetricsServer, DEFAULT_METRICS_PORT
+from bridge_util import wait_until
+from udp_batch import (UDPBatchReceiver, DEFAULT_BATCH_SIZE, DEFAULT_RCVBUF,
+                       set_receive_buffer, kernel_drop_count)
 
 # Matrix configuration (must match Teensy code)
 MATRIX_WIDTH = 64
-MATRIX_HEIGHT = 64*3  # 192 total height
+PANEL_HEIGHT = 64
+MATRIX_HEIGHT = PANEL_HEIGHT*3  # 192 total height
 NUM_PIXELS = MATRIX_WIDTH * MATRIX_HEIGHT
+FRAME_SIZE = NUM_PIXELS * 3
+# Raw, delta and RLE frames all carry their length in the OPC header's 16 bits
+MAX_PANELS_PER_OUTPUT = OPC_MAX_LENGTH // (MATRIX_WIDTH * PANEL_HEIGHT * 3)
 
 # Artnet configuration
 ARTNET_PORT = 6454
 ARTNET_HEADER = b"Art-Net\x00"
 ARTNET_OPCODE_DMX = 0x5000
+ARTNET_OPCODE_SYNC = 0x5200
+ARTNET_SYNC_TIMEOUT = 4.0  # Art-Net spec: drop back to non-sync mode after 4s without ArtSync
+ARTNET_MAX_PACKET_SIZE = 1024
 NUM_UNIVERSES = 73
 LEDS_PER_UNIVERSE = 170
+UNIVERSE_SIZE = LEDS_PER_UNIVERSE * 3
+FRAME_DEADLINE = 0.020  # seconds after the first universe before a partial frame is released
 
 # OPC Protocol constants
-OPC_CHANNEL = 0
-OPC_COMMAND_SET_PIXELS = 0
-OPC_HEADER_SIZE = 4
+KEYFRAME_INTERVAL = 60  # frames between full frames in delta mode
+RLE_SKIP_BELOW = 1024   # don't bother compressing when a delta is already this small
+
+# Pipeline configuration
+ENCODED_FRAME_POOL_SIZE = 3  # one being encoded, one waiting for release, one being written
+STATUS_INTERVAL = 5.0
+CLOCK_SPIN = 0.002  # the last stretch before an output clock tick is waited out with wait_until
+
+OutputClock = Union[FrameCadence, FrameUpconverter]  # paces the frames handed to the serial writers
 
 class ArtnetReceiver:
     """Receives Artnet DMX data and assembles complete frames"""
 
-    def __init__(self):
+    def __init__(self, frame_deadline: float = FRAME_DEADLINE, batch_size: int = DEFAULT_BATCH_SIZE,
+                 rcvbuf: int = DEFAULT_RCVBUF, layout: PixelLayout = None, recorder: ArtnetRecorder = None):
+        """layout maps universes to matrix pixels, by default they fill the matrix in order
+
+        With a recorder, every packet that arrives is also recorded.
+        """
         self.socket = None
-        self.universe_data = {}  # Dict[int, bytes] - universe_id -> dmx_data
+        self.rcvbuf_granted = 0
+        self.batch = None
+        self.batch_size = batch_size
+        self.rcvbuf = rcvbuf
+        self.frame_deadline = frame_deadline
+        self.recorder = recorder
+        self.layout = layout or PixelLayout.linear(NUM_PIXELS, LEDS_PER_UNIVERSE)
+        self.num_universes = self.layout.num_universes
+        self.first_universe = self.layout.first_universe
+        self.stream_size = self.num_universes * UNIVERSE_SIZE
+        self.frame_size = len(self.layout.pixel_map) * 3
+        # Universe payloads are copied straight into the assembly buffer at
+        # their universe slot. Completed frames are snapshotted into the ready
+        # buffer, and get_frame_data remaps them into the frame buffer, so no
+        # buffer is written by one thread while another thread reads it. The
+        # extra pixel after the last slot stays black for unmapped pixels.
+        self.assembly_buffer = bytearray(self.stream_size + 3)
+        self.ready_buffer = bytearray(self.stream_size + 3)
+        self.frame_buffer = bytearray(self.frame_size)
+        self.assembly_view = memoryview(self.assembly_buffer)
+        self.ready_view = memoryview(self.ready_buffer)
+        self.frame_view = memoryview(self.frame_buffer)
+        self.universes_received = bytearray(self.num_universes)
+        self.no_universes_received = bytes(self.num_universes)
+        self.universe_count = 0
+        # Frame boundary state, only touched by the receive thread
+        self.frame_sequence = 0       # Art-Net sequence of the frame being assembled, 0 = unknown
+        self.frame_start_time = None  # monotonic time of the first universe of this frame
+        self.last_sync_time = None    # monotonic time of the last ArtSync packet
+        self.incomplete_frames = 0    # frames released with universes missing
+        self.late_packets = 0         # packets dropped because they belong to an older frame
+        self.packets_received = 0
+        self.receive_errors = 0
+        # Monotonic times of the first universe and completion, for latency metrics
+        self.ready_first_universe_time = None
+        self.ready_complete_time = None
+        self.frame_first_universe_time = None
+        self.frame_complete_time = None
+        self.lock = threading.Lock()
         self.frame_complete = threading.Event()
         self.running = False
         self.thread = None
         self.frame_count = 0
         self.last_frame_time = 0
 
+    def open_socket(self, bind_ip: str = "0.0.0.0") -> socket.socket:
+        """Create and bind the Artnet UDP socket"""
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        # Room for several frames' worth of universes, so bursts aren't dropped
+        self.rcvbuf_granted = set_receive_buffer(self.socket, self.rcvbuf)
+        self.socket.bind((bind_ip, ARTNET_PORT))
+        return self.socket
+
     def start(self, bind_ip: str = "0.0.0.0"):
         """Start listening for Artnet data"""
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            self.socket.bind((bind_ip, ARTNET_PORT))
+            self.open_socket(bind_ip)
+            self.batch = UDPBatchReceiver(self.socket, self.batch_size, ARTNET_MAX_PACKET_SIZE)
             self.running = True
 
             self.thread = threading.Thread(target=self._receive_loop, daemon=True)
             self.thread.start()
 
-            print(f"Artnet receiver started on {bind_ip}:{ARTNET_PORT}")
+            print(f"Artnet receiver started on {bind_ip}:{ARTNET_PORT} "
+                  f"({self.batch.mode}, batch {self.batch.batch_size}, SO_RCVBUF {self.rcvbuf_granted} bytes)")
             return True
 
         except Exception as e:
@@ -78,17 +180,37 @@ class ArtnetReceiver:
 
     def _receive_loop(self):
         """Main receive loop running in separate thread"""
+        # Wake up regularly so a stalled frame is released on its deadline
+        timeout = self.frame_deadline / 2
         while self.running:
             try:
-                data, addr = self.socket.recvfrom(1024)
-                self._parse_artnet_packet(data)
+                count = self.batch.receive(timeout)
+                for i in range(count):
+                    self._parse_artnet_packet(self.batch.packet(i))
+                self._check_deadline(time.monotonic())
             except Exception as e:
                 if self.running:  # Only print error if we're still supposed to be running
+                    self.receive_errors += 1
                     print(f"Artnet receive error: {e}")
 
-    def _parse_artnet_packet(self, data: bytes):
-        """Parse incoming Artnet packet"""
-        if len(data) < 18:  # Minimum Artnet packet size
+    @property
+    def packets_per_wakeup(self) -> float:
+        """Average packets handled per receive wakeup (1.0 without batching)"""
+        if not self.batch:
+            return 1.0
+        return self.batch.packets_received / self.batch.wakeups if self.batch.wakeups else 0.0
+
+    @property
+    def packets_dropped(self):
+        """Packets the kernel dropped on our socket, None where that can't be read"""
+        return kernel_drop_count(self.socket) if self.socket else None
+
+    def _parse_artnet_packet(self, data):
+        """Parse incoming Artnet packet (any bytes-like object)"""
+        self.packets_received += 1
+        if self.recorder:
+            self.recorder.write(data)
+        if len(data) < 14:  # Minimum ArtSync packet size
             return
 
         # Check Artnet header
@@ -96,58 +218,112 @@ class ArtnetReceiver:
             return
 
         # Check opcode (little endian)
-        opcode = struct.unpack('<H', data[8:10])[0]
-        if opcode != ARTNET_OPCODE_DMX:
+        opcode, = struct.unpack_from('<H', data, 8)
+        if opcode == ARTNET_OPCODE_SYNC:
+            self._handle_sync()
+            return
+        if opcode != ARTNET_OPCODE_DMX or len(data) < 18:  # Minimum ArtDmx packet size
             return
 
+        # Sequence number, 0 means the sender doesn't use them
+        sequence = data[12]
+
         # Extract universe (little endian)
-        universe = struct.unpack('<H', data[14:16])[0]
+        universe, = struct.unpack_from('<H', data, 14)
+        universe -= self.first_universe
 
         # Extract DMX data length (big endian)
-        length = struct.unpack('>H', data[16:18])[0]
+        length, = struct.unpack_from('>H', data, 16)
+
+        if not 0 <= universe < self.num_universes:
+            return
+
+        now = time.monotonic()
+        if self.universe_count:
+            if sequence and self.frame_sequence and sequence != self.frame_sequence:
+                if 0 < (self.frame_sequence - sequence) % 256 < 128:
+                    # Reordered packet from a frame we already released
+                    self.late_packets += 1
+                    return
+                # A newer frame started before this one completed
+                self._complete_frame()
+            elif self.universes_received[universe] and not self._sync_mode(now):
+                # Same universe twice: the rest of the previous frame was lost
+                self._complete_frame()
 
-        # Extract DMX data
-        dmx_data = data[18:18+length]
+        if not self.universe_count:
+            self.frame_start_time = now
+            self.frame_sequence = sequence
 
-        if universe < NUM_UNIVERSES:
-            self.universe_data[universe] = dmx_data
+        # Copy DMX data straight into this universe's slot in the frame
+        offset = universe * UNIVERSE_SIZE
+        count = min(length, len(data) - 18, UNIVERSE_SIZE)
+        if count > 0:
+            self.assembly_view[offset:offset + count] = data[18:18 + count]
 
-            # Check if we have all universes for a complete frame
-            if len(self.universe_data) >= NUM_UNIVERSES:
-                self.frame_complete.set()
+        if not self.universes_received[universe]:
+            self.universes_received[universe] = 1
+            self.universe_count += 1
+
+            # With ArtSync the sync packet marks the frame boundary instead
+            if self.universe_count >= self.num_universes and not self._sync_mode(now):
+                self._complete_frame()
+
+    def _sync_mode(self, now: float) -> bool:
+        """True while the sender is marking frame boundaries with ArtSync"""
+        return self.last_sync_time is not None and now - self.last_sync_time < ARTNET_SYNC_TIMEOUT
+
+    def _handle_sync(self):
+        """ArtSync: everything received since the last sync is one frame"""
+        self.last_sync_time = time.monotonic()
+        if self.universe_count:
+            self._complete_frame()
+
+    def _check_deadline(self, now: float):
+        """Release a partial frame once its completion deadline has passed"""
+        if self.universe_count and now - self.frame_start_time >= self.frame_deadline:
+            self._complete_frame()
+
+    def _complete_frame(self):
+        """Snapshot the assembled frame and start collecting the next one
+
+        Universes missing from this frame keep their data from the previous
+        frame, since the assembly buffer is never cleared.
+        """
+        if self.universe_count < self.num_universes:
+            self.incomplete_frames += 1
+        complete_time = time.monotonic()
+        with self.lock:
+            self.ready_buffer[:] = self.assembly_buffer
+            self.ready_first_universe_time = self.frame_start_time
+            self.ready_complete_time = complete_time
+        self.universes_received[:] = self.no_universes_received
+        self.universe_count = 0
+        self.frame_sequence = 0
+        self.frame_start_time = None
+        self.last_frame_time = time.time()
+        self.frame_complete.set()
 
     def wait_for_frame(self, timeout: float = 1.0) -> bool:
         """Wait for a complete frame to be received"""
         return self.frame_complete.wait(timeout)
 
-    def get_frame_data(self) -> List[Tuple[int, int, int]]:
-        """Get complete frame as RGB pixel list"""
-        pixels = []
-
-        # Process universes in order
-        for universe in range(NUM_UNIVERSES):
-            if universe in self.universe_data:
-                dmx_data = self.universe_data[universe]
-
-                # Convert DMX data to RGB pixels (3 channels per pixel)
-                for i in range(0, min(len(dmx_data), LEDS_PER_UNIVERSE * 3), 3):
-                    if i + 2 < len(dmx_data):
-                        r = dmx_data[i]
-                        g = dmx_data[i + 1]
-                        b = dmx_data[i + 2]
-                        pixels.append((r, g, b))
-
-        # Clear frame data and reset event
-        self.universe_data.clear()
-        self.frame_complete.clear()
-        self.frame_count += 1
+    def get_frame_data(self) -> memoryview:
+        """Get complete frame as packed RGB bytes (frame_size, one pixel per layout entry) in matrix order
 
-        # Pad or truncate to exact pixel count
-        while len(pixels) < NUM_PIXELS:
-            pixels.append((0, 0, 0))
-        pixels = pixels[:NUM_PIXELS]
+        The returned view stays valid until the next call.
+        """
+        with self.lock:
+            if self.layout.is_identity:
+                self.frame_view[:] = self.ready_view[:self.frame_size]
+            else:
+                self.layout.remap(self.ready_buffer, self.frame_buffer)
+            self.frame_first_universe_time = self.ready_first_universe_time
+            self.frame_complete_time = self.ready_complete_time
+            self.frame_complete.clear()
+        self.frame_count += 1
 
-        return pixels
+        return self.frame_view
 
 def find_teensy_ports():
     """Find all available serial ports and identify likely Teensy ports"""
@@ -200,19 +376,108 @@ def test_port_connection(port: str, baudrate: int = 115200):
         print(f"✗ Port {port} - Error: {e}")
         return False
 
+def pixels_to_bytes(pixels: List[Tuple[int, int, int]]) -> bytes:
+    """Pack a list of (r, g, b) tuples into RGB bytes, padded or truncated to NUM_PIXELS"""
+    if len(pixels) != NUM_PIXELS:
+        print(f"Warning: Expected {NUM_PIXELS} pixels, got {len(pixels)}")
+        if len(pixels) < NUM_PIXELS:
+            pixels = pixels + [(0, 0, 0)] * (NUM_PIXELS - len(pixels))
+        else:
+            pixels = pixels[:NUM_PIXELS]
+
+    try:
+        return bytes(itertools.chain.from_iterable(pixels))
+    except ValueError:
+        # Out of range channel values, wrap them like a uint8 would
+        return bytes(c & 0xFF for c in itertools.chain.from_iterable(pixels))
+
+def frame_payload(pixels) -> memoryview:
+    """Flat byte view of a frame without copying it
+
+    NumPy arrays that are not contiguous uint8 are converted first.
+    """
+    if hasattr(pixels, '__array_interface__'):
+        if pixels.dtype != 'uint8' or not pixels.flags.c_contiguous:
+            pixels = pixels.astype('uint8', order='C')
+    return memoryview(pixels).cast('B')
+
 class OPCSender:
-    def __init__(self, port: str, baudrate: int = 115200):
-        """Initialize OPC sender with serial connection"""
+    def __init__(self, port: str, baudrate: int = 115200, delta: bool = False,
+                 keyframe_interval: int = KEYFRAME_INTERVAL, compress: bool = False,
+                 color_pipeline: ColorPipeline = None, frame_size: int = FRAME_SIZE, telemetry: bool = False,
+                 ack_window: int = 0):
+        """Initialize OPC sender with serial connection
+
+        frame_size is the RGB payload of every frame in bytes, the whole
+        matrix unless this port only carries some of its panels.
+
+        With delta enabled, frames are sent as the spans that changed since
+        the last frame sent, with a full keyframe every keyframe_interval
+        frames and after (re)connecting. With compress enabled, frames are
+        also run-length encoded; whichever message is smallest is sent.
+        With a color_pipeline, frames are color processed here and the
+        firmware is told to display them without its own processing.
+        With telemetry, the firmware is asked for its fps and frame timing
+        and a reader thread collects them, and any lost frames, in
+        self.telemetry. With an ack_window, the firmware acknowledges every
+        frame it displays and at most ack_window frames are written ahead
+        of the acks (see self.acks).
+        """
         self.port = port
         self.baudrate = baudrate
         self.serial = None
         self.frame_count = 0
+        self.bytes_sent = 0
+        self.frame_size = frame_size
+        # Header: [channel][command][length_hi][length_lo]
+        self.header = struct.pack('>BBH', OPC_CHANNEL, OPC_COMMAND_SET_PIXELS, frame_size)
+
+        # Delta mode state
+        self.delta = delta
+        self.keyframe_interval = keyframe_interval
+        self.last_sent = bytearray(frame_size)
+        self.last_sent_view = memoryview(self.last_sent)
+        self.delta_buffer = bytearray(OPC_HEADER_SIZE + frame_size)
+        self.delta_view = memoryview(self.delta_buffer)
+        self.need_keyframe = True
+        self.frames_since_keyframe = 0
+        self.keyframes_sent = 0
+
+        # Compression state and wire statistics
+        self.compress = compress
+        self.rle_buffer = bytearray(OPC_HEADER_SIZE + frame_size)
+        self.rle_view = memoryview(self.rle_buffer)
+        self.compressed_frames = 0
+        self.raw_bytes = 0      # what every frame would have cost as a plain set-pixels message
+        self.encode_time = 0.0  # seconds spent choosing and encoding wire messages
+
+        # Host-side color processing
+        self.color_pipeline = color_pipeline
+        self.options = OPTION_HOST_COLOR if color_pipeline else 0
+
+        # Back-channel from the firmware
+        self.acks = AckWindow(ack_window) if ack_window else None
+        self.telemetry = DeviceTelemetry(self.acks) if telemetry or self.acks else None
+        self.reader = None
+        if telemetry:
+            self.options |= OPTION_TELEMETRY
+        if self.acks:
+            self.options |= OPTION_ACK
 
     def connect(self):
         """Connect to the serial port"""
         try:
             self.serial = serial.Serial(self.port, self.baudrate, timeout=1)
             time.sleep(2)  # Wait for connection to stabilize
+            self.need_keyframe = True
+            if self.acks:
+                self.acks.reset()
+            if self.options:
+                # The firmware forgets its options when it resets, so always send them
+                self.send_options()
+            if self.telemetry:
+                self.reader = TelemetryReader(self.serial, self.telemetry, on_error=self._device_lost_frame)
+                self.reader.start()
             print(f"Connected to {self.port} at {self.baudrate} baud")
             return True
         except Exception as e:
@@ -221,41 +486,153 @@ class OPCSender:
 
     def disconnect(self):
         """Disconnect from serial port"""
+        if self.reader:
+            self.reader.stop()
+            self.reader = None
         if self.serial and self.serial.is_open:
             self.serial.close()
             print("Disconnected")
 
-    def send_frame(self, pixels: List[Tuple[int, int, int]]):
-        """Send OPC frame with RGB pixel data"""
+    def _device_lost_frame(self):
+        """The firmware threw a frame away, so deltas against it would be wrong"""
+        self.need_keyframe = True
+
+    def send_options(self):
+        """Tell the firmware which options this sender uses (set-options message)"""
+        self.serial.write(pack_options(self.options))
+        self.serial.flush()
+
+    def send_frame(self, pixels) -> bool:
+        """Send OPC frame with RGB pixel data
+
+        Accepts packed RGB bytes (any bytes-like object), a NumPy uint8 array
+        of shape (H, W, 3), or a list of (r, g, b) tuples for compatibility.
+        """
         if not self.serial or not self.serial.is_open:
             return False
 
-        # Ensure we have the right number of pixels
-        if len(pixels) != NUM_PIXELS:
-            print(f"Warning: Expected {NUM_PIXELS} pixels, got {len(pixels)}")
-            # Pad or truncate as needed
-            if len(pixels) < NUM_PIXELS:
-                pixels.extend([(0, 0, 0)] * (NUM_PIXELS - len(pixels)))
+        if isinstance(pixels, list):
+            pixels = pixels_to_bytes(pixels)
+
+        payload = frame_payload(pixels)
+        if payload.nbytes != self.frame_size:
+            print(f"Warning: Expected {self.frame_size} bytes, got {payload.nbytes}")
+            return False
+
+        return self._write_frame(self._color_process(payload))
+
+    def encode_frame(self, pixels, encoded: "EncodedFrame"):
+        """Encode RGB pixel data into an OPC message in a reusable buffer"""
+        payload = frame_payload(pixels)
+        if payload.nbytes != self.frame_size:
+            print(f"Warning: Expected {self.frame_size} bytes, got {payload.nbytes}")
+            encoded.length = 0
+            return
+        payload = self._color_process(payload)
+        encoded.view[:OPC_HEADER_SIZE] = self.header
+        encoded.view[OPC_HEADER_SIZE:OPC_HEADER_SIZE + self.frame_size] = payload
+        encoded.length = OPC_HEADER_SIZE + self.frame_size
+
+    def _color_process(self, payload: memoryview) -> memoryview:
+        """Apply the host-side color pipeline, if any (the result is reused by the next call)"""
+        if self.color_pipeline is None:
+            return payload
+        start = time.perf_counter()
+        processed = frame_payload(self.color_pipeline.process(payload))
+        self.encode_time += time.perf_counter() - start
+        return processed
+
+    def write_encoded(self, encoded: "EncodedFrame") -> bool:
+        """Write an OPC message produced by encode_frame"""
+        if not self.serial or not self.serial.is_open or not encoded.length:
+            return False
+
+        return self._write_frame(encoded.view[OPC_HEADER_SIZE:encoded.length], encoded.message())
+
+    def _write_frame(self, payload: memoryview, message: memoryview = None) -> bool:
+        """Write one frame, as a delta against the last frame sent when that is smaller
+
+        message is the complete set-pixels message for payload if the caller
+        already has one; otherwise header and payload go out back to back.
+        """
+        wire_message, keyframe = self.prepare_message(payload)
+        if wire_message is not None:
+            message = wire_message
+
+        if self.acks:
+            # Registered before writing, the ack can come back before the write returns
+            self.acks.wait_for_slot()
+            self.acks.sent(time.monotonic())
+        try:
+            if message is None:
+                self.serial.write(self.header)
+                self.serial.write(payload)
+                nbytes = OPC_HEADER_SIZE + self.frame_size
             else:
-                pixels = pixels[:NUM_PIXELS]
+                self.serial.write(message)
+                nbytes = len(message)
+            self.serial.flush()
+        except Exception:
+            # The device may have missed part of it, so don't send deltas against it
+            self.need_keyframe = True
+            if self.acks:
+                self.acks.cancel()
+            raise
 
-        # Build OPC frame
-        # Header: [channel][command][length_hi][length_lo]
-        pixel_data_length = NUM_PIXELS * 3
-        header = struct.pack('>BBH', OPC_CHANNEL, OPC_COMMAND_SET_PIXELS, pixel_data_length)
+        self.frame_written(payload, keyframe, nbytes)
+        return True
 
-        # Convert pixel data to bytes
-        pixel_bytes = bytearray()
-        for r, g, b in pixels:
-            pixel_bytes.extend([r & 0xFF, g & 0xFF, b & 0xFF])
+    def prepare_message(self, payload: memoryview):
+        """Choose the wire message for a frame, see _smallest_message"""
+        start = time.perf_counter()
+        message, keyframe = self._smallest_message(payload)
+        self.encode_time += time.perf_counter() - start
+        return message, keyframe
 
-        # Send complete frame
-        frame = header + pixel_bytes
-        self.serial.write(frame)
-        self.serial.flush()
+    def frame_written(self, payload: memoryview, keyframe: bool, nbytes: int):
+        """Bookkeeping once a frame's message has been fully written"""
+        if self.delta:
+            self.last_sent_view[:] = payload
+            if keyframe:
+                self.need_keyframe = False
+                self.frames_since_keyframe = 0
+                self.keyframes_sent += 1
+            else:
+                self.frames_since_keyframe += 1
 
         self.frame_count += 1
-        return True
+        self.bytes_sent += nbytes
+        self.raw_bytes += OPC_HEADER_SIZE + self.frame_size
+
+    def _smallest_message(self, payload: memoryview):
+        """Encode payload as a delta and/or RLE message if that beats the raw frame
+
+        Returns (message, keyframe); message is None when the plain set-pixels
+        message is smallest, keyframe is False only for delta messages.
+        """
+        best = None
+        best_length = OPC_HEADER_SIZE + self.frame_size
+        keyframe = True
+
+        if self.delta and not self.need_keyframe and self.frames_since_keyframe < self.keyframe_interval:
+            length = encode_delta(payload, self.last_sent, self.delta_view[OPC_HEADER_SIZE:], MATRIX_WIDTH)
+            if length >= 0:
+                struct.pack_into('>BBH', self.delta_buffer, 0,
+                                 OPC_CHANNEL, OPC_COMMAND_SET_PIXELS_DELTA, length)
+                best = self.delta_view[:OPC_HEADER_SIZE + length]
+                best_length = len(best)
+                keyframe = False
+
+        if self.compress and best_length > RLE_SKIP_BELOW:
+            length = encode_rle(payload, self.rle_view[OPC_HEADER_SIZE:], limit=best_length - OPC_HEADER_SIZE)
+            if length >= 0:
+                struct.pack_into('>BBH', self.rle_buffer, 0,
+                                 OPC_CHANNEL, OPC_COMMAND_SET_PIXELS_RLE, length)
+                best = self.rle_view[:OPC_HEADER_SIZE + length]
+                keyframe = True
+                self.compressed_frames += 1
+
+        return best, keyframe
 
     def send_black_frame(self):
         """Send a frame of all black pixels to clear the display"""
@@ -263,30 +640,844 @@ class OPCSender:
             return False
 
         print("Clearing display (sending all black)...")
-        black_pixels = [(0, 0, 0)] * NUM_PIXELS
-        return self.send_frame(black_pixels)
+        return self.send_frame(bytes(self.frame_size))
+
+class EncodedFrame:
+    """An OPC message in a reusable buffer, handed from the encoder to the serial writer"""
+
+    def __init__(self, frame_size: int = FRAME_SIZE):
+        self.buffer = bytearray(OPC_HEADER_SIZE + frame_size)
+        self.view = memoryview(self.buffer)
+        self.length = 0
+        # Monotonic timestamps for latency metrics
+        self.first_universe_time = None
+        self.complete_time = None
+        self.encoded_time = None
+
+    def message(self) -> memoryview:
+        """The encoded OPC message"""
+        return self.view[:self.length]
+
+def encode_frame_set(frame, outputs: list, frames: list, first_universe_time: float, complete_time: float,
+                     capture: SdcardWriter = None, capture_time: float = None):
+    """Encode each output's rows of frame into its EncodedFrame, with the frame's receive timestamps
+
+    With a capture, the frame as it goes to the Teensy is also queued for
+    the SD card file, timed by capture_time, by default when the receiver
+    completed it. Capturing takes a single output that carries the whole
+    frame.
+    """
+    for output, encoded in zip(outputs, frames):
+        output.sender.encode_frame(frame[output.start:output.end], encoded)
+        encoded.first_universe_time = first_universe_time
+        encoded.complete_time = complete_time
+        encoded.encoded_time = time.monotonic()
+    encoded = frames[0]
+    if capture and encoded.length:
+        capture.write(encoded.view[OPC_HEADER_SIZE:encoded.length],
+                      capture_time or encoded.complete_time or encoded.encoded_time)
+
+def encode_received_frame(receiver: ArtnetReceiver, outputs: list, frames: list, capture: SdcardWriter = None):
+    """Encode the receiver's newest frame, see encode_frame_set"""
+    frame = receiver.get_frame_data()
+    encode_frame_set(frame, outputs, frames, receiver.frame_first_universe_time, receiver.frame_complete_time,
+                     capture)
+
+def encode_clock_frame(clock: OutputClock, outputs: list, frames: list, capture: SdcardWriter = None):
+    """Encode the frame for the output clock's tick that is due now
+
+    Returns False when the clock has gone idle and there is nothing to send.
+    """
+    now = time.monotonic()
+    buffered = clock.tick(now)
+    if buffered is None:
+        return False
+    encode_frame_set(buffered.view, outputs, frames, buffered.first_universe_time, buffered.complete_time,
+                     capture, capture_time=now)
+    return True
+
+def panel_range(first_panel: int, panels: int) -> str:
+    """Panel rows for display, counted from 1"""
+    if panels == 1:
+        return f"panel {first_panel + 1}"
+    return f"panels {first_panel + 1}-{first_panel + panels}"
+
+class SerialOutput:
+    """A serial port and the band of matrix rows it carries
+
+    Every output has its own OPCSender, so its own connection, options and
+    delta state. Rows are counted from the top of the drawing area. With a
+    RateController, frames go out no faster than it allows.
+    """
+
+    def __init__(self, sender: OPCSender, first_row: int, rows: int, rate: RateController = None):
+        self.sender = sender
+        self.rate = rate
+        self.first_row = first_row
+        self.rows = rows
+        self.start = first_row * MATRIX_WIDTH * 3
+        self.end = (first_row + rows) * MATRIX_WIDTH * 3
+        self.write_errors = 0
+        self.thread = None
+        # Counters at the previous throughput report
+        self.report_time = time.monotonic()
+        self.report_frames = 0
+        self.report_bytes = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.sender.port} ({panel_range(self.first_row // PANEL_HEIGHT, self.rows // PANEL_HEIGHT)})"
+
+    def throughput(self) -> Tuple[float, float]:
+        """Frames and bytes per second since the previous call"""
+        now = time.monotonic()
+        elapsed = max(now - self.report_time, 1e-9)
+        frames = self.sender.frame_count - self.report_frames
+        sent = self.sender.bytes_sent - self.report_bytes
+        self.report_time = now
+        self.report_frames = self.sender.frame_count
+        self.report_bytes = self.sender.bytes_sent
+        return frames / elapsed, sent / elapsed
+
+def split_panels(num_panels: int, specs: List[str]) -> List[Tuple[str, int, int]]:
+    """Parse PORT[:PANELS] output specs into (port, first panel, panels), top to bottom
+
+    Ports without a panel count share the panels the others leave, as evenly
+    as possible. Raises ValueError when the counts don't add up to num_panels
+    or an output would get more than MAX_PANELS_PER_OUTPUT.
+    """
+    ports = []
+    for spec in specs:
+        port, sep, count = spec.rpartition(":")
+        # A bare port, or a Windows-style name that merely contains a colon
+        if not sep or not count.isdigit():
+            ports.append((spec, None))
+        elif int(count) < 1:
+            raise ValueError(f"{spec}: an output needs at least one panel")
+        else:
+            ports.append((port, int(count)))
+
+    fixed = sum(count for _, count in ports if count is not None)
+    shared = [index for index, (_, count) in enumerate(ports) if count is None]
+    remaining = num_panels - fixed
+    if remaining < 0 or (remaining and not shared):
+        raise ValueError(f"outputs cover {fixed} panels, the matrix has {num_panels}")
+    if remaining < len(shared):
+        raise ValueError(f"{len(shared)} outputs share the {remaining} panels left, each needs at least one")
+    counts = [count for _, count in ports]
+    for position, index in enumerate(shared):
+        counts[index] = remaining // len(shared) + (position < remaining % len(shared))
+    if max(counts) > MAX_PANELS_PER_OUTPUT:
+        raise ValueError(f"an output can carry at most {MAX_PANELS_PER_OUTPUT} panels, "
+                         f"the OPC length field can't hold a larger frame")
+
+    result = []
+    first = 0
+    for (port, _), count in zip(ports, counts):
+        result.append((port, first, count))
+        first += count
+    return result
+
+class FrameRelease:
+    """Hands each frame to every serial output at once
+
+    A frame is a list with one EncodedFrame per output. put() offers the
+    newest one, and it is released once every output has finished writing
+    the previous frame, so all controllers show the same frame: a slow port
+    holds the others back instead of tearing the cube. A frame replaced
+    before it was released is counted in dropped. Frames nobody needs any
+    more are returned by put() and done() so their buffers can be recycled.
+    """
+
+    def __init__(self, num_outputs: int):
+        self.condition = threading.Condition()
+        self.num_outputs = num_outputs
+        self.pending = None   # newest frame, waiting for the outputs
+        self.current = None   # frame the outputs are writing, or wrote last
+        self.generation = 0   # counts released frames
+        self.released_time = None
+        self.busy = 0         # outputs still writing current
+        self.failed = False   # an output could not write current
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, frames: list) -> list:
+        """Offer the newest frame, returns the frames to recycle"""
+        with self.condition:
+            recycle = []
+            if self.pending is not None:
+                self.dropped += 1
+                recycle.append(self.pending)
+            self.pending = frames
+            recycle += self._release()
+        return recycle
+
+    def take(self, generation: int, timeout: float = None):
+        """Wait up to timeout for a frame released after generation
+
+        Returns (generation, frame), frame is None if none came.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.generation != generation or self.closed, timeout)
+            if self.generation == generation:
+                return generation, None
+            return self.generation, self.current
+
+    def done(self, written: bool = True):
+        """An output is finished with the current frame
+
+        Returns when the frame was released if it was the last output and
+        every output wrote it (otherwise None), and the frames to recycle.
+        """
+        with self.condition:
+            self.busy -= 1
+            self.failed |= not written
+            if self.busy:
+                return None, []
+            released_time = None if self.failed else self.released_time
+            return released_time, self._release()
+
+    def close(self):
+        """Wake up the waiting outputs for shutdown"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def _release(self) -> list:
+        if self.busy or self.pending is None:
+            return []
+        finished = self.current
+        self.current, self.pending = self.pending, None
+        self.generation += 1
+        self.released_time = time.monotonic()
+        self.busy = self.num_outputs
+        self.failed = False
+        self.condition.notify_all()
+        return [finished] if finished is not None else []
+
+class BridgePipeline:
+    """Receive, encode and serial write stages, with a writer thread per serial output
+
+    The ArtnetReceiver thread assembles frames, the encode stage runs on the
+    caller's thread and cuts each frame into the outputs' bands, and every
+    output's writer thread owns its serial port. A slow serial write or
+    flush never holds up Art-Net ingestion; the writers always pick up the
+    newest encoded frame and older ones are dropped. With an output clock
+    (FrameCadence or FrameUpconverter), the encode stage feeds it the
+    arriving frames and hands frames over on its ticks instead.
+    """
+
+    def __init__(self, receiver: ArtnetReceiver, outputs: List[SerialOutput], metrics: BridgeMetrics = None,
+                 capture: SdcardWriter = None, clock: OutputClock = None):
+        self.receiver = receiver
+        self.outputs = outputs
+        self.metrics = metrics
+        self.capture = capture
+        self.clock = clock
+        self.release = FrameRelease(len(outputs))
+        self.free_frames = queue.SimpleQueue()
+        for _ in range(ENCODED_FRAME_POOL_SIZE):
+            self.free_frames.put([EncodedFrame(output.end - output.start) for output in outputs])
+        self.running = False
+        self.frames_encoded = 0
+
+    @property
+    def write_errors(self) -> int:
+        return sum(output.write_errors for output in self.outputs)
+
+    def start(self):
+        """Start the serial writer threads"""
+        self.running = True
+        for index, output in enumerate(self.outputs):
+            output.thread = threading.Thread(target=self._writer_loop, args=(index,), daemon=True)
+            output.thread.start()
+
+    def stop(self):
+        """Stop the serial writer threads"""
+        self.running = False
+        self.release.close()
+        for output in self.outputs:
+            if output.thread:
+                output.thread.join()
+
+    def encode_stage(self, timeout: float = 1.0) -> bool:
+        """Wait for the next assembled frame and hand it to the writers"""
+        if self.clock:
+            return self._clock_stage(timeout)
+        if not self.receiver.wait_for_frame(timeout=timeout):
+            return False
+
+        frames = self.free_frames.get()
+        encode_received_frame(self.receiver, self.outputs, frames, self.capture)
+        self._hand_over(frames)
+        return True
+
+    def _clock_stage(self, timeout: float) -> bool:
+        """Feed arriving frames to the output clock until its next tick, then hand one over"""
+        clock = self.clock
+        receiver = self.receiver
+        wait = timeout if clock.next_tick is None else clock.next_tick - time.monotonic() - CLOCK_SPIN
+        if wait > 0:
+            if receiver.wait_for_frame(timeout=min(wait, timeout)):
+                frame = receiver.get_frame_data()
+                clock.push(frame, receiver.frame_first_universe_time, receiver.frame_complete_time,
+                           time.monotonic())
+            return False
+
+        wait_until(clock.next_tick, clock=time.monotonic)
+        frames = self.free_frames.get()
+        if not encode_clock_frame(clock, self.outputs, frames, self.capture):
+            self.free_frames.put(frames)
+            return False
+        self._hand_over(frames)
+        return True
+
+    def _hand_over(self, frames: list):
+        self.frames_encoded += 1
+        if self.metrics:
+            self.metrics.frame_encoded(frames[0])
+        for finished in self.release.put(frames):
+            self.free_frames.put(finished)
+
+    def _hold(self, delay: float):
+        """Sleep for delay seconds, waking up early for shutdown"""
+        deadline = time.monotonic() + delay
+        while self.running:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, 0.1))
+
+    def _writer_loop(self, index: int):
+        """Serial writer thread of one output: write its band of every released frame"""
+        output = self.outputs[index]
+        generation = 0
+        while self.running:
+            generation, frames = self.release.take(generation, timeout=1.0)
+            if frames is None:
+                continue
+            written = False
+            try:
+                written = output.sender.write_encoded(frames[index])
+            except Exception as e:
+                output.write_errors += 1
+                print(f"Serial write error on {output.sender.port}: {e}")
+                time.sleep(1.0)
+            finally:
+                write_end = time.monotonic()
+                if output.rate and written:
+                    output.rate.sent(write_end)
+                # Hold on to the frame until the device may take the next one, so the
+                # newest frame is released then rather than one that waited
+                if output.rate:
+                    self._hold(output.rate.delay(write_end))
+                if output.sender.acks:
+                    output.sender.acks.wait_for_slot()
+                released_time, finished = self.release.done(written)
+                if released_time is not None and self.metrics:
+                    self.metrics.frame_written(frames[0], released_time, write_end)
+                for done_frames in finished:
+                    self.free_frames.put(done_frames)
+
+class ArtnetProtocol(asyncio.DatagramProtocol):
+    """Feeds Art-Net datagrams from the event loop into an ArtnetReceiver"""
+
+    def __init__(self, receiver: ArtnetReceiver, on_frame):
+        self.receiver = receiver
+        self.on_frame = on_frame
+
+    def datagram_received(self, data, addr):
+        self.receiver._parse_artnet_packet(data)
+        if self.receiver.frame_complete.is_set():
+            self.on_frame()
+
+    def error_received(self, exc):
+        self.receiver.receive_errors += 1
+        print(f"Artnet receive error: {exc}")
+
+class AsyncSerialWriter:
+    """Non-blocking serial writer for the asyncio engine
+
+    Where pyserial exposes a file descriptor, messages are written straight
+    to it from the event loop and the rest of a partial write waits for the
+    port to become writable. Otherwise each write runs in a worker thread.
+    Only the newest frame waits for the port; older ones are dropped. With a
+    RateController, the port is left idle between frames for as long as it
+    asks, and with an ack window until a slot frees up.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, sender: OPCSender, free_frames: queue.SimpleQueue,
+                 metrics: BridgeMetrics = None, rate: RateController = None):
+        self.loop = loop
+        self.sender = sender
+        self.free_frames = free_frames
+        self.metrics = metrics
+        self.rate = rate
+        self.pending = None   # newest frame waiting for the port
+        self.current = None   # frame being written
+        self.holding = None   # timer handle while the port is held idle
+        self.waiting_for_ack = False
+        if sender.acks:
+            sender.acks.on_slot_free = lambda: loop.call_soon_threadsafe(self._slot_free)
+        self.payload = None
+        self.message = None
+        self.keyframe = True
+        self.offset = 0
+        self.write_start = 0.0
+        self.dropped = 0
+        self.write_errors = 0
+        try:
+            self.fd = sender.serial.fileno()
+        except (AttributeError, NotImplementedError, OSError, ValueError):
+            self.fd = None
+
+    @property
+    def mode(self) -> str:
+        return "non-blocking fd" if self.fd is not None else "worker thread"
+
+    def submit(self, encoded: EncodedFrame):
+        """Queue a frame, replacing one that is still waiting"""
+        if self.pending is not None:
+            self.dropped += 1
+            self.free_frames.put(self.pending)
+        self.pending = encoded
+        if self.current is None and self.holding is None:
+            self._start_next()
+
+    def _resume(self):
+        self.holding = None
+        self.waiting_for_ack = False
+        self._start_next()
+
+    def _slot_free(self):
+        """An ack freed a slot in the window (scheduled from the reader thread)"""
+        if self.waiting_for_ack and self.holding:
+            self.holding.cancel()
+            self._resume()
+
+    def _start_next(self):
+        if self.pending is not None:
+            now = time.monotonic()
+            delay = self.rate.delay(now) if self.rate else 0.0
+            acks = self.sender.acks
+            if acks and not acks.has_slot(now):
+                # The oldest frame times out by then at the latest, an ack resumes earlier
+                delay = max(delay, acks.timeout)
+                self.waiting_for_ack = True
+            if delay > 0:
+                self.holding = self.loop.call_later(delay, self._resume)
+                return
+        encoded, self.pending = self.pending, None
+        if encoded is None or not encoded.length:
+            if encoded is not None:
+                self.free_frames.put(encoded)
+            return
+
+        self.current = encoded
+        self.payload = encoded.view[OPC_HEADER_SIZE:encoded.length]
+        wire_message, self.keyframe = self.sender.prepare_message(self.payload)
+        self.message = wire_message if wire_message is not None else encoded.message()
+        self.offset = 0
+        self.write_start = time.monotonic()
+        if self.sender.acks:
+            self.sender.acks.sent(self.write_start)
+
+        if self.fd is None:
+            future = self.loop.run_in_executor(None, self._write_blocking)
+            future.add_done_callback(lambda f: self._finished(f.exception()))
+        else:
+            self._write_ready()
+
+    def _write_blocking(self):
+        self.sender.serial.write(self.message)
+        self.sender.serial.flush()
+
+    def _write_ready(self):
+        """Write as much as the port takes now, resume when it is writable again"""
+        try:
+            while self.offset < len(self.message):
+                self.offset += os.write(self.fd, self.message[self.offset:])
+        except BlockingIOError:
+            self.loop.add_writer(self.fd, self._write_ready)
+            return
+        except OSError as e:
+            self.loop.remove_writer(self.fd)
+            self._finished(e)
+            return
+        self.loop.remove_writer(self.fd)
+        self._finished(None)
+
+    def _finished(self, error):
+        if error is None:
+            self.sender.frame_written(self.payload, self.keyframe, len(self.message))
+            if self.rate:
+                self.rate.sent(time.monotonic())
+            if self.metrics:
+                self.metrics.frame_written(self.current, self.write_start, time.monotonic())
+        else:
+            self.write_errors += 1
+            self.sender.need_keyframe = True
+            if self.sender.acks:
+                self.sender.acks.cancel()
+            print(f"Serial write error: {error}")
+        self.free_frames.put(self.current)
+        self.current = None
+        self._start_next()
+
+def print_status(receiver: ArtnetReceiver, outputs: List[SerialOutput], dropped: int,
+                 metrics: BridgeMetrics = None, capture: SdcardWriter = None, clock: OutputClock = None):
+    """Periodic status lines shared by both engines"""
+    senders = [output.sender for output in outputs]
+    frame_count = min(sender.frame_count for sender in senders)
+    bytes_sent = sum(sender.bytes_sent for sender in senders)
+    raw_bytes = sum(sender.raw_bytes for sender in senders)
+    encode_time = sum(sender.encode_time for sender in senders)
+    sent = max(frame_count, 1)
+    print(f"Frames bridged: {frame_count} (Artnet: {receiver.frame_count}, "
+          f"avg {bytes_sent // sent} bytes/frame, "
+          f"wire {100 * bytes_sent / max(raw_bytes, 1):.0f}% of raw, "
+          f"encode {encode_time / sent * 1e6:.0f} us/frame, "
+          f"dropped: {dropped}, incomplete: {receiver.incomplete_frames}, "
+          f"late packets: {receiver.late_packets})")
+    if len(outputs) > 1:
+        for output in outputs:
+            fps, rate = output.throughput()
+            print(f"  {output.name}: {fps:.1f} fps, {rate / 1024:.0f} KB/s, "
+                  f"{output.sender.frame_count} frames, {output.write_errors} write errors")
+    for output in outputs:
+        sender = output.sender
+        reports = [sender.telemetry.summary()] if sender.options & OPTION_TELEMETRY else []
+        reports += [f"acks: {sender.acks.summary()}"] if sender.acks else []
+        reports += [output.rate.summary()] if output.rate else []
+        if reports:
+            print(f"Device {sender.port}: {'; '.join(reports)}")
+    os_dropped = receiver.packets_dropped
+    print(f"Artnet packets: {receiver.packets_received} received, "
+          f"{'n/a' if os_dropped is None else os_dropped} dropped by the OS, "
+          f"{receiver.packets_per_wakeup:.1f} per wakeup")
+    if clock:
+        print(clock.summary())
+    if receiver.recorder and receiver.recorder.error:
+        print(f"Recording stopped: {receiver.recorder.error}, {receiver.recorder.dropped} packets dropped")
+    if capture:
+        print(f"SD capture: {capture.frames_written} frames written, {capture.dropped} dropped"
+              f"{f', write error: {capture.error}' if capture.error else ''}")
+    if metrics:
+        print(metrics.summary())
+
+def register_receiver_metrics(metrics: BridgeMetrics, receiver: ArtnetReceiver):
+    """Export the receiver's own counters"""
+    metrics.add_source("artnet_packets", "Art-Net packets received", lambda: receiver.packets_received)
+    metrics.add_source("artnet_late_packets", "Packets dropped because their frame was already released",
+                       lambda: receiver.late_packets)
+    metrics.add_source("artnet_receive_errors", "Art-Net socket errors", lambda: receiver.receive_errors)
+    metrics.add_source("incomplete_frames", "Frames released with universes missing",
+                       lambda: receiver.incomplete_frames)
+    metrics.add_source("frames_received", "Frames taken from the receiver", lambda: receiver.frame_count)
+
+def register_capture_metrics(metrics: BridgeMetrics, capture: SdcardWriter):
+    """Export the SD card capture's counters"""
+    metrics.add_source("capture_frames", "Frames written to the SD card capture",
+                       lambda: capture.frames_written)
+    metrics.add_source("capture_dropped_frames", "Frames the SD card capture writer had no room for",
+                       lambda: capture.dropped)
+
+def register_cadence_metrics(metrics: BridgeMetrics, cadence: FrameCadence):
+    """Export the output clock's jitter and how often it repeated or skipped frames"""
+    metrics.histograms["cadence_input_jitter"] = cadence.input_jitter
+    metrics.histograms["cadence_output_jitter"] = cadence.output_jitter
+    metrics.add_source("cadence_repeated_frames", "Output ticks that repeated the previous frame",
+                       lambda: cadence.repeats)
+    metrics.add_source("cadence_skipped_frames", "Frames skipped because the jitter buffer was full",
+                       lambda: cadence.skips)
+    metrics.add_source("cadence_missed_ticks", "Output ticks dropped because the clock woke up too late",
+                       lambda: cadence.missed_ticks)
+
+def register_upconversion_metrics(metrics: BridgeMetrics, upconverter: FrameUpconverter):
+    """Export what synthesizing frames costs and how often it was cut short or fell back"""
+    metrics.histograms["upconvert_render"] = upconverter.render_time
+    metrics.histograms["upconvert_estimate"] = upconverter.estimate_time
+    metrics.add_source("upconvert_synthesized_frames", "Frames synthesized between input frames",
+                       lambda: upconverter.synthesized)
+    metrics.add_source("upconvert_cut_short", "Input frames that arrived before the previous one's outputs were sent",
+                       lambda: upconverter.cut_short)
+    metrics.add_source("upconvert_fallbacks", "Times motion compensation went over budget and fell back to blending",
+                       lambda: upconverter.fallbacks)
+
+def register_output_metrics(metrics: BridgeMetrics, outputs: List[SerialOutput]):
+    """Export each serial output's counters, labelled by its position top to bottom"""
+    for index, output in enumerate(outputs):
+        sender = output.sender
+        metrics.add_source(f"output{index}_frames", f"Frames written to {output.name}",
+                           lambda sender=sender: sender.frame_count)
+        metrics.add_source(f"output{index}_bytes", f"Bytes written to {output.name}",
+                           lambda sender=sender: sender.bytes_sent)
+        metrics.add_source(f"output{index}_write_errors", f"Failed serial writes to {output.name}",
+                           lambda output=output: output.write_errors)
+
+def register_telemetry_metrics(metrics: BridgeMetrics, outputs: List[SerialOutput]):
+    """Export what the firmware reports back and how often the send rate backed off"""
+    for index, output in enumerate(outputs):
+        prefix = f"output{index}_" if len(outputs) > 1 else ""
+        telemetry = output.sender.telemetry
+        if telemetry:
+            metrics.add_source(f"{prefix}device_overflows", "OPC buffer overflows the firmware reported",
+                               lambda telemetry=telemetry: telemetry.overflows)
+            metrics.add_source(f"{prefix}device_invalid_frames", "Invalid OPC frames the firmware reported",
+                               lambda telemetry=telemetry: telemetry.invalid_frames)
+        if output.rate:
+            metrics.add_source(f"{prefix}rate_backoffs", "Times the send rate was cut back for the device",
+                               lambda rate=output.rate: rate.backoffs)
+        acks = output.sender.acks
+        if acks:
+            metrics.histograms[f"{prefix}ack_round_trip"] = acks.round_trips
+            metrics.add_source(f"{prefix}ack_lost_frames", "Frames in flight the firmware reported invalid",
+                               lambda acks=acks: acks.lost_frames)
+            metrics.add_source(f"{prefix}ack_timeouts", "Frames in flight never acknowledged",
+                               lambda acks=acks: acks.timeouts)
+
+def run_threaded_engine(receiver: ArtnetReceiver, outputs: List[SerialOutput], metrics: BridgeMetrics = None,
+                        capture: SdcardWriter = None, clock: OutputClock = None):
+    """Receiver thread, encode stage on this thread and a serial writer thread per output"""
+    if not receiver.start():
+        print("Failed to start Artnet receiver")
+        return
+
+    pipeline = BridgePipeline(receiver, outputs, metrics, capture, clock)
+    if metrics:
+        metrics.add_source("overwritten_frames", "Encoded frames replaced before the serial writers took them",
+                           lambda: pipeline.release.dropped)
+        metrics.add_source("serial_write_errors", "Failed serial writes", lambda: pipeline.write_errors)
+    pipeline.start()
+
+    try:
+        print("Bridge active - waiting for Artnet data from Resolume...")
+        last_status_time = time.time()
+
+        while True:
+            # Encode each assembled frame and hand it to the serial writer
+            pipeline.encode_stage(timeout=1.0)
+
+            # Status update every 5 seconds
+            if time.time() - last_status_time > STATUS_INTERVAL:
+                print_status(receiver, outputs, pipeline.release.dropped, metrics, capture, clock)
+                last_status_time = time.time()
+    finally:
+        receiver.stop()
+        pipeline.stop()
+
+async def run_asyncio_engine(receiver: ArtnetReceiver, output: SerialOutput, bind_ip: str = "0.0.0.0",
+                             metrics: BridgeMetrics = None, capture: SdcardWriter = None,
+                             clock: OutputClock = None):
+    """Art-Net ingestion, serial output and timers as tasks on one event loop"""
+    loop = asyncio.get_running_loop()
+    sender = output.sender
+    free_frames = queue.SimpleQueue()
+    for _ in range(ENCODED_FRAME_POOL_SIZE):
+        free_frames.put(EncodedFrame(sender.frame_size))
+    writer = AsyncSerialWriter(loop, sender, free_frames, metrics, output.rate)
+    if metrics:
+        metrics.add_source("overwritten_frames", "Encoded frames replaced before the serial writer took them",
+                           lambda: writer.dropped)
+        metrics.add_source("serial_write_errors", "Failed serial writes", lambda: writer.write_errors)
+
+    clock_changed = asyncio.Event()
+
+    def on_frame():
+        if clock:
+            clock.push(receiver.get_frame_data(), receiver.frame_first_universe_time,
+                       receiver.frame_complete_time, time.monotonic())
+            clock_changed.set()
+            return
+        encoded = free_frames.get_nowait()
+        encode_received_frame(receiver, [output], [encoded], capture)
+        if metrics:
+            metrics.frame_encoded(encoded)
+        writer.submit(encoded)
+
+    async def clock_timer():
+        while True:
+            # A pushed frame can start or move the next tick, so wake up for those too
+            clock_changed.clear()
+            delay = None if clock.next_tick is None else clock.next_tick - time.monotonic()
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(clock_changed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            encoded = free_frames.get_nowait()
+            if not encode_clock_frame(clock, [output], [encoded], capture):
+                free_frames.put(encoded)
+                continue
+            if metrics:
+                metrics.frame_encoded(encoded)
+            writer.submit(encoded)
+
+    async def deadline_timer():
+        while True:
+            await asyncio.sleep(receiver.frame_deadline / 2)
+            receiver._check_deadline(time.monotonic())
+            if receiver.frame_complete.is_set():
+                on_frame()
+
+    async def status_timer():
+        while True:
+            await asyncio.sleep(STATUS_INTERVAL)
+            print_status(receiver, [output], writer.dropped, metrics, capture, clock)
+
+    sock = receiver.open_socket(bind_ip)
+    sock.setblocking(False)
+    transport, _ = await loop.create_datagram_endpoint(lambda: ArtnetProtocol(receiver, on_frame), sock=sock)
+    print(f"Artnet receiver started on {bind_ip}:{ARTNET_PORT} "
+          f"(asyncio, SO_RCVBUF {receiver.rcvbuf_granted} bytes, serial writes via {writer.mode})")
+    print("Bridge active - waiting for Artnet data from Resolume...")
+
+    try:
+        timers = [deadline_timer(), status_timer()] + ([clock_timer()] if clock else [])
+        await asyncio.gather(*timers)
+    finally:
+        transport.close()
+        if writer.fd is not None:
+            loop.remove_writer(writer.fd)
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Receive Artnet data from Resolume and forward it via OPC over Serial to Teensy")
+    parser.add_argument("port", nargs="?",
+                        help="serial port, e.g. COM3 or /dev/ttyACM0 (auto-detected if omitted, 'scan' lists ports)")
+    parser.add_argument("--scan", "-s", action="store_true",
+                        help="list available serial ports and exit")
+    parser.add_argument("--outputs", nargs="+", metavar="PORT[:PANELS]",
+                        help="fan the matrix out over several Teensys, top to bottom, each driving PANELS panel "
+                             "rows (ports without a count share the rest evenly); needs --engine threaded")
+    parser.add_argument("--panels", type=int, default=MATRIX_HEIGHT // PANEL_HEIGHT,
+                        help="panel rows in the drawing area across all outputs (default: %(default)s)")
+    parser.add_argument("--engine", choices=["threaded", "asyncio"], default="threaded",
+                        help="threaded: receiver, encoder and serial writer threads; "
+                             "asyncio: everything on one event loop (default: %(default)s)")
+    parser.add_argument("--frame-deadline", type=float, default=FRAME_DEADLINE * 1000,
+                        help="ms after the first universe before a partial frame is sent, "
+                             "missing universes repeat the previous frame (default: %(default).0f)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="max Art-Net packets taken per wakeup, uses recvmmsg on Linux (default: %(default)s)")
+    parser.add_argument("--rcvbuf", type=int, default=DEFAULT_RCVBUF,
+                        help="UDP socket receive buffer in bytes (default: %(default)s)")
+    parser.add_argument("--delta", action="store_true",
+                        help="only send the pixels that changed since the last frame "
+                             "(needs the matching smartmatrix-serial-5panel firmware)")
+    parser.add_argument("--keyframe-interval", type=int, default=KEYFRAME_INTERVAL,
+                        help="frames between full keyframes in delta mode (default: %(default)s)")
+    parser.add_argument("--compress", action="store_true",
+                        help="run-length encode frames when that is smaller than sending them raw "
+                             "(needs the matching smartmatrix-serial-5panel firmware)")
+    parser.add_argument("--host-color", action="store_true",
+                        help="do interpolation, color boost, gamma and dithering here instead of on the Teensy "
+                             "(needs the matching smartmatrix-serial-5panel firmware)")
+    parser.add_argument("--gamma", type=float, nargs="+", metavar="GAMMA",
+                        help="gamma correction with --host-color, one value or R G B (default: off)")
+    parser.add_argument("--color-boost", type=float,
+                        help="color boost with --host-color, e.g. 1.2 (default: off)")
+    parser.add_argument("--no-interpolation", action="store_true",
+                        help="disable frame interpolation with --host-color")
+    parser.add_argument("--no-dither", action="store_true",
+                        help="disable temporal dithering with --host-color")
+    parser.add_argument("--rate-control", action="store_true",
+                        help="read the firmware's fps, frame timing and overflow reports and send no faster "
+                             "than it keeps up with (needs the matching smartmatrix-serial-5panel firmware)")
+    parser.add_argument("--ack-window", type=int, default=0, metavar="FRAMES",
+                        help="have the firmware acknowledge each frame it displays and keep at most FRAMES "
+                             "frames unacknowledged, 0 for off (needs the matching smartmatrix-serial-5panel "
+                             "firmware, default: %(default)s)")
+    parser.add_argument("--max-fps", type=float, default=0.0,
+                        help="never send more frames per second than this, 0 for no limit (default: %(default)s)")
+    parser.add_argument("--cadence", type=float, default=0.0, metavar="FPS",
+                        help="send frames at this constant rate from a jitter buffer, repeating or skipping "
+                             "frames when the input runs at another rate, 0 for off (default: %(default)s)")
+    parser.add_argument("--cadence-buffer", type=int, default=DEFAULT_DEPTH, metavar="FRAMES",
+                        help="frames the --cadence jitter buffer aims to hold, each adds a frame of latency "
+                             "(default: %(default)s)")
+    parser.add_argument("--upconvert", type=int, default=0, metavar="FACTOR",
+                        help=f"send FACTOR frames per Art-Net frame, synthesizing the ones in between, "
+                             f"2 to {MAX_FACTOR} or 0 for off (default: %(default)s)")
+    parser.add_argument("--upconvert-motion", action="store_true",
+                        help="motion-compensate the synthesized frames per tile instead of cross-fading")
+    parser.add_argument("--upconvert-search", type=int, default=DEFAULT_SEARCH, metavar="PIXELS",
+                        help="motion search range each way with --upconvert-motion (default: %(default)s)")
+    parser.add_argument("--layout", default=str(DEFAULT_PRESET), metavar="PRESET",
+                        help="Resolume Advanced Output preset that maps universes to matrix pixels "
+                             "(default: the SmartMatrix cubey map preset)")
+    parser.add_argument("--no-layout", action="store_true",
+                        help="ignore the preset, universes fill the matrix in order")
+    parser.add_argument("--record", metavar="FILE",
+                        help="record the incoming Art-Net packets to a new file, play it back with artnet-replay.py")
+    parser.add_argument("--capture-sd", metavar="FILE",
+                        help="also write the frames to a new output.bin for videosdcard-smartmatrix-5panel.ino")
+    parser.add_argument("--metrics-port", type=int, nargs="?", const=DEFAULT_METRICS_PORT, metavar="PORT",
+                        help=f"serve Prometheus metrics on http://127.0.0.1:PORT/metrics "
+                             f"(PORT defaults to {DEFAULT_METRICS_PORT})")
+    parser.add_argument("--metrics-host", default="127.0.0.1",
+                        help="address for --metrics-port, 0.0.0.0 to allow remote scrapes (default: %(default)s)")
+    args = parser.parse_args()
+    if args.gamma and len(args.gamma) not in (1, 3):
+        parser.error("--gamma takes one value or three (R G B)")
+    if args.panels < 1:
+        parser.error("--panels must be at least 1")
+    if args.max_fps < 0:
+        parser.error("--max-fps can't be negative")
+    if args.ack_window < 0:
+        parser.error("--ack-window can't be negative")
+    if args.cadence < 0:
+        parser.error("--cadence can't be negative")
+    if args.cadence_buffer < 1:
+        parser.error("--cadence-buffer must be at least 1")
+    if args.upconvert and not 2 <= args.upconvert <= MAX_FACTOR:
+        parser.error(f"--upconvert takes a factor from 2 to {MAX_FACTOR}")
+    if not 1 <= args.upconvert_search <= MAX_SEARCH:
+        parser.error(f"--upconvert-search must be from 1 to {MAX_SEARCH}")
+    if args.upconvert and args.cadence:
+        parser.error("--upconvert and --cadence both set the output clock, use one")
+    if not args.outputs and args.panels > MAX_PANELS_PER_OUTPUT:
+        parser.error(f"one port carries at most {MAX_PANELS_PER_OUTPUT} panels in an OPC frame, "
+                     f"split larger matrices with --outputs")
+    if args.outputs and args.port:
+        parser.error("give either a port or --outputs, not both")
+    if args.outputs and len(args.outputs) > 1 and args.engine != "threaded":
+        parser.error("several --outputs need --engine threaded")
+    if args.capture_sd and ((args.outputs and len(args.outputs) > 1)
+                            or args.panels != MATRIX_HEIGHT // PANEL_HEIGHT):
+        parser.error("--capture-sd needs a single output of the 3 panel drawing area")
+    return args
 
 def main():
     # Parse command line arguments
-    if len(sys.argv) > 1:
-        if sys.argv[1] in ["--scan", "-s", "scan"]:
-            # Just scan for ports and exit
-            print("Scanning for available serial ports...\n")
-            find_teensy_ports()
-
-            print("\nTesting port connections:")
-            ports = serial.tools.list_ports.comports()
-            for port in ports:
-                test_port_connection(port.device)
+    args = parse_args()
+    if args.scan or args.port == "scan":
+        # Just scan for ports and exit
+        print("Scanning for available serial ports...\n")
+        find_teensy_ports()
+
+        print("\nTesting port connections:")
+        ports = serial.tools.list_ports.comports()
+        for port in ports:
+            test_port_connection(port.device)
+        return
+    elif args.outputs:
+        try:
+            output_specs = split_panels(args.panels, args.outputs)
+        except ValueError as e:
+            print(f"Invalid --outputs: {e}")
             return
-        else:
-            port = sys.argv[1]
+    elif args.port:
+        output_specs = [(args.port, 0, args.panels)]
     else:
         # Auto-detect port
         print("No port specified, scanning for Teensy...\n")
         auto_port = find_teensy_ports()
         if auto_port:
             port = auto_port
+            output_specs = [(port, 0, args.panels)]
             print(f"\nAuto-detected port: {port}")
             if not test_port_connection(port):
                 print("Auto-detected port failed connection test. Please specify port manually.")
@@ -297,61 +1488,159 @@ def main():
             print("Use: python artnet-to-serial-sender.py --scan to see all ports")
             return
 
+    matrix_height = args.panels * PANEL_HEIGHT
+    num_pixels = MATRIX_WIDTH * matrix_height
     print(f"\nArtnet to OPC Serial Bridge")
-    print(f"Matrix: {MATRIX_WIDTH}x{MATRIX_HEIGHT} ({NUM_PIXELS} pixels)")
-    print(f"Serial Port: {port}")
-    print(f"Artnet: {NUM_UNIVERSES} universes, {LEDS_PER_UNIVERSE} LEDs/universe")
+    print(f"Matrix: {MATRIX_WIDTH}x{matrix_height} ({num_pixels} pixels)")
+    if len(output_specs) == 1:
+        print(f"Serial Port: {output_specs[0][0]}")
+    else:
+        for port, first_panel, panels in output_specs:
+            print(f"Serial Port: {port}, {panel_range(first_panel, panels)}")
+    print(f"Engine: {args.engine}")
+    if args.delta:
+        print(f"Delta frames: on (keyframe every {args.keyframe_interval} frames)")
+    if args.compress:
+        print("Compressed frames: on")
+    if args.rate_control or args.max_fps:
+        print(f"Rate control: {'on' if args.rate_control else 'off'}"
+              f"{f', at most {args.max_fps:g} fps' if args.max_fps else ''}")
+    if args.ack_window:
+        print(f"Frame acks: at most {args.ack_window} frames in flight")
+    if args.cadence:
+        print(f"Cadence: {args.cadence:g} fps from a {args.cadence_buffer} frame jitter buffer")
+    if args.upconvert:
+        print(f"Upconversion: {args.upconvert}x the Art-Net rate, "
+              f"{f'motion-compensated (+-{args.upconvert_search} px)' if args.upconvert_motion else 'blended'}")
+    gamma = args.gamma[0] if args.gamma and len(args.gamma) == 1 else args.gamma
+    if args.host_color:
+        print(f"Host color: gamma {gamma or 'off'}, boost {args.color_boost or 'off'}, "
+              f"interpolation {'off' if args.no_interpolation else 'on'}, "
+              f"dither {'off' if args.no_dither else 'on'}")
+    layout = PixelLayout.linear(num_pixels, LEDS_PER_UNIVERSE)
+    if not args.no_layout:
+        try:
+            layout = load_layout(args.layout, MATRIX_WIDTH, matrix_height, LEDS_PER_UNIVERSE)
+        except (OSError, ET.ParseError, LayoutError) as e:
+            print(f"Could not load layout {args.layout}: {e}")
+            print("Use --no-layout to fill the matrix with universes in order")
+            return
+        print(f"Layout: {layout.name} ({'linear' if layout.is_identity else 'remapped'})")
+    print(f"Artnet: {layout.num_universes} universes, {LEDS_PER_UNIVERSE} LEDs/universe")
     print(f"Listening on port {ARTNET_PORT}")
+
+    recorder = None
+    if args.record:
+        try:
+            recorder = ArtnetRecorder(args.record)
+        except OSError as e:
+            print(f"Could not start recording: {e}")
+            return
+        print(f"Recording Art-Net to {args.record}")
+
+    capture = None
+    if args.capture_sd:
+        try:
+            capture = SdcardWriter(args.capture_sd, num_pixels)
+        except (OSError, SdcardFormatError) as e:
+            if recorder:
+                recorder.close()
+            print(f"Could not start SD card capture: {e}")
+            return
+        print(f"Capturing frames to {args.capture_sd} for show mode"
+              f"{'' if args.host_color else ' (without --host-color, colors are not gamma corrected)'}")
     print("Press Ctrl+C to stop\n")
 
     # Initialize components
-    artnet_receiver = ArtnetReceiver()
-    opc_sender = OPCSender(port)
+    artnet_receiver = ArtnetReceiver(frame_deadline=args.frame_deadline / 1000,
+                                     batch_size=args.batch_size, rcvbuf=args.rcvbuf, layout=layout,
+                                     recorder=recorder)
+    outputs = []
+    for port, first_panel, panels in output_specs:
+        rows = panels * PANEL_HEIGHT
+        # Each output's color pipeline keeps its own interpolation and dither state for its band
+        color_pipeline = None
+        if args.host_color:
+            color_pipeline = ColorPipeline(MATRIX_WIDTH, rows, gamma=gamma, color_boost=args.color_boost,
+                                           interpolation=not args.no_interpolation, dither=not args.no_dither)
+        sender = OPCSender(port, delta=args.delta, keyframe_interval=args.keyframe_interval,
+                           compress=args.compress, color_pipeline=color_pipeline,
+                           frame_size=MATRIX_WIDTH * rows * 3, telemetry=args.rate_control,
+                           ack_window=args.ack_window)
+        rate = None
+        if args.rate_control or args.max_fps:
+            rate = RateController(sender.telemetry, max_fps=args.max_fps)
+        outputs.append(SerialOutput(sender, first_panel * PANEL_HEIGHT, rows, rate))
+    metrics = BridgeMetrics()
+    register_receiver_metrics(metrics, artnet_receiver)
+    if capture:
+        register_capture_metrics(metrics, capture)
+    if len(outputs) > 1:
+        register_output_metrics(metrics, outputs)
+    register_telemetry_metrics(metrics, outputs)
+    clock = None
+    if args.cadence:
+        clock = FrameCadence(args.cadence, num_pixels * 3, args.cadence_buffer)
+        register_cadence_metrics(metrics, clock)
+    elif args.upconvert:
+        clock = FrameUpconverter(MATRIX_WIDTH, matrix_height, args.upconvert, motion=args.upconvert_motion,
+                                 search=args.upconvert_search)
+        register_upconversion_metrics(metrics, clock)
 
     # Connect serial
-    if not opc_sender.connect():
+    connected = []
+    for output in outputs:
+        if not output.sender.connect():
+            break
+        connected.append(output)
+    if len(connected) < len(outputs):
+        for output in connected:
+            output.sender.disconnect()
+        if recorder:
+            recorder.close()
+        if capture:
+            capture.close()
         print("\nSerial connection failed. Try:")
         print("  python artnet-to-serial-sender.py --scan")
         print("  python artnet-to-serial-sender.py COMx  (replace x with correct number)")
         return
 
-    # Start Artnet receiver
-    if not artnet_receiver.start():
-        print("Failed to start Artnet receiver")
-        opc_sender.disconnect()
-        return
+    metrics_server = None
+    if args.metrics_port:
+        try:
+            metrics_server = MetricsServer(metrics, args.metrics_host, args.metrics_port)
+            metrics_server.start()
+            print(f"Metrics on {metrics_server.address}")
+        except OSError as e:
+            print(f"Could not start metrics endpoint: {e}")
 
     try:
-        print("Bridge active - waiting for Artnet data from Resolume...")
-        frames_sent = 0
-        last_status_time = time.time()
-
-        while True:
-            # Wait for complete Artnet frame (all 73 universes)
-            if artnet_receiver.wait_for_frame(timeout=1.0):
-                # Get pixel data from Artnet
-                pixels = artnet_receiver.get_frame_data()
-
-                # Send via OPC over Serial
-                if opc_sender.send_frame(pixels):
-                    frames_sent += 1
-
-                    # Status update every 5 seconds
-                    if time.time() - last_status_time > 5.0:
-                        print(f"Frames bridged: {frames_sent} (Artnet: {artnet_receiver.frame_count})")
-                        last_status_time = time.time()
-            else:
-                # Timeout - no Artnet data received
-                # print("No Artnet data received in 1 second...")
-                pass
+        if args.engine == "asyncio":
+            asyncio.run(run_asyncio_engine(artnet_receiver, outputs[0], metrics=metrics, capture=capture,
+                                           clock=clock))
+        else:
+            run_threaded_engine(artnet_receiver, outputs, metrics, capture, clock)
 
     except KeyboardInterrupt:
         print("\nStopping bridge...")
     finally:
         # Clean shutdown
         artnet_receiver.stop()
-        opc_sender.send_black_frame()
-        opc_sender.disconnect()
+        if recorder:
+            recorder.close()
+            print(f"Recorded {recorder.packets} packets ({recorder.bytes_written} bytes) to {args.record}")
+            if recorder.error:
+                print(f"Recording stopped early, {recorder.dropped} packets dropped: {recorder.error}")
+        if capture:
+            capture.close()
+            print(f"Captured {capture.frames_written} frames to {args.capture_sd} ({capture.dropped} dropped)")
+            if capture.error:
+                print(f"SD card capture stopped early: {capture.error}")
+        if metrics_server:
+            metrics_server.stop()
+        for output in outputs:
+            output.sender.send_black_frame()
+            output.sender.disconnect()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
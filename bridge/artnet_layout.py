@@ -0,0 +1,244 @@
+"""
+Art-Net universe to matrix pixel layout from a Resolume Advanced Output preset
+
+The preset (resolume/Presets/Advanced Output/*.xml) lists the DMX slices of
+each lumiverse: a pixel fixture of Width x Height pixels starting at a DMX
+channel, Distribution pixels per universe, with optional flip and output
+rotation. parse_preset() reads that, build_pixel_map() turns it into one
+index per matrix pixel, and PixelLayout.remap() applies it to a frame with
+a single NumPy gather.
+
+Indexes point into the receiver's universe slots: universe u, pixel i is
+stream pixel u * leds_per_universe + i. Matrix pixels no slice covers point
+one past the last slot, which the receiver keeps black.
+
+Slices are placed on the matrix in DMX order, left to right and then top to
+bottom, the way the 64x32 slices of the cube preset stack into panels. Each
+fixture is addressed row by row from its top left pixel. Flip bit 0 mirrors
+horizontally and bit 1 vertically, and the OutputRect orientation rotates
+the slice in quarter turns.
+
+Tables are cached in ~/.cache/spectral-sonata, keyed by a hash of the preset,
+the fixture library and the matrix geometry.
+"""
+
+import hashlib
+import math
+import os
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import numpy as np
+
+DMX_UNIVERSE_CHANNELS = 512
+LAYOUT_CACHE_VERSION = 1
+
+DEFAULT_PRESET = (Path(__file__).resolve().parent.parent / "resolume" / "Presets" / "Advanced Output"
+                  / "SmartMatrix cubey map.xml")
+DEFAULT_CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "spectral-sonata"
+
+
+class LayoutError(ValueError):
+    """The preset can't be turned into a layout for this matrix"""
+
+
+def _value(element, name: str, default=None):
+    """value attribute of the first descendant param called name"""
+    param = element.find(f".//*[@name='{name}']")
+    if param is None or param.get("value") is None:
+        return default
+    return param.get("value")
+
+
+def _fixture_library(preset_path: Path):
+    """resolume/Fixture Library next to resolume/Presets/Advanced Output/<preset>"""
+    return preset_path.resolve().parent.parent.parent / "Fixture Library"
+
+
+def _library_fixtures(fixture_dir: Path) -> dict:
+    """Pixel params of every fixture in the library, by uuid"""
+    fixtures = {}
+    if fixture_dir and fixture_dir.is_dir():
+        for path in sorted(fixture_dir.glob("*.xml")):
+            root = ET.parse(path).getroot()
+            pixels = root.find(".//ParamFixturePixels")
+            if root.get("uuid") and pixels is not None:
+                fixtures[root.get("uuid")] = pixels
+    return fixtures
+
+
+def parse_preset(path, fixture_dir=None) -> dict:
+    """Read the DMX screens and slices of an Advanced Output preset
+
+    Returns {"first_universe": n, "composition_size": (w, h), "slices": [...]}
+    where each slice is a dict with name, universe (relative to
+    first_universe), pixel offset in that universe, width, height,
+    distribution, flip, quarter_turns and input_rect, the four corners of
+    the composition area it samples in composition pixels (None if the
+    preset has none). Fixture sizes come from the copy stored in the
+    preset, or from the fixture library when the preset doesn't have one.
+    """
+    path = Path(path)
+    root = ET.parse(path).getroot()
+    library = None
+    screens = []
+
+    for screen in root.iter("DmxScreen"):
+        device = screen.find(".//DmxOutputParams")
+        base = 0
+        if device is not None:
+            base = int(float(_value(device, "Subnet", 0))) * 16 + int(float(_value(device, "Universe", 0)))
+
+        slices = []
+        for dmx_slice in screen.iter("DmxSlice"):
+            if _value(dmx_slice.find("Params[@name='Common']"), "Enabled", "1") != "1":
+                continue
+
+            pixels = dmx_slice.find("FixtureInstance//ParamFixturePixels")
+            if pixels is None:
+                if library is None:
+                    library = _library_fixtures(Path(fixture_dir) if fixture_dir else _fixture_library(path))
+                pixels = library.get(_value(dmx_slice, "Fixture"))
+            if pixels is None:
+                raise LayoutError(f"{path.name}: no pixel fixture for slice {_value(dmx_slice, 'Name')!r}")
+
+            start = int(float(_value(dmx_slice, "Start Channel", 1))) - 1
+            input_rect = [(float(v.get("x")), float(v.get("y"))) for v in dmx_slice.findall("InputRect/v")]
+            output = dmx_slice.find("OutputRect")
+            orientation = float(output.get("orientation", 0)) if output is not None else 0.0
+            slices.append({
+                "name": _value(dmx_slice, "Name", ""),
+                "universe": base + start // DMX_UNIVERSE_CHANNELS,
+                "offset": (start % DMX_UNIVERSE_CHANNELS) // 3,
+                "width": int(float(_value(pixels, "Width"))),
+                "height": int(float(_value(pixels, "Height"))),
+                "distribution": int(_value(pixels, "Distribution", 170)),
+                "flip": int(_value(dmx_slice, "Flip", 0)),
+                "quarter_turns": round(orientation / (math.pi / 2)) % 4,
+                "input_rect": input_rect if len(input_rect) == 4 else None,
+            })
+        screens.append(slices)
+
+    all_slices = [s for slices in screens for s in slices]
+    if not all_slices:
+        raise LayoutError(f"{path.name}: no enabled DMX slices")
+    first_universe = min(s["universe"] for s in all_slices)
+    for s in all_slices:
+        s["universe"] -= first_universe
+    size = root.find(".//CurrentCompositionTextureSize")
+    composition_size = (int(size.get("width")), int(size.get("height"))) if size is not None else None
+    return {"first_universe": first_universe, "composition_size": composition_size, "slices": all_slices}
+
+
+def slice_pixels(s: dict, leds_per_universe: int) -> np.ndarray:
+    """Stream pixel index of every fixture pixel of a slice, in fixture order"""
+    if s["distribution"] > leds_per_universe:
+        raise LayoutError(f"slice {s['name']!r}: {s['distribution']} pixels per universe, "
+                          f"the receiver has room for {leds_per_universe}")
+    pixel = s["offset"] + np.arange(s["width"] * s["height"])
+    universe = s["universe"] + pixel // s["distribution"]
+    return universe * leds_per_universe + pixel % s["distribution"]
+
+
+def build_pixel_map(slices, matrix_width: int, matrix_height: int, leds_per_universe: int):
+    """Matrix pixel -> stream pixel table for a list of slices from parse_preset
+
+    Returns (pixel_map, num_universes). Unmapped matrix pixels get
+    num_universes * leds_per_universe, the black pixel past the last slot.
+    """
+    pixel_map = np.full((matrix_height, matrix_width), -1, dtype=np.int32)
+    num_universes = 0
+    x = y = band_height = 0
+
+    for s in sorted(slices, key=lambda s: (s["universe"], s["offset"])):
+        stream = slice_pixels(s, leds_per_universe)
+        num_universes = max(num_universes, int(stream[-1]) // leds_per_universe + 1)
+
+        tile = stream.reshape(s["height"], s["width"])
+        if s["flip"] & 1:
+            tile = tile[:, ::-1]
+        if s["flip"] & 2:
+            tile = tile[::-1, :]
+        tile = np.rot90(tile, -s["quarter_turns"])  # clockwise
+
+        tile_height, tile_width = tile.shape
+        if x + tile_width > matrix_width:
+            x, y, band_height = 0, y + band_height, 0
+        if tile_width > matrix_width or y + tile_height > matrix_height:
+            raise LayoutError(f"slice {s['name']!r} doesn't fit on the {matrix_width}x{matrix_height} matrix")
+        pixel_map[y:y + tile_height, x:x + tile_width] = tile
+        x += tile_width
+        band_height = max(band_height, tile_height)
+
+    pixel_map[pixel_map < 0] = num_universes * leds_per_universe
+    return pixel_map.reshape(-1), num_universes
+
+
+class PixelLayout:
+    """A matrix pixel -> Art-Net stream pixel table"""
+
+    def __init__(self, pixel_map: np.ndarray, num_universes: int, first_universe: int = 0,
+                 leds_per_universe: int = 170, name: str = ""):
+        self.pixel_map = np.ascontiguousarray(pixel_map, dtype=np.intp)  # what np.take wants, no per-frame cast
+        self.num_universes = num_universes
+        self.first_universe = first_universe
+        self.leds_per_universe = leds_per_universe
+        self.name = name
+        self.stream_pixels = num_universes * leds_per_universe
+        self.is_identity = bool(np.array_equal(pixel_map, np.arange(len(pixel_map))))
+
+    @classmethod
+    def linear(cls, num_pixels: int, leds_per_universe: int = 170):
+        """Universes filling the matrix in order, the layout before presets were read"""
+        num_universes = (num_pixels + leds_per_universe - 1) // leds_per_universe
+        return cls(np.arange(num_pixels, dtype=np.int32), num_universes, 0, leds_per_universe, "linear")
+
+    def remap(self, source, out):
+        """Gather the matrix frame out of a stream buffer of stream_pixels + 1 pixels"""
+        src = np.frombuffer(source, dtype=np.uint8, count=(self.stream_pixels + 1) * 3).reshape(-1, 3)
+        dst = np.frombuffer(out, dtype=np.uint8).reshape(-1, 3)
+        # mode='clip' writes straight into out, 'raise' would go through a temporary
+        np.take(src, self.pixel_map, axis=0, out=dst, mode='clip')
+
+
+def _cache_key(preset_path: Path, fixture_dir: Path, matrix_width: int, matrix_height: int,
+               leds_per_universe: int) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{LAYOUT_CACHE_VERSION}:{matrix_width}x{matrix_height}:{leds_per_universe}".encode())
+    digest.update(preset_path.read_bytes())
+    if fixture_dir.is_dir():
+        for path in sorted(fixture_dir.glob("*.xml")):
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:32]
+
+
+def load_layout(path, matrix_width: int, matrix_height: int, leds_per_universe: int = 170,
+                fixture_dir=None, cache_dir=DEFAULT_CACHE_DIR) -> PixelLayout:
+    """PixelLayout for a preset, from the cache when the preset hasn't changed"""
+    path = Path(path)
+    fixture_dir = Path(fixture_dir) if fixture_dir else _fixture_library(path)
+    key = _cache_key(path, fixture_dir, matrix_width, matrix_height, leds_per_universe)
+    cache_file = Path(cache_dir) / f"layout-{key}.npz" if cache_dir else None
+
+    if cache_file and cache_file.exists():
+        try:
+            with np.load(cache_file) as cached:
+                return PixelLayout(cached["pixel_map"], int(cached["num_universes"]),
+                                   int(cached["first_universe"]), leds_per_universe, path.stem)
+        except (OSError, ValueError, KeyError):
+            pass  # unreadable cache, rebuild it
+
+    preset = parse_preset(path, fixture_dir)
+    pixel_map, num_universes = build_pixel_map(preset["slices"], matrix_width, matrix_height, leds_per_universe)
+
+    if cache_file:
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            temp = cache_file.with_suffix(".tmp.npz")
+            np.savez(temp, pixel_map=pixel_map, num_universes=num_universes,
+                     first_universe=preset["first_universe"])
+            os.replace(temp, cache_file)
+        except OSError:
+            pass  # caching is only an optimization
+
+    return PixelLayout(pixel_map, num_universes, preset["first_universe"], leds_per_universe, path.stem)
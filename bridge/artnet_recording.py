@@ -0,0 +1,125 @@
+"""
+Art-Net session recordings
+
+A recording is the raw UDP packets that reached the Art-Net port, each with
+the monotonic time it arrived, so a show can be replayed into the bridge
+with its original timing (see artnet-replay.py).
+
+File layout, all little-endian:
+    header: [magic "ARTNREC\\0"][version u16][reserved u16][wall clock start, float64 seconds]
+    record: [nanoseconds since the recording started u64][length u16][packet bytes]
+
+Records are only ever appended, so a recording cut short by a crash is
+readable up to its last complete record. The reader memory-maps the file.
+"""
+
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+
+RECORDING_MAGIC = b"ARTNREC\x00"
+RECORDING_VERSION = 1
+HEADER = struct.Struct('<8sHHd')
+RECORD_HEADER = struct.Struct('<QH')
+FLUSH_SIZE = 256 * 1024  # bytes collected before they are handed to the writer thread
+
+
+class RecordingError(ValueError):
+    """The file is not a recording this version can read"""
+
+
+class ArtnetRecorder:
+    """Appends packets to a new recording
+
+    write() is called from the receive path and only packs the packet into
+    a chunk in memory; full chunks are written to disk on a separate thread
+    so a slow disk doesn't hold up Art-Net reception. When writing fails,
+    the error is kept in error and later packets are dropped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "xb")
+        self.file.write(HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, 0, time.time()))
+        self.start_ns = time.monotonic_ns()
+        self.chunk = bytearray()
+        self.chunks = queue.SimpleQueue()
+        self.packets = 0
+        self.dropped = 0
+        self.bytes_written = HEADER.size
+        self.error = None
+        self.thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.thread.start()
+
+    def write(self, packet):
+        """Record one packet (any bytes-like object) with the current time"""
+        if self.error is not None:
+            self.dropped += 1
+            return
+        self.chunk += RECORD_HEADER.pack(time.monotonic_ns() - self.start_ns, len(packet))
+        self.chunk += packet
+        self.packets += 1
+        if len(self.chunk) >= FLUSH_SIZE:
+            self.chunks.put(self.chunk)
+            self.chunk = bytearray()
+
+    def close(self):
+        """Write what is left and close the file, error is set if the recording is incomplete"""
+        if self.chunk:
+            self.chunks.put(self.chunk)
+            self.chunk = bytearray()
+        self.chunks.put(None)
+        self.thread.join()
+        try:
+            self.file.close()
+        except OSError as e:
+            self.error = self.error or e
+
+    def _writer_loop(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                break
+            try:
+                self.file.write(chunk)
+                self.file.flush()
+            except OSError as e:
+                self.error = e  # write() stops queueing, the chunks left are dropped
+                break
+            self.bytes_written += len(chunk)
+
+
+class ArtnetRecording:
+    """Read-only, memory-mapped view of a recording"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            # mmap can't map an empty file
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise RecordingError(f"{path}: too short for a recording")
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.start_time = HEADER.unpack_from(self.map, 0)
+        if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+            self.map.close()
+            raise RecordingError(f"{path}: not an Art-Net recording (version {RECORDING_VERSION})")
+        self.view = memoryview(self.map)
+
+    def __iter__(self):
+        """(nanoseconds since start, packet memoryview) for every complete record"""
+        pos = HEADER.size
+        end = len(self.map)
+        while pos + RECORD_HEADER.size <= end:
+            timestamp, length = RECORD_HEADER.unpack_from(self.map, pos)
+            pos += RECORD_HEADER.size
+            if pos + length > end:
+                break
+            yield timestamp, self.view[pos:pos + length]
+            pos += length
+
+    def close(self):
+        self.view.release()
+        self.map.close()
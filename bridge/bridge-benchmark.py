@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Bridge Benchmarks
+Times the bridge hot paths one stage at a time on fixed synthetic input
+
+Usage:
+    python bridge-benchmark.py [options]
+
+Examples:
+    python bridge-benchmark.py
+    python bridge-benchmark.py --output baseline.json
+    python bridge-benchmark.py --compare baseline.json --threshold 15
+    python bridge-benchmark.py --stages opc_ pattern_plasma
+
+Each stage reports the time per call, frames per second and the peak
+memory allocated during a call (from tracemalloc). --output writes the
+results as JSON; --compare checks them against an earlier file and exits
+with status 1 if any stage got slower than the threshold allows.
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import struct
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+BRIDGE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BRIDGE_DIR))
+
+from artnet_layout import PixelLayout, build_pixel_map, parse_preset, DEFAULT_PRESET
+from bridge_util import load_script
+from color_pipeline import ColorPipeline
+from cube_warp import DEFAULT_ISF, load_warp
+from frame_upconversion import FrameUpconverter
+
+RESULTS_VERSION = 1
+SEED = 1234
+REPEATS = 7
+MIN_REPEAT_TIME = 0.05  # seconds per timed repeat
+ALLOC_CALLS = 5
+UPCONVERT_FACTOR = 4
+WARP_SOURCE_SIZE = 1024  # flat frame for the cube warp, Resolume's composition size
+DEFAULT_THRESHOLD = 20.0  # percent slower than the baseline that fails a comparison
+
+
+bridge = load_script("artnet-to-serial-sender")
+patterns = load_script("test-serial-sender")
+
+
+class NullSerial:
+    """Serial port stand-in that accepts everything instantly"""
+    is_open = True
+
+    def write(self, data):
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def artnet_packets(frame: bytes, sequence: int = 1):
+    """ArtDmx packets for every universe of a packed RGB frame"""
+    packets = []
+    for universe in range(bridge.NUM_UNIVERSES):
+        data = frame[universe * bridge.UNIVERSE_SIZE:(universe + 1) * bridge.UNIVERSE_SIZE]
+        data = data.ljust(bridge.UNIVERSE_SIZE, b"\x00")
+        header = (bridge.ARTNET_HEADER + struct.pack('<H', bridge.ARTNET_OPCODE_DMX)
+                  + struct.pack('>H', 14) + bytes((sequence, 0))
+                  + struct.pack('<H', universe) + struct.pack('>H', len(data)))
+        packets.append(header + data)
+    return packets
+
+
+def synthetic_frames(count: int = 8):
+    """Frames with flat areas, gradients and a moving bar, like typical show content"""
+    rng = np.random.default_rng(SEED)
+    y, x = np.mgrid[0:bridge.MATRIX_HEIGHT, 0:bridge.MATRIX_WIDTH]
+    frames = []
+    for i in range(count):
+        frame = np.zeros((bridge.MATRIX_HEIGHT, bridge.MATRIX_WIDTH, 3), dtype=np.uint8)
+        frame[..., 0] = (x * 4 + i * 8) % 256
+        frame[..., 1] = (y + i * 3) % 256
+        frame[96:, :, :] = 0
+        bar = (i * 12) % bridge.MATRIX_HEIGHT
+        frame[bar:bar + 8, :, 2] = rng.integers(0, 256, (min(8, bridge.MATRIX_HEIGHT - bar), bridge.MATRIX_WIDTH))
+        frames.append(frame.tobytes())
+    return frames
+
+
+def stage_parse_packet():
+    receiver = bridge.ArtnetReceiver()
+    packets = itertools.cycle(artnet_packets(synthetic_frames(1)[0]))
+    parse = receiver._parse_artnet_packet
+    return lambda: parse(next(packets)), 1 / bridge.NUM_UNIVERSES
+
+
+def stage_frame_assembly():
+    receiver = bridge.ArtnetReceiver()
+    packets = artnet_packets(synthetic_frames(1)[0])
+    parse = receiver._parse_artnet_packet
+
+    def assemble():
+        for packet in packets:
+            parse(packet)
+        receiver.get_frame_data()
+    return assemble, 1
+
+
+def stage_get_frame_data():
+    receiver = bridge.ArtnetReceiver()
+    return receiver.get_frame_data, 1
+
+
+def stage_get_frame_data_remap():
+    # The cube preset is linear, so mirror every slice to force a real gather
+    slices = parse_preset(DEFAULT_PRESET)["slices"]
+    for s in slices:
+        s["flip"] = 1
+    pixel_map, num_universes = build_pixel_map(slices, bridge.MATRIX_WIDTH, bridge.MATRIX_HEIGHT,
+                                               bridge.LEDS_PER_UNIVERSE)
+    receiver = bridge.ArtnetReceiver(layout=PixelLayout(pixel_map, num_universes))
+    return receiver.get_frame_data, 1
+
+
+def stage_opc_encode():
+    sender = bridge.OPCSender("benchmark")
+    encoded = bridge.EncodedFrame()
+    frame = synthetic_frames(1)[0]
+    return lambda: sender.encode_frame(frame, encoded), 1
+
+
+def _send_stage(**options):
+    sender = bridge.OPCSender("benchmark", **options)
+    sender.serial = NullSerial()
+    frames = itertools.cycle(synthetic_frames())
+    return lambda: sender.send_frame(next(frames)), 1
+
+
+def stage_opc_send_raw():
+    return _send_stage()
+
+
+def stage_opc_send_delta():
+    return _send_stage(delta=True)
+
+
+def stage_opc_send_compressed():
+    return _send_stage(compress=True)
+
+
+def stage_opc_send_delta_compressed():
+    return _send_stage(delta=True, compress=True)
+
+
+def stage_color_pipeline():
+    pipeline = ColorPipeline(bridge.MATRIX_WIDTH, bridge.MATRIX_HEIGHT, gamma=2.2, color_boost=1.2)
+    frames = itertools.cycle(synthetic_frames())
+    return lambda: pipeline.process(next(frames)), 1
+
+
+def stage_cube_warp():
+    warp = load_warp(DEFAULT_ISF, DEFAULT_PRESET, WARP_SOURCE_SIZE, WARP_SOURCE_SIZE, bridge.MATRIX_WIDTH,
+                     bridge.MATRIX_HEIGHT, bridge.LEDS_PER_UNIVERSE, cache_dir=None)
+    source = warp.source_buffer()
+    source[:warp.source_frame_size] = np.random.default_rng(SEED).integers(
+        0, 256, warp.source_frame_size, dtype=np.uint8).tobytes()
+    out = bytearray(bridge.FRAME_SIZE)
+    return lambda: warp.warp(source, out), 1
+
+
+def _upconvert_stage(motion: bool):
+    # Input frames 1/30 s apart, each followed by its synthesized frames and itself
+    upconverter = FrameUpconverter(bridge.MATRIX_WIDTH, bridge.MATRIX_HEIGHT, UPCONVERT_FACTOR, motion=motion)
+    frames = itertools.cycle(synthetic_frames())
+    clock = itertools.count()
+
+    def frame():
+        now = next(clock) / 30
+        upconverter.push(next(frames), now, now, now)
+        while upconverter.next_tick is not None:
+            upconverter.tick(upconverter.next_tick)
+    return frame, UPCONVERT_FACTOR
+
+
+def _pattern_stage(method: str, *args):
+    generator = patterns.PatternGenerator(bridge.MATRIX_WIDTH, bridge.MATRIX_HEIGHT)
+    draw = getattr(generator, method)
+
+    def frame():
+        draw(*args)
+        generator.update()
+    return frame, 1
+
+
+def stage_pattern_cached():
+    generator = patterns.PatternGenerator(bridge.MATRIX_WIDTH, bridge.MATRIX_HEIGHT)
+    draw = patterns.PATTERNS["checker"]
+
+    def render(t):
+        generator.time = t
+        return draw(generator)
+    ring = patterns.PatternCache().ring("checker", render, patterns.PATTERN_PERIODS["checker"],
+                                        generator.frame.shape)
+    generator.time = 0
+
+    def frame():
+        patterns.frame_payload(ring[generator.time % len(ring)])
+        generator.update()
+    return frame, 1
+
+
+STAGES = {
+    "parse_packet": stage_parse_packet,
+    "frame_assembly": stage_frame_assembly,
+    "get_frame_data": stage_get_frame_data,
+    "get_frame_data_remap": stage_get_frame_data_remap,
+    "opc_encode": stage_opc_encode,
+    "opc_send_raw": stage_opc_send_raw,
+    "opc_send_delta": stage_opc_send_delta,
+    "opc_send_compressed": stage_opc_send_compressed,
+    "opc_send_delta_compressed": stage_opc_send_delta_compressed,
+    "color_pipeline": stage_color_pipeline,
+    "cube_warp": stage_cube_warp,
+    "upconvert_linear": lambda: _upconvert_stage(False),
+    "upconvert_motion": lambda: _upconvert_stage(True),
+    "pattern_solid": lambda: _pattern_stage("solid_color", 255, 0, 0),
+    "pattern_rainbow": lambda: _pattern_stage("rainbow_horizontal"),
+    "pattern_rainbow_v": lambda: _pattern_stage("rainbow_vertical"),
+    "pattern_rainbow_d": lambda: _pattern_stage("rainbow_diagonal"),
+    "pattern_wave": lambda: _pattern_stage("moving_wave"),
+    "pattern_plasma": lambda: _pattern_stage("plasma"),
+    "pattern_checker": lambda: _pattern_stage("checkerboard"),
+    "pattern_cached": stage_pattern_cached,
+}
+
+
+def time_calls(fn, repeats: int = REPEATS, min_time: float = MIN_REPEAT_TIME):
+    """Seconds per call for each repeat, with the call count calibrated to min_time"""
+    fn()  # warm up caches and lazy setup
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 4:
+            break
+        calls *= 4
+    calls = max(1, int(calls * min_time / max(elapsed, 1e-9)))
+
+    results = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        results.append((time.perf_counter() - start) / calls)
+    return results, calls
+
+
+def peak_allocation(fn, calls: int = ALLOC_CALLS) -> int:
+    """Most memory allocated at once during a single call, in bytes"""
+    tracemalloc.start()
+    try:
+        peak = 0
+        for _ in range(calls):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            fn()
+            _, call_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, call_peak - before)
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run_stage(name: str, repeats: int, min_time: float) -> dict:
+    fn, frames_per_call = STAGES[name]()
+    times, calls = time_calls(fn, repeats, min_time)
+    per_call = statistics.median(times)
+    return {
+        "per_call_us": per_call * 1e6,
+        "min_us": min(times) * 1e6,
+        "fps": frames_per_call / per_call,
+        "alloc_peak_bytes": peak_allocation(fn),
+        "calls": calls,
+        "repeats": repeats,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Print the change per stage, returns the names of stages past the threshold"""
+    failed = []
+    print(f"\nCompared with baseline ({baseline.get('time', 'unknown time')}), threshold +{threshold:g}%:")
+    for name, result in results["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if not old:
+            print(f"  {name:28} new stage")
+            continue
+        change = (result["per_call_us"] / old["per_call_us"] - 1) * 100
+        status = "SLOWER" if change > threshold else "ok"
+        if change > threshold:
+            failed.append(name)
+        print(f"  {name:28} {old['per_call_us']:10.1f} -> {result['per_call_us']:10.1f} us  "
+              f"{change:+6.1f}%  {status}")
+    return failed
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Benchmark the bridge hot paths stage by stage")
+    parser.add_argument("--stages", nargs="+", metavar="PREFIX",
+                        help="only run stages whose name starts with one of these (default: all)")
+    parser.add_argument("--list", action="store_true", help="list the stages and exit")
+    parser.add_argument("--output", "-o", metavar="FILE", help="write the results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="compare against results from an earlier run")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="percent slower than the baseline that fails the run (default: %(default)s)")
+    parser.add_argument("--repeats", type=int, default=REPEATS,
+                        help="timed repeats per stage, the median is reported (default: %(default)s)")
+    parser.add_argument("--min-time", type=float, default=MIN_REPEAT_TIME,
+                        help="seconds per repeat (default: %(default)s)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.list:
+        print("\n".join(STAGES))
+        return 0
+
+    names = [name for name in STAGES
+             if not args.stages or any(name.startswith(prefix) for prefix in args.stages)]
+    if not names:
+        print("No stages match. Use --list to see them.")
+        return 2
+
+    results = {
+        "version": RESULTS_VERSION,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "stages": {},
+    }
+
+    print(f"Matrix: {bridge.MATRIX_WIDTH}x{bridge.MATRIX_HEIGHT}, {len(names)} stages\n")
+    print(f"  {'stage':28} {'us/call':>10} {'min us':>10} {'fps':>10} {'peak alloc':>12}")
+    for name in names:
+        result = run_stage(name, args.repeats, args.min_time)
+        results["stages"][name] = result
+        print(f"  {name:28} {result['per_call_us']:10.1f} {result['min_us']:10.1f} "
+              f"{result['fps']:10.0f} {result['alloc_peak_bytes']:10d} B")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        failed = compare(results, baseline, args.threshold)
+        if failed:
+            print(f"\n{len(failed)} stage(s) slower than the threshold: {', '.join(failed)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+Latency histograms and counters for the bridge
+
+Every frame carries the monotonic times of its first universe, its
+completion in the receiver, the end of encoding and the end of its serial
+write. BridgeMetrics turns those into per-stage latency histograms:
+
+    assembly  first universe -> frame complete
+    encode    frame complete -> encoded (includes waiting for the encode stage)
+    queue     encoded -> serial write starts (time spent in the mailbox)
+    write     one serial write + flush
+    total     first universe -> serial write returned
+
+The histograms are HDR-style: log-linear buckets with a fixed relative
+error (about 3%), so a whole installation day fits in a few hundred
+counters and p99 stays accurate. Counters owned by other objects (the
+receiver's incomplete frames, the writers' overwritten frames) are read
+through callbacks when exported.
+
+MetricsServer serves everything in Prometheus text format on /metrics.
+"""
+
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SUB_BUCKET_BITS = 6
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS = SUB_BUCKETS // 2
+MAX_VALUE_US = 100_000_000  # values above 100 s are clamped
+SERIAL_STALL_THRESHOLD = 0.050  # a serial write longer than this counts as a stall
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+DEFAULT_METRICS_PORT = 9108
+
+
+def _bucket_index(value_us: int) -> int:
+    if value_us < SUB_BUCKETS:
+        return value_us
+    magnitude = value_us.bit_length() - SUB_BUCKET_BITS
+    return SUB_BUCKETS + (magnitude - 1) * HALF_SUB_BUCKETS + (value_us >> magnitude) - HALF_SUB_BUCKETS
+
+
+def _bucket_value(index: int) -> float:
+    """Middle of the range of values that land in bucket index, in microseconds"""
+    if index < SUB_BUCKETS:
+        return float(index)
+    magnitude, sub = divmod(index - SUB_BUCKETS, HALF_SUB_BUCKETS)
+    magnitude += 1
+    sub += HALF_SUB_BUCKETS
+    return ((sub << magnitude) + ((sub + 1) << magnitude)) / 2
+
+
+class LatencyHistogram:
+    """Log-linear histogram of durations, recorded in seconds with microsecond resolution"""
+
+    def __init__(self):
+        self.counts = [0] * (_bucket_index(MAX_VALUE_US) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._interval_counts = list(self.counts)
+        self._interval_max = 0.0
+
+    def record(self, seconds: float):
+        if seconds < 0:
+            seconds = 0.0
+        self.counts[_bucket_index(min(int(seconds * 1e6), MAX_VALUE_US))] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if seconds > self._interval_max:
+            self._interval_max = seconds
+
+    def percentile(self, q: float) -> float:
+        """Value in seconds below which a fraction q of the recorded values fall"""
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(_bucket_value(index) / 1e6, self.max)
+        return self.max
+
+    def take_interval(self) -> "LatencyHistogram":
+        """A histogram of what was recorded since the previous call"""
+        interval = LatencyHistogram()
+        counts = list(self.counts)
+        interval.counts = [now - before for now, before in zip(counts, self._interval_counts)]
+        interval.count = sum(interval.counts)
+        interval.max = self._interval_max
+        self._interval_counts = counts
+        self._interval_max = 0.0
+        return interval
+
+
+class BridgeMetrics:
+    """Stage latency histograms and counters for one bridge run"""
+
+    STAGES = ("assembly", "encode", "queue", "write", "total")
+
+    def __init__(self):
+        self.start_time = time.monotonic()
+        self.histograms = {stage: LatencyHistogram() for stage in self.STAGES}
+        self.counters = {}   # name -> [help, value]
+        self.sources = {}    # name -> (help, callable) for counts kept elsewhere
+        self.add_counter("frames_written", "Frames whose serial write completed")
+        self.add_counter("serial_write_stalls",
+                         f"Serial writes that took longer than {SERIAL_STALL_THRESHOLD * 1000:.0f} ms")
+
+    def add_counter(self, name: str, help_text: str):
+        self.counters[name] = [help_text, 0]
+
+    def increment(self, name: str, amount: int = 1):
+        self.counters[name][1] += amount
+
+    def add_source(self, name: str, help_text: str, read):
+        """Export a count owned by another object, read() is called at export time"""
+        self.sources[name] = (help_text, read)
+
+    def frame_encoded(self, frame):
+        """Record the receive and encode stages of an EncodedFrame"""
+        if frame.first_universe_time is not None:
+            self.histograms["assembly"].record(frame.complete_time - frame.first_universe_time)
+        if frame.complete_time is not None:
+            self.histograms["encode"].record(frame.encoded_time - frame.complete_time)
+
+    def frame_written(self, frame, write_start: float, write_end: float):
+        """Record the queue and write stages once a frame's serial write returned"""
+        write_time = write_end - write_start
+        self.histograms["queue"].record(write_start - frame.encoded_time)
+        self.histograms["write"].record(write_time)
+        if frame.first_universe_time is not None:
+            self.histograms["total"].record(write_end - frame.first_universe_time)
+        self.increment("frames_written")
+        if write_time > SERIAL_STALL_THRESHOLD:
+            self.increment("serial_write_stalls")
+
+    def summary(self) -> str:
+        """One console line: p50/p99/max per stage since the previous summary"""
+        parts = []
+        for stage in self.STAGES:
+            interval = self.histograms[stage].take_interval()
+            parts.append(f"{stage} {interval.percentile(0.5) * 1000:.1f}/"
+                         f"{interval.percentile(0.99) * 1000:.1f}/{interval.max * 1000:.1f}")
+        return "Latency ms p50/p99/max: " + ", ".join(parts)
+
+    def prometheus_text(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for stage, histogram in self.histograms.items():
+            name = f"bridge_{stage}_latency_seconds"
+            lines.append(f"# HELP {name} Bridge {stage} stage latency")
+            lines.append(f"# TYPE {name} summary")
+            for q in QUANTILES:
+                lines.append(f'{name}{{quantile="{q}"}} {histogram.percentile(q):.6f}')
+            lines.append(f"{name}_sum {histogram.total:.6f}")
+            lines.append(f"{name}_count {histogram.count}")
+            lines.append(f"# HELP {name}_max Longest {stage} stage latency")
+            lines.append(f"# TYPE {name}_max gauge")
+            lines.append(f"{name}_max {histogram.max:.6f}")
+
+        counters = [(name, help_text, value) for name, (help_text, value) in self.counters.items()]
+        counters += [(name, help_text, read()) for name, (help_text, read) in self.sources.items()]
+        for name, help_text, value in counters:
+            lines.append(f"# HELP bridge_{name}_total {help_text}")
+            lines.append(f"# TYPE bridge_{name}_total counter")
+            lines.append(f"bridge_{name}_total {value}")
+
+        lines.append("# HELP bridge_uptime_seconds Seconds since the bridge started")
+        lines.append("# TYPE bridge_uptime_seconds gauge")
+        lines.append(f"bridge_uptime_seconds {time.monotonic() - self.start_time:.1f}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves BridgeMetrics on http://host:port/metrics from a daemon thread"""
+
+    def __init__(self, metrics: BridgeMetrics, host: str = "127.0.0.1", port: int = DEFAULT_METRICS_PORT):
+        metrics_ref = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics_ref.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # keep scrapes out of the console
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
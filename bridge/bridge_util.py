@@ -0,0 +1,34 @@
+"""
+Helpers shared by the bridge's command line tools
+
+The tools are scripts with hyphenated names, so the ones that reuse
+another script's classes import it with load_script(). wait_until() is the
+precise sleep they use to pace frames and packets.
+"""
+
+import importlib.util
+import time
+from pathlib import Path
+
+BRIDGE_DIR = Path(__file__).resolve().parent
+SPIN_THRESHOLD = 0.001  # below this, wait by spinning instead of sleeping
+
+
+def load_script(name: str):
+    """Import one of the hyphenated bridge scripts as a module"""
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), BRIDGE_DIR / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def wait_until(deadline: float, clock=time.perf_counter):
+    """Sleep until shortly before deadline on clock, then spin for accuracy
+
+    The spin yields the GIL on every pass, so other threads keep running.
+    """
+    while True:
+        remaining = deadline - clock()
+        if remaining <= 0:
+            return
+        time.sleep(remaining - SPIN_THRESHOLD if remaining > SPIN_THRESHOLD else 0)
@@ -0,0 +1,114 @@
+"""
+Host-side color processing for the LED cube
+
+Does what updateLeds() in smartmatrix-serial-5panel.ino does per LED
+(frame interpolation, color boost, gamma and temporal dithering) as a few
+NumPy operations over the whole frame. Color boost and gamma are folded
+into one 256-entry lookup table per channel, and dithering is a lookup into
+a precomputed (phase, value) table.
+
+When the bridge uses this, it tells the firmware to display frames as they
+arrive (OPTION_HOST_COLOR) so the Teensy doesn't process them twice.
+"""
+
+import time
+
+import numpy as np
+
+FRAME_INTERVAL = 0.033  # matches frameInterval in the firmware
+DITHER_PHASES = 8
+
+
+def build_channel_lut(gamma: float = None, color_boost: float = None) -> np.ndarray:
+    """Combined color boost + gamma table for one channel, same rounding as the firmware"""
+    values = np.arange(256, dtype=np.float64)
+    if color_boost:
+        # enhanceColor(): pow(v / 255, 1 / boost) * 255, truncated
+        values = np.floor(np.clip(np.power(values / 255.0, 1.0 / color_boost) * 255.0, 0, 255))
+    if gamma:
+        # initializeGammaLUT(): pow(v / 255, gamma) * 255, truncated
+        values = np.floor(np.power(values / 255.0, gamma) * 255.0)
+    return values.astype(np.uint8)
+
+
+def build_dither_lut() -> np.ndarray:
+    """Result of applyTemporalDither() for every (dither phase, value) pair"""
+    phase = np.arange(DITHER_PHASES, dtype=np.int32)[:, None]
+    value = np.arange(256, dtype=np.int32)[None, :]
+    amount = np.where(value < 32, (phase >> 1) - 1,
+                      np.where(value < 128, phase - 3, np.trunc((phase - 3) * 1.5).astype(np.int32)))
+    dithered = np.clip(value + amount, 0, 255)
+    # Very dark and full white values are left alone
+    dithered = np.where((value < 4) | (value == 255), value, dithered)
+    return dithered.astype(np.uint8)
+
+
+class ColorPipeline:
+    """Vectorized equivalent of the firmware's per-LED color processing"""
+
+    def __init__(self, width: int, height: int, gamma=None, color_boost: float = None,
+                 interpolation: bool = True, dither: bool = True, frame_interval: float = FRAME_INTERVAL):
+        """gamma is one value for all channels or an (r, g, b) tuple; None disables it"""
+        self.width = width
+        self.height = height
+        self.num_pixels = width * height
+        self.interpolation = interpolation
+        self.dither = dither
+        self.frame_interval = frame_interval
+
+        gammas = gamma if isinstance(gamma, (tuple, list)) else (gamma, gamma, gamma)
+        self.luts = np.stack([build_channel_lut(g, color_boost) for g in gammas])
+        self.channels = np.arange(3)[None, :]
+        self.identity_lut = all(np.array_equal(lut, np.arange(256)) for lut in self.luts)
+
+        self.dither_lut = build_dither_lut()
+        # Same per-pixel phase as (pixelIndex * 3 + ditherCounter) & 0x07
+        self.dither_phase = (np.arange(self.num_pixels, dtype=np.uint32) * 3 % DITHER_PHASES).astype(np.uint8)
+        self.dither_counter = 0
+
+        self.previous = np.zeros((self.num_pixels, 3), dtype=np.uint8)
+        self.has_previous = False
+        self.last_frame_time = 0.0
+
+        self.blend = np.empty((self.num_pixels, 3), dtype=np.float32)
+        self.output = np.empty((self.num_pixels, 3), dtype=np.uint8)
+
+    def process(self, frame, now: float = None) -> np.ndarray:
+        """Process a packed RGB frame, returns an (H, W, 3) uint8 array
+
+        The result is an internal buffer that is reused by the next call.
+        """
+        if now is None:
+            now = time.monotonic()
+        current = np.frombuffer(frame, dtype=np.uint8).reshape(self.num_pixels, 3)
+        out = self.output
+
+        # Frame interpolation: blend from the previous frame by how early this one is
+        alpha = 1.0
+        if self.interpolation and self.has_previous:
+            elapsed = now - self.last_frame_time
+            if elapsed < self.frame_interval * 2:
+                alpha = min(1.0, elapsed / self.frame_interval)
+        if alpha < 1.0:
+            np.multiply(self.previous, 1.0 - alpha, out=self.blend, casting='unsafe')
+            self.blend += current * np.float32(alpha)
+            np.copyto(out, self.blend, casting='unsafe')
+        else:
+            np.copyto(out, current)
+
+        if self.interpolation:
+            np.copyto(self.previous, current)
+            self.has_previous = True
+            self.last_frame_time = now
+
+        # Color boost + gamma, one table per channel
+        if not self.identity_lut:
+            out[:] = self.luts[self.channels, out]
+
+        # Temporal dithering, phase advances every frame
+        if self.dither:
+            self.dither_counter = (self.dither_counter + 1) & 0xFF
+            phase = (self.dither_phase + (self.dither_counter & (DITHER_PHASES - 1))) & (DITHER_PHASES - 1)
+            out[:] = self.dither_lut[phase[:, None], out]
+
+        return out.reshape(self.height, self.width, 3)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Cube Warp Sender
+Maps flat composition frames onto the cube on the host, the way Resolume's
+Cubemapping patch and Advanced Output do, and sends them over OPC
+
+Usage:
+    python cube-warp-sender.py SOURCE [COM_PORT] [options]
+
+Examples:
+    ffmpeg -re -i show.mp4 -vf scale=1024:1024 -f rawvideo -pix_fmt rgb24 - | python cube-warp-sender.py - COM3 --size 1024x1024
+    python cube-warp-sender.py frames.rgb /dev/ttyACM0 --size 1024x1024 --fps 30 --loop
+    python cube-warp-sender.py shm:spectral-sonata COM3
+
+SOURCE is - for raw rgb24 frames on stdin, the path of a raw rgb24 file or
+FIFO, or shm:NAME for a shared memory block another program renders into
+(see frame_sources.py). Each frame goes through the trapezoid warp of
+shader/cube-mapping.isf and the slice sampling of the Advanced Output
+preset in one gather, from tables built once per geometry and cached in
+~/.cache/spectral-sonata.
+
+Without --fps, frames go out as the source delivers them.
+"""
+
+import argparse
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+from artnet_layout import DEFAULT_PRESET
+from bridge_util import load_script, wait_until
+from cube_warp import DEFAULT_ISF, WarpError, load_warp
+from frame_sources import FrameSourceError, open_source, parse_size
+
+SOURCE_TIMEOUT = 1.0    # how long a read waits for a shared memory producer
+STATUS_INTERVAL = 5.0
+
+
+bridge = load_script("artnet-to-serial-sender")
+
+
+class WarpStats:
+    """Frames sent and what the warp cost"""
+
+    def __init__(self):
+        self.frames = 0
+        self.warp_time = 0.0
+        self.worst_warp = 0.0
+        self.start = time.perf_counter()
+
+    def warped(self, elapsed: float):
+        self.frames += 1
+        self.warp_time += elapsed
+        self.worst_warp = max(self.worst_warp, elapsed)
+
+    def rate(self) -> float:
+        return self.frames / max(time.perf_counter() - self.start, 1e-9)
+
+    def summary(self) -> str:
+        average = self.warp_time / max(self.frames, 1)
+        return (f"{self.frames} frames, {self.rate():.1f} fps, "
+                f"warp {average * 1e6:.0f} us/frame (worst {self.worst_warp * 1e6:.0f} us)")
+
+
+def run(source, warp, sender, fps: float = 0.0, stats: WarpStats = None) -> WarpStats:
+    """Warp and send frames until the source ends"""
+    stats = stats or WarpStats()
+    source_frame = warp.source_buffer()
+    matrix_frame = bytearray(warp.num_pixels * 3)
+    period = 1.0 / fps if fps else 0.0
+    due = time.perf_counter()
+    last_status = time.perf_counter()
+
+    while True:
+        if period:
+            wait_until(due)
+        if not source.read_into(source_frame, timeout=SOURCE_TIMEOUT):
+            if source.ended:
+                return stats
+            continue
+
+        start = time.perf_counter()
+        warp.warp(source_frame, matrix_frame)
+        stats.warped(time.perf_counter() - start)
+        sender.send_frame(matrix_frame)
+
+        if period:
+            # A source that stalls restarts the schedule instead of being caught up in a burst
+            due = max(due + period, time.perf_counter() - period)
+        if time.perf_counter() - last_status > STATUS_INTERVAL:
+            print(f"{stats.summary()}, {source.missed_frames} source frames missed")
+            last_status = time.perf_counter()
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Warp flat frames onto the cube and send them to the Teensy "
+                                                 "over OPC")
+    parser.add_argument("source", help="- for stdin, a raw rgb24 file or FIFO, or shm:NAME")
+    parser.add_argument("port", nargs="?",
+                        help="serial port, e.g. COM3 or /dev/ttyACM0 (auto-detected if omitted)")
+    parser.add_argument("--size", metavar="WIDTHxHEIGHT",
+                        help="frame size of a stdin, file or FIFO source (shared memory carries its own)")
+    parser.add_argument("--fps", type=float, default=0.0,
+                        help="send at most this many frames per second, 0 to follow the source "
+                             "(default: %(default)s)")
+    parser.add_argument("--loop", action="store_true",
+                        help="start a file source over at its end")
+    parser.add_argument("--isf", default=str(DEFAULT_ISF),
+                        help="cube mapping shader with the trapezoids (default: shader/cube-mapping.isf)")
+    parser.add_argument("--layout", default=str(DEFAULT_PRESET), metavar="PRESET",
+                        help="Resolume Advanced Output preset with the slices "
+                             "(default: the SmartMatrix cubey map preset)")
+    parser.add_argument("--delta", action="store_true",
+                        help="send only changed pixels between keyframes (needs delta-capable firmware)")
+    parser.add_argument("--compress", action="store_true",
+                        help="run-length encode frames when that is smaller (needs RLE-capable firmware)")
+    args = parser.parse_args()
+    if args.fps < 0:
+        parser.error("--fps can't be negative")
+    return args
+
+
+def main():
+    args = parse_args()
+    try:
+        size = parse_size(args.size) if args.size else None
+        source = open_source(args.source, size, loop=args.loop)
+    except FrameSourceError as e:
+        print(f"Could not open {args.source}: {e}")
+        return 1
+
+    try:
+        warp = load_warp(args.isf, args.layout, source.width, source.height, bridge.MATRIX_WIDTH,
+                         bridge.MATRIX_HEIGHT, bridge.LEDS_PER_UNIVERSE)
+    except (OSError, ET.ParseError, WarpError) as e:
+        print(f"Could not build the cube warp: {e}")
+        source.close()
+        return 1
+
+    port = args.port
+    if not port:
+        print("No port specified, scanning for Teensy...\n")
+        port = bridge.find_teensy_ports()
+        if not port:
+            print("No ports found. Make sure Teensy is connected.")
+            source.close()
+            return 1
+
+    print("\nCube Warp Sender")
+    print(f"Source: {source.name}, {source.width}x{source.height}")
+    print(f"Warp: {warp.name}")
+    print(f"Matrix: {bridge.MATRIX_WIDTH}x{bridge.MATRIX_HEIGHT}")
+    print(f"Serial Port: {port}")
+    print(f"Rate: {f'{args.fps:g} fps' if args.fps else 'as the source delivers'}")
+    print("Press Ctrl+C to stop\n")
+
+    sender = bridge.OPCSender(port, delta=args.delta, compress=args.compress)
+    if not sender.connect():
+        source.close()
+        return 1
+
+    stats = WarpStats()
+    try:
+        run(source, warp, sender, args.fps, stats)
+        print("Source ended")
+    except KeyboardInterrupt:
+        print("\nStopping...")
+    finally:
+        print(f"Sent {stats.summary()}, {source.missed_frames} source frames missed")
+        sender.send_black_frame()
+        sender.disconnect()
+        source.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
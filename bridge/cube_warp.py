@@ -0,0 +1,262 @@
+"""
+Cube mapping on the host, the way Resolume does it
+
+In Resolume the flat composition goes through the Cubemapping Wire patch
+(resolume/Cubemapping, the shader in shader/cube-mapping.isf), which warps
+a trapezoid per cube face into a destination rectangle of the canvas. The
+Advanced Output preset then samples each DMX slice out of its InputRect on
+that canvas. CubeWarp does both on the CPU, so any frame source can drive
+the cube without Resolume.
+
+The geometry is followed back once per matrix pixel: matrix pixel -> Art-Net
+stream pixel (the preset layout, as in artnet_layout) -> fixture pixel of a
+slice -> point in the slice's InputRect -> the shader's rect-to-trapezoid
+mapping -> point in the flat frame. That point is sampled like a GL linear
+texture with clamped edges, four taps with 8-bit weights. Canvas points
+outside every destination rectangle are black, as in the shader.
+
+The taps are cached in ~/.cache/spectral-sonata, keyed by a hash of the
+shader, the preset, the fixture library and the frame and matrix sizes, so
+each frame costs one gather and a weighted sum.
+"""
+
+import hashlib
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+
+from artnet_layout import (DEFAULT_CACHE_DIR, LayoutError, _fixture_library, build_pixel_map,
+                           parse_preset, slice_pixels)
+
+WARP_CACHE_VERSION = 1
+WEIGHT_BITS = 8
+WEIGHT_ONE = 1 << WEIGHT_BITS  # 255 * WEIGHT_ONE plus rounding still fits the uint16 sum
+
+DEFAULT_ISF = Path(__file__).resolve().parent.parent / "shader" / "cube-mapping.isf"
+
+
+class WarpError(ValueError):
+    """The shader or preset can't be turned into a warp for this matrix"""
+
+
+def _number(expr: str) -> float:
+    """A shader constant like 0.375 or 1.0-0.375"""
+    match = re.fullmatch(r"\s*(-?[\d.]+)\s*(?:([-+])\s*([\d.]+))?\s*", expr)
+    if not match:
+        raise WarpError(f"can't read shader constant {expr.strip()!r}")
+    value = float(match.group(1))
+    if match.group(2):
+        value += float(match.group(3)) if match.group(2) == "+" else -float(match.group(3))
+    return value
+
+
+def parse_isf_quads(path) -> list:
+    """(destination rectangle, source trapezoid) pairs of the cube mapping shader
+
+    Each is a 4x2 array of normalized corners, top-left, top-right,
+    bottom-right, bottom-left, with y up as in ISF. destN pairs with
+    trapezoidN, in the order main() tests them.
+    """
+    path = Path(path)
+    text = path.read_text()
+    text = re.sub(r"/\*.*?\*/|//[^\n]*", "", text, flags=re.S)
+    arrays = {}
+    for name, body in re.findall(r"vec2\s+(\w+)\s*\[4\]\s*=\s*vec2\s*\[\]\s*\((.*?)\)\s*;", text, re.S):
+        points = re.findall(r"vec2\s*\(([^,()]+),([^,()]+)\)", body)
+        if len(points) != 4:
+            raise WarpError(f"{path.name}: {name} has {len(points)} corners, expected 4")
+        arrays[name] = np.array([(_number(x), _number(y)) for x, y in points])
+
+    numbers = sorted(int(name[4:]) for name in arrays if re.fullmatch(r"dest\d+", name))
+    quads = []
+    for number in numbers:
+        source = arrays.get(f"trapezoid{number}")
+        if source is None:
+            raise WarpError(f"{path.name}: dest{number} has no trapezoid{number}")
+        quads.append((arrays[f"dest{number}"], source))
+    if not quads:
+        raise WarpError(f"{path.name}: no destN / trapezoidN arrays")
+    return quads
+
+
+def _mix_quad(quad: np.ndarray, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """Bilinear point in a quad, u along the top edge and v down the sides"""
+    top = quad[0] + (quad[1] - quad[0]) * u[..., None]
+    bottom = quad[3] + (quad[2] - quad[3]) * u[..., None]
+    return top + (bottom - top) * v[..., None]
+
+
+def slice_sample_points(s: dict, composition_size) -> np.ndarray:
+    """Canvas point sampled by each fixture pixel of a slice, in fixture order
+
+    Pixel centers are spread over the InputRect, whose corners are the
+    fixture's top-left, top-right, bottom-right and bottom-left. Points are
+    normalized with y up, the shader's coordinates.
+    """
+    if s["input_rect"] is None:
+        raise WarpError(f"slice {s['name']!r} has no InputRect")
+    corners = np.array(s["input_rect"]) / np.array(composition_size, dtype=float)
+    u = (np.arange(s["width"]) + 0.5) / s["width"]
+    v = (np.arange(s["height"]) + 0.5) / s["height"]
+    if s["flip"] & 1:
+        u = u[::-1]
+    if s["flip"] & 2:
+        v = v[::-1]
+    points = _mix_quad(corners, *np.meshgrid(u, v)).reshape(-1, 2)
+    points[:, 1] = 1.0 - points[:, 1]
+    return points
+
+
+def _inside_quad(points: np.ndarray, quad: np.ndarray) -> np.ndarray:
+    """point_inside_quad() of the shader, for an array of points"""
+    sides = []
+    for a, b in zip(quad, np.roll(quad, -1, axis=0)):
+        sides.append((b[0] - a[0]) * (points[:, 1] - a[1]) - (b[1] - a[1]) * (points[:, 0] - a[0]) >= 0.0)
+    sides = np.array(sides)
+    return sides.all(axis=0) | ~sides.any(axis=0)
+
+
+def warp_points(points: np.ndarray, quads: list) -> np.ndarray:
+    """Flat frame point for each canvas point, NaN where the shader draws black"""
+    warped = np.full_like(points, np.nan)
+    remaining = ~np.isnan(points).any(axis=1)
+    for dest, source in quads:
+        hit = remaining & _inside_quad(np.nan_to_num(points), dest)
+        normalized = (points[hit] - dest[0]) / (dest[1][0] - dest[0][0], dest[3][1] - dest[0][1])
+        warped[hit] = _mix_quad(source, normalized[:, 0], normalized[:, 1])
+        remaining &= ~hit
+    return warped
+
+
+def bilinear_taps(points: np.ndarray, width: int, height: int):
+    """Source pixel indexes and weights for sampling normalized points (y up)
+
+    Returns (taps, weights), both (len(points), 4): flat pixel indexes into a
+    width x height frame stored top row first, and uint16 weights summing to
+    WEIGHT_ONE. NaN points take the black pixel at width * height.
+    """
+    valid = ~np.isnan(points).any(axis=1)
+    x = np.clip(np.nan_to_num(points[:, 0]) * width - 0.5, 0, width - 1)
+    y = np.clip((1.0 - np.nan_to_num(points[:, 1])) * height - 0.5, 0, height - 1)
+    x0 = np.floor(x).astype(np.int64)
+    y0 = np.floor(y).astype(np.int64)
+    x1 = np.minimum(x0 + 1, width - 1)
+    y1 = np.minimum(y0 + 1, height - 1)
+    fx = x - x0
+    fy = y - y0
+
+    taps = np.stack([y0 * width + x0, y0 * width + x1, y1 * width + x0, y1 * width + x1], axis=1)
+    exact = np.stack([(1 - fx) * (1 - fy), fx * (1 - fy), (1 - fx) * fy, fx * fy], axis=1) * WEIGHT_ONE
+    weights = np.floor(exact + 0.5).astype(np.int64)
+    # Rounding can leave the sum off by one or two, the largest tap takes the difference
+    largest = np.argmax(exact, axis=1)
+    weights[np.arange(len(weights)), largest] += WEIGHT_ONE - weights.sum(axis=1)
+
+    taps[~valid] = width * height
+    weights[~valid] = (WEIGHT_ONE, 0, 0, 0)
+    return taps.astype(np.int32), weights.astype(np.uint16)
+
+
+def build_warp_tables(quads: list, preset: dict, source_width: int, source_height: int,
+                      matrix_width: int, matrix_height: int, leds_per_universe: int):
+    """Matrix pixel -> flat frame taps and weights for the shader quads and a parse_preset result"""
+    if preset.get("composition_size") is None:
+        raise WarpError("the preset has no composition size")
+    pixel_map, num_universes = build_pixel_map(preset["slices"], matrix_width, matrix_height, leds_per_universe)
+    stream_points = np.full((num_universes * leds_per_universe + 1, 2), np.nan)
+    for s in preset["slices"]:
+        stream_points[slice_pixels(s, leds_per_universe)] = slice_sample_points(s, preset["composition_size"])
+    points = warp_points(stream_points[pixel_map], quads)
+    return bilinear_taps(points, source_width, source_height)
+
+
+class CubeWarp:
+    """Flat RGB frame -> matrix frame through precomputed bilinear taps"""
+
+    def __init__(self, taps: np.ndarray, weights: np.ndarray, source_width: int, source_height: int,
+                 name: str = ""):
+        # Tap-major and with the weights spelled out per channel, so the per-frame
+        # arithmetic runs over contiguous arrays instead of a 4-wide axis
+        self.num_pixels = len(taps)
+        self.taps = np.ascontiguousarray(np.transpose(taps), dtype=np.intp)
+        self.weights = np.ascontiguousarray(
+            np.broadcast_to(np.transpose(weights).astype(np.uint16)[:, :, None], (4, self.num_pixels, 3)))
+        self.source_width = source_width
+        self.source_height = source_height
+        self.source_pixels = source_width * source_height
+        self.source_frame_size = self.source_pixels * 3
+        self.name = name
+        # Scratch for the gather and the weighted sum, reused every frame
+        self._gathered = np.empty((4, self.num_pixels, 3), dtype=np.uint8)
+        self._weighted = np.empty((4, self.num_pixels, 3), dtype=np.uint16)
+        self._sum = np.empty((self.num_pixels, 3), dtype=np.uint16)
+
+    def source_buffer(self) -> bytearray:
+        """A buffer for one flat frame plus the black pixel the taps use outside the cube"""
+        return bytearray((self.source_pixels + 1) * 3)
+
+    def warp(self, source, out):
+        """Fill out (the matrix frame) from a source_buffer() holding a flat frame"""
+        src = np.frombuffer(source, dtype=np.uint8, count=(self.source_pixels + 1) * 3).reshape(-1, 3)
+        dst = np.frombuffer(out, dtype=np.uint8).reshape(-1, 3)
+        np.take(src, self.taps, axis=0, out=self._gathered, mode='clip')
+        np.multiply(self._gathered, self.weights, out=self._weighted)
+        np.add(self._weighted[0], self._weighted[1], out=self._sum)
+        np.add(self._sum, self._weighted[2], out=self._sum)
+        np.add(self._sum, self._weighted[3], out=self._sum)
+        self._sum += WEIGHT_ONE // 2
+        self._sum >>= WEIGHT_BITS
+        np.copyto(dst, self._sum, casting='unsafe')
+
+
+def _cache_key(isf_path: Path, preset_path: Path, fixture_dir: Path, source_width: int, source_height: int,
+               matrix_width: int, matrix_height: int, leds_per_universe: int) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{WARP_CACHE_VERSION}:{source_width}x{source_height}:{matrix_width}x{matrix_height}:"
+                  f"{leds_per_universe}".encode())
+    digest.update(isf_path.read_bytes())
+    digest.update(preset_path.read_bytes())
+    if fixture_dir.is_dir():
+        for path in sorted(fixture_dir.glob("*.xml")):
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:32]
+
+
+def load_warp(isf_path, preset_path, source_width: int, source_height: int, matrix_width: int,
+              matrix_height: int, leds_per_universe: int = 170, fixture_dir=None,
+              cache_dir=DEFAULT_CACHE_DIR) -> CubeWarp:
+    """CubeWarp for a shader and preset, from the cache when neither has changed"""
+    isf_path = Path(isf_path)
+    preset_path = Path(preset_path)
+    fixture_dir = Path(fixture_dir) if fixture_dir else _fixture_library(preset_path)
+    key = _cache_key(isf_path, preset_path, fixture_dir, source_width, source_height, matrix_width,
+                     matrix_height, leds_per_universe)
+    cache_file = Path(cache_dir) / f"warp-{key}.npz" if cache_dir else None
+    name = f"{isf_path.stem} + {preset_path.stem}"
+
+    if cache_file and cache_file.exists():
+        try:
+            with np.load(cache_file) as cached:
+                return CubeWarp(cached["taps"], cached["weights"], source_width, source_height, name)
+        except (OSError, ValueError, KeyError):
+            pass  # unreadable cache, rebuild it
+
+    try:
+        taps, weights = build_warp_tables(parse_isf_quads(isf_path), parse_preset(preset_path, fixture_dir),
+                                          source_width, source_height, matrix_width, matrix_height,
+                                          leds_per_universe)
+    except LayoutError as e:
+        raise WarpError(str(e)) from e
+
+    if cache_file:
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            temp = cache_file.with_suffix(".tmp.npz")
+            np.savez(temp, taps=taps, weights=weights)
+            os.replace(temp, cache_file)
+        except OSError:
+            pass  # caching is only an optimization
+
+    return CubeWarp(taps, weights, source_width, source_height, name)
@@ -0,0 +1,147 @@
+"""
+Constant-cadence output for the bridge
+
+Art-Net frames arrive whenever Resolume, the network and the OS scheduler
+deliver them, while the firmware's interpolation expects one every
+frameInterval. FrameCadence puts a short jitter buffer between the two:
+frames are queued as they arrive and an output clock takes one per tick
+at a fixed rate. When the buffer runs dry the previous frame is repeated,
+and when it holds more than twice its target depth the oldest frames are
+skipped, so input at another rate is converted by repeating or skipping.
+
+The clock is scheduled in absolute time, so a late wakeup never shifts
+the ticks after it. Its period is trimmed by at most DRIFT_LIMIT to keep
+the buffer at its target depth. That absorbs the drift between Resolume's
+clock and ours when both run at the same nominal rate, so they don't
+slowly slide into periodic repeats and skips.
+"""
+
+from collections import deque
+
+from bridge_metrics import LatencyHistogram
+
+DEFAULT_DEPTH = 2
+DRIFT_LIMIT = 0.005       # the clock period is trimmed by at most 0.5%
+DRIFT_GAIN = 0.0005       # trim per frame of buffer depth error, every tick
+DEPTH_SMOOTHING = 0.02    # weight of each tick's buffer depth in the running average
+INTERVAL_SMOOTHING = 0.05
+IDLE_TIMEOUT = 1.0        # stop repeating after this long without input
+
+
+class BufferedFrame:
+    """A frame in a jitter buffer slot with the receiver's timestamps"""
+
+    def __init__(self, frame_size: int):
+        self.buffer = bytearray(frame_size)
+        self.view = memoryview(self.buffer)
+        self.first_universe_time = None
+        self.complete_time = None
+        self.repeat = False
+
+
+class FrameCadence:
+    """Jitter buffer and output clock at a fixed frame rate
+
+    push() copies each arriving frame into a preallocated slot. The caller
+    waits until next_tick, then calls tick() for the frame to send. The
+    frame tick() returns stays valid until the following tick().
+    """
+
+    def __init__(self, fps: float, frame_size: int, depth: int = DEFAULT_DEPTH):
+        self.fps = fps
+        self.period = 1.0 / fps
+        self.depth = depth
+        self.max_depth = 2 * depth
+        # Queued frames, the one on screen, and the one arriving
+        self.free = deque(BufferedFrame(frame_size) for _ in range(self.max_depth + 2))
+        self.queue = deque()
+        self.current = None
+
+        self.next_tick = None     # scheduled time of the next tick, None while idle
+        self.trim = 0.0           # relative period correction, within +-DRIFT_LIMIT
+        self.average_depth = float(depth)
+        self.last_arrival = None
+        self.mean_interval = None
+
+        self.ticks = 0
+        self.repeats = 0
+        self.skips = 0
+        self.missed_ticks = 0
+        self.input_jitter = LatencyHistogram()   # arrival interval deviation from the average
+        self.output_jitter = LatencyHistogram()  # tick lateness
+
+    def push(self, frame, first_universe_time: float, complete_time: float, now: float):
+        """Queue an arriving frame, skipping the oldest queued one if the buffer is full"""
+        if len(self.queue) >= self.max_depth:
+            self.free.append(self.queue.popleft())
+            self.skips += 1
+        slot = self.free.popleft()
+        slot.view[:] = frame
+        slot.first_universe_time = first_universe_time
+        slot.complete_time = complete_time
+        slot.repeat = False
+        self.queue.append(slot)
+
+        arrival = complete_time if complete_time is not None else now
+        if self.last_arrival is not None:
+            interval = arrival - self.last_arrival
+            if self.mean_interval is None:
+                self.mean_interval = interval
+            else:
+                self.input_jitter.record(abs(interval - self.mean_interval))
+                self.mean_interval += (interval - self.mean_interval) * INTERVAL_SMOOTHING
+        self.last_arrival = arrival
+
+        if self.next_tick is None and len(self.queue) >= self.depth:
+            self.next_tick = now  # buffer primed, start the clock
+
+    def tick(self, now: float):
+        """The frame to send at the tick due now, or None once the input has stopped"""
+        if self.next_tick is None:
+            return None
+        self.output_jitter.record(now - self.next_tick)
+        self.ticks += 1
+
+        # Trim the clock towards the target depth
+        self.average_depth += (len(self.queue) - self.average_depth) * DEPTH_SMOOTHING
+        self.trim += (self.average_depth - self.depth) * DRIFT_GAIN
+        self.trim = min(max(self.trim, -DRIFT_LIMIT), DRIFT_LIMIT)
+
+        if self.queue:
+            if self.current is not None:
+                self.free.append(self.current)
+            self.current = self.queue.popleft()
+        elif self.current is not None:
+            self.current.repeat = True
+            self.repeats += 1
+
+        if self.last_arrival is None or now - self.last_arrival > IDLE_TIMEOUT:
+            self._go_idle()
+            return None
+
+        # Absolute schedule; ticks we are already past are dropped instead of sent in a burst
+        self.next_tick += self.period * (1.0 - self.trim)
+        while self.next_tick <= now:
+            self.next_tick += self.period
+            self.missed_ticks += 1
+        return self.current
+
+    def _go_idle(self):
+        """Stop the clock until the buffer fills up again"""
+        self.next_tick = None
+        self.free.extend(self.queue)
+        self.queue.clear()
+        if self.current is not None:
+            self.free.append(self.current)
+            self.current = None
+
+    def summary(self) -> str:
+        """One console line, jitter since the previous summary"""
+        parts = []
+        for name, histogram in (("input", self.input_jitter), ("output", self.output_jitter)):
+            interval = histogram.take_interval()
+            parts.append(f"{name} jitter p50/p99/max {interval.percentile(0.5) * 1000:.1f}/"
+                         f"{interval.percentile(0.99) * 1000:.1f}/{interval.max * 1000:.1f} ms")
+        return (f"Cadence {self.fps:g} fps: {', '.join(parts)}, buffer {self.average_depth:.1f} frames, "
+                f"trim {self.trim * 100:+.2f}%, {self.repeats} repeated, {self.skips} skipped, "
+                f"{self.missed_ticks} missed ticks")
@@ -0,0 +1,189 @@
+"""
+Flat RGB frame sources for cube-warp-sender.py
+
+A source fills a caller's buffer with the next packed RGB frame, rows top
+to bottom and 3 bytes per pixel, like ffmpeg's rawvideo rgb24 output.
+
+StreamSource reads frames back to back from a pipe, FIFO or file, e.g.
+
+    ffmpeg -re -i show.mp4 -f rawvideo -pix_fmt rgb24 - | python cube-warp-sender.py - --size 1024x1024
+
+SharedMemorySource polls a named shared memory block that another process
+renders into, and SharedFrameWriter is the producer side for Python
+programs. The block is a 16-byte little-endian header followed by one
+frame:
+
+    ['SSFB'][width u32][height u32][sequence u32][width * height * 3 bytes of RGB]
+
+The producer makes sequence odd while it writes the pixels and even again
+once the frame is complete, 0 meaning no frame yet. The reader copies a
+frame only when sequence is even and has changed, and copies again if it
+changed during the copy, so it never sees a torn frame and never blocks
+the producer.
+"""
+
+import os
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+SHM_MAGIC = b"SSFB"
+SHM_HEADER = struct.Struct('<4sIII')
+SHM_SEQUENCE = struct.Struct('<I')
+SHM_SEQUENCE_OFFSET = 12
+SHM_POLL_INTERVAL = 0.0005
+
+
+class FrameSourceError(ValueError):
+    """A frame source that can't be opened or doesn't hold frames"""
+
+
+def parse_size(text: str):
+    """(width, height) from WIDTHxHEIGHT"""
+    try:
+        width, height = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise FrameSourceError(f"expected WIDTHxHEIGHT, got {text!r}") from None
+    if width < 1 or height < 1:
+        raise FrameSourceError(f"frame size must be positive, got {text!r}")
+    return width, height
+
+
+class StreamSource:
+    """Raw frames back to back from a binary stream
+
+    With loop, a seekable file starts over at its end instead of ending.
+    """
+
+    def __init__(self, stream, width: int, height: int, loop: bool = False, name: str = ""):
+        self.stream = stream
+        self.width = width
+        self.height = height
+        self.frame_size = width * height * 3
+        self.loop = loop and stream.seekable()
+        self.name = name
+        self.ended = False
+        self.missed_frames = 0  # a stream hands over every frame
+
+    def read_into(self, buffer, timeout: float = None) -> bool:
+        """Read the next frame into the start of buffer, False at the end of the stream"""
+        view = memoryview(buffer)[:self.frame_size]
+        filled = 0
+        while filled < self.frame_size:
+            count = self.stream.readinto(view[filled:])
+            if not count:
+                if self.loop and filled == 0 and self.stream.tell() > 0:
+                    self.stream.seek(0)
+                    continue
+                self.ended = True  # a partial frame at the end is dropped
+                return False
+            filled += count
+        return True
+
+    def close(self):
+        self.stream.close()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Open an existing block without taking ownership of it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        memory = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            # Older versions would unlink the producer's block when this process exits
+            resource_tracker.unregister(memory._name, "shared_memory")
+        return memory
+
+
+class SharedMemorySource:
+    """Frames from a shared memory block written by SharedFrameWriter or an equivalent producer"""
+
+    def __init__(self, name: str, poll_interval: float = SHM_POLL_INTERVAL):
+        try:
+            self.memory = _attach(name)
+        except FileNotFoundError:
+            raise FrameSourceError(f"no shared memory block named {name!r}") from None
+        magic, self.width, self.height, _ = SHM_HEADER.unpack_from(self.memory.buf, 0)
+        self.frame_size = self.width * self.height * 3
+        if magic != SHM_MAGIC or self.memory.size < SHM_HEADER.size + self.frame_size:
+            self.memory.close()
+            raise FrameSourceError(f"shared memory block {name!r} doesn't hold {SHM_MAGIC.decode()} frames")
+        self.name = f"shm:{name}"
+        self.poll_interval = poll_interval
+        self.frame = self.memory.buf[SHM_HEADER.size:SHM_HEADER.size + self.frame_size]
+        self.last_sequence = None
+        self.ended = False  # the producer may always come back
+        self.missed_frames = 0
+        self.torn_reads = 0
+
+    def _sequence(self) -> int:
+        return SHM_SEQUENCE.unpack_from(self.memory.buf, SHM_SEQUENCE_OFFSET)[0]
+
+    def read_into(self, buffer, timeout: float = None) -> bool:
+        """Copy the newest complete frame into the start of buffer, waiting up to timeout for one
+
+        Returns False if no new frame was finished in time.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            sequence = self._sequence()
+            if sequence % 2 == 0 and sequence not in (0, self.last_sequence):
+                buffer[:self.frame_size] = self.frame
+                if self._sequence() == sequence:
+                    if self.last_sequence is not None:
+                        self.missed_frames += max((sequence - self.last_sequence) % (1 << 32) // 2 - 1, 0)
+                    self.last_sequence = sequence
+                    return True
+                self.torn_reads += 1  # overwritten during the copy, take the next one
+                continue
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+
+    def close(self):
+        self.frame.release()
+        self.memory.close()
+
+
+class SharedFrameWriter:
+    """Creates a shared memory block and publishes frames to SharedMemorySource readers"""
+
+    def __init__(self, name: str, width: int, height: int):
+        self.frame_size = width * height * 3
+        self.memory = shared_memory.SharedMemory(name=name, create=True, size=SHM_HEADER.size + self.frame_size)
+        SHM_HEADER.pack_into(self.memory.buf, 0, SHM_MAGIC, width, height, 0)
+        self.frame = self.memory.buf[SHM_HEADER.size:SHM_HEADER.size + self.frame_size]
+        self.sequence = 0
+
+    def write(self, frame):
+        """Publish one packed RGB frame of width * height * 3 bytes"""
+        SHM_SEQUENCE.pack_into(self.memory.buf, SHM_SEQUENCE_OFFSET, self.sequence + 1)
+        self.frame[:] = memoryview(frame).cast("B")
+        self.sequence = (self.sequence + 2) % (1 << 32) or 2
+        SHM_SEQUENCE.pack_into(self.memory.buf, SHM_SEQUENCE_OFFSET, self.sequence)
+
+    def close(self):
+        """Close and remove the block, readers keep their mapping until they close"""
+        self.frame.release()
+        self.memory.close()
+        self.memory.unlink()
+
+
+def open_source(spec: str, size=None, loop: bool = False):
+    """A frame source for '-' (stdin), shm:NAME, or the path of a file or FIFO
+
+    Streams carry no header, so they need size as (width, height).
+    """
+    if spec.startswith("shm:"):
+        return SharedMemorySource(spec[4:])
+    if size is None:
+        raise FrameSourceError(f"{spec} has no frame size, give it with --size WIDTHxHEIGHT")
+    if spec == "-":
+        return StreamSource(sys.stdin.buffer, *size, name="stdin")
+    try:
+        stream = open(spec, "rb")
+    except OSError as e:
+        raise FrameSourceError(f"can't open {spec}: {e}") from None
+    return StreamSource(stream, *size, loop=loop, name=spec)
@@ -0,0 +1,245 @@
+"""
+Frame-rate upconversion for the bridge
+
+Resolume's DMX output rarely runs much above 30 fps, while the panels and
+the USB link can show several times that. FrameUpconverter is an output
+clock at factor times the measured input rate. When an input frame
+arrives, it sends factor frames spread over the next input interval. The
+first factor - 1 are synthesized between the previous input frame and the
+new one, and the last is the new frame itself. That delays each input
+frame by (factor - 1) / factor of an interval.
+
+Linear mode blends the two frames. Motion mode first matches every
+tile x tile block of the new frame against the previous one within
++-search pixels. Each intermediate frame then takes a tile's pixels from
+both frames along that motion, so edges move instead of cross-fading.
+Tiles whose best match isn't clearly better than standing still keep the
+plain blend.
+
+Motion is estimated once per input frame and each synthesized frame is
+two gathers and a blend. Both are timed. When the motion search and
+rendering would take more than BUDGET of the output interval, the
+converter drops to linear blending for RETRY_FRAMES input frames and then
+tries motion again. A gap of more than MAX_INTERVAL between input frames
+isn't blended across, the new frame is shown as it is.
+"""
+
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from bridge_metrics import LatencyHistogram
+from frame_cadence import BufferedFrame
+
+MAX_FACTOR = 8
+DEFAULT_TILE = 8
+DEFAULT_SEARCH = 3        # motion search range in pixels each way
+MAX_SEARCH = 8            # the error buffer grows with the square of the range
+MOTION_MARGIN = 0.8       # a tile moves only if that cuts its match error by 20%
+MOTION_PENALTY = 1.0      # match error per pixel of vector length, favours short vectors
+MAX_INTERVAL = 0.25       # input gaps longer than this aren't interpolated across
+BUDGET = 0.5              # share of the output interval upconversion may use per frame
+RETRY_FRAMES = 60         # input frames on linear blending before motion is tried again
+INTERVAL_SMOOTHING = 0.1
+COST_SMOOTHING = 0.1
+BLEND_BITS = 7            # 255 * (1 << BLEND_BITS) fits the int16 blend
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def _pixels(frame: BufferedFrame, width: int, height: int) -> np.ndarray:
+    return np.frombuffer(frame.buffer, dtype=np.uint8).reshape(height, width, 3)
+
+
+class FrameUpconverter:
+    """Output clock at factor times the input rate, synthesizing frames in between
+
+    push() takes each input frame. The caller waits until next_tick, then
+    calls tick() for the frame to send; next_tick is None once the new
+    frame itself went out. The frame tick() returns stays valid until the
+    following push() or tick().
+    """
+
+    def __init__(self, width: int, height: int, factor: int, motion: bool = False, tile: int = DEFAULT_TILE,
+                 search: int = DEFAULT_SEARCH):
+        if width % tile or height % tile:
+            raise ValueError(f"{tile} pixel tiles don't divide the {width}x{height} matrix")
+        self.width = width
+        self.height = height
+        self.factor = factor
+        self.motion = motion
+        self.tile = tile
+        self.search = search
+        frame_size = width * height * 3
+        self.previous = BufferedFrame(frame_size)
+        self.current = BufferedFrame(frame_size)
+        self.output = BufferedFrame(frame_size)
+
+        self.diff = np.zeros((height, width, 3), dtype=np.int16)
+        self.blend = np.empty((height, width, 3), dtype=np.int16)
+        self.rows, self.columns = np.mgrid[0:height, 0:width]
+        self.vectors = np.zeros((height // tile, width // tile, 2), dtype=np.intp)
+        self.pixel_vectors = np.zeros((height, width, 2), dtype=np.intp)
+        self.moving = False
+        if motion:
+            span = 2 * search + 1
+            self.errors = np.empty((span, span, height, width), dtype=np.float32)
+            self.tile_rows = np.kron(np.eye(height // tile, dtype=np.float32), np.ones((1, tile), dtype=np.float32))
+            self.tile_columns = np.kron(np.eye(width // tile, dtype=np.float32), np.ones((tile, 1), dtype=np.float32))
+            shifts = np.abs(np.arange(span) - search)
+            self.penalties = (MOTION_PENALTY * tile * tile
+                              * (shifts[:, None] + shifts[None, :])).reshape(-1, 1, 1).astype(np.float32)
+
+        self.next_tick = None     # when the next output frame is due, None until the next input
+        self.step = 0             # output frames sent for the current input frame
+        self.period = None        # output interval, the input interval / factor
+        self.interval = None
+        self.last_arrival = None
+        self.linear_frames = 0    # input frames left on linear blending after going over budget
+        self.render_cost = 0.0
+
+        self.inputs = 0
+        self.synthesized = 0
+        self.cut_short = 0
+        self.fallbacks = 0
+        self.moving_tiles = 0.0   # share of tiles with motion, averaged over input frames
+        self.estimate_time = LatencyHistogram()  # per input frame: difference and motion search
+        self.render_time = LatencyHistogram()    # per synthesized frame
+
+    @property
+    def mode(self) -> str:
+        return "motion" if self.motion and not self.linear_frames else "linear"
+
+    def push(self, frame, first_universe_time: float, complete_time: float, now: float):
+        """Take an input frame and restart the output clock on it"""
+        arrival = complete_time if complete_time is not None else now
+        interval = None if self.last_arrival is None else arrival - self.last_arrival
+        self.last_arrival = arrival
+        if self.next_tick is not None:
+            self.cut_short += 1  # arrived before the previous frame's outputs were all sent
+
+        self.previous, self.current = self.current, self.previous
+        self.current.view[:] = frame
+        self.current.first_universe_time = first_universe_time
+        self.current.complete_time = complete_time
+        self.inputs += 1
+        self.next_tick = now
+
+        if interval is None or interval > MAX_INTERVAL or interval <= 0:
+            self.step = self.factor - 1  # nothing recent to blend from, send the frame as it is
+            return
+        self.interval = interval if self.interval is None else (
+            self.interval + (interval - self.interval) * INTERVAL_SMOOTHING)
+        self.period = self.interval / self.factor
+        self.step = 0
+        self._prepare()
+
+    def _prepare(self):
+        """Difference and motion between the previous and current frame, within the budget"""
+        start = time.perf_counter()
+        previous = _pixels(self.previous, self.width, self.height)
+        current = _pixels(self.current, self.width, self.height)
+        np.subtract(current, previous, out=self.diff, dtype=np.int16)
+
+        use_motion = self.mode == "motion"
+        if self.linear_frames:
+            self.linear_frames -= 1
+        if use_motion:
+            self._estimate_motion(previous, current)
+        else:
+            self.moving = False
+
+        elapsed = time.perf_counter() - start
+        self.estimate_time.record(elapsed)
+        if use_motion and elapsed / self.factor + self.render_cost > BUDGET * self.period:
+            self.linear_frames = RETRY_FRAMES
+            self.fallbacks += 1
+
+    def _estimate_motion(self, previous: np.ndarray, current: np.ndarray):
+        """Block matching: per tile, the shift of the previous frame that best matches the current one"""
+        search, span = self.search, 2 * self.search + 1
+        luma_previous = np.pad(previous @ LUMA, search, mode="edge")
+        luma_current = current @ LUMA
+
+        # Window (i, j) is previous(q - v) for v = (search - i, search - j), every shift at once
+        windows = sliding_window_view(luma_previous, (self.height, self.width))
+        np.subtract(luma_current, windows, out=self.errors)
+        np.abs(self.errors, out=self.errors)
+        # Per-tile sums as two small matrix products instead of a strided reduction
+        tile_errors = (self.tile_rows @ (self.errors @ self.tile_columns)).reshape(span * span, *self.vectors.shape[:2])
+        still = tile_errors[span * span // 2]
+        tile_errors += self.penalties
+        choice = np.argmin(tile_errors, axis=0)
+        best = np.take_along_axis(tile_errors, choice[None], axis=0)[0]
+
+        self.vectors[..., 0] = search - choice // span
+        self.vectors[..., 1] = search - choice % span
+        self.vectors[~(best < still * MOTION_MARGIN)] = 0
+        moving = self.vectors.any(axis=2)
+        self.moving = bool(moving.any())
+        self.moving_tiles += (moving.mean() - self.moving_tiles) * INTERVAL_SMOOTHING
+        if self.moving:
+            self.pixel_vectors[...] = np.repeat(np.repeat(self.vectors, self.tile, axis=0), self.tile, axis=1)
+
+    def tick(self, now: float):
+        """The frame to send at the output tick due now, or None between input frames"""
+        if self.next_tick is None:
+            return None
+        self.step += 1
+        if self.step >= self.factor:
+            self.next_tick = None
+            return self.current
+
+        start = time.perf_counter()
+        self._render(self.step / self.factor)
+        elapsed = time.perf_counter() - start
+        self.render_time.record(elapsed)
+        self.render_cost += (elapsed - self.render_cost) * COST_SMOOTHING
+        self.synthesized += 1
+        self.output.first_universe_time = self.current.first_universe_time
+        self.output.complete_time = self.current.complete_time
+        # A late wakeup moves the rest of the outputs back instead of sending them in a burst
+        self.next_tick = max(self.next_tick + self.period, now)
+        return self.output
+
+    def _render(self, phase: float):
+        """Synthesize the frame at phase (0 previous, 1 current) into output"""
+        weight = round(phase * (1 << BLEND_BITS))
+        previous = _pixels(self.previous, self.width, self.height)
+        output = _pixels(self.output, self.width, self.height)
+        if not self.moving:
+            start, diff = previous, self.diff
+        else:
+            # Content at q was at q - phase * v in the previous frame and is at q + (1 - phase) * v now
+            current = _pixels(self.current, self.width, self.height)
+            behind = np.rint(self.pixel_vectors * phase).astype(np.intp)
+            ahead = self.pixel_vectors - behind
+            start = self._gather(previous, -behind)
+            end = self._gather(current, ahead)
+            diff = np.subtract(end, start, dtype=np.int16)
+        np.multiply(diff, weight, out=self.blend)
+        self.blend += 1 << (BLEND_BITS - 1)
+        self.blend >>= BLEND_BITS
+        self.blend += start
+        np.copyto(output, self.blend, casting="unsafe")
+
+    def _gather(self, frame: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """frame at every pixel plus its offset, clamped to the edges"""
+        rows = np.clip(self.rows + offsets[..., 0], 0, self.height - 1)
+        columns = np.clip(self.columns + offsets[..., 1], 0, self.width - 1)
+        index = rows * self.width + columns
+        return np.take(frame.reshape(-1, 3), index.ravel(), axis=0).reshape(frame.shape)
+
+    def summary(self) -> str:
+        """One console line, timings since the previous summary"""
+        parts = []
+        for name, histogram in (("render", self.render_time), ("estimate", self.estimate_time)):
+            interval = histogram.take_interval()
+            parts.append(f"{name} p50/p99/max {interval.percentile(0.5) * 1e6:.0f}/"
+                         f"{interval.percentile(0.99) * 1e6:.0f}/{interval.max * 1e6:.0f} us")
+        input_fps = f"{1 / self.interval:.1f}" if self.interval else "-"
+        motion = ""
+        if self.motion:
+            motion = f", {self.moving_tiles * 100:.0f}% tiles moving, {self.fallbacks} fallbacks to linear"
+        return (f"Upconversion x{self.factor} ({self.mode}): input {input_fps} fps, {', '.join(parts)}, "
+                f"{self.synthesized} synthesized, {self.cut_short} cut short{motion}")
@@ -0,0 +1,218 @@
+"""
+OPC (Open Pixel Control) wire format shared by the bridge tools
+
+Besides the standard set-pixels command, smartmatrix-serial-5panel.ino
+understands a delta command that only carries the pixel spans that changed
+since the previous frame, and a run-length encoded full frame. Encoders here
+are used by the bridge; the reference decoders mirror the firmware and are
+used to check the encoders and by tools that stand in for the Teensy.
+
+Delta payload, repeated until the end of the message:
+    [start_hi][start_lo][count_hi][count_lo][count * 3 bytes of RGB]
+start and count are in pixels. An empty delta means nothing changed.
+
+RLE payload, repeated until the frame is full:
+    [control] with the high bit set: one RGB pixel repeated (control & 0x7F) + 1 times
+    [control] with the high bit clear: (control + 1) literal RGB pixels follow
+
+Set-options payload (not a frame, nothing is displayed):
+    [flags] OPTION_HOST_COLOR: frames are already color processed, display them as-is
+            OPTION_TELEMETRY: print the PERF: fps and per-frame timing lines for the bridge
+            OPTION_ACK: print "ACK <frame count> <microseconds>" for every frame displayed
+"""
+
+import struct
+
+import numpy as np
+
+OPC_CHANNEL = 0
+OPC_HEADER_SIZE = 4
+OPC_MAX_LENGTH = 0xFFFF   # the header's length field is 16 bits, for every command
+OPC_COMMAND_SET_PIXELS = 0
+OPC_COMMAND_SET_PIXELS_DELTA = 0x10
+OPC_COMMAND_SET_PIXELS_RLE = 0x11
+OPC_COMMAND_SET_OPTIONS = 0x20
+
+OPTION_HOST_COLOR = 0x01
+OPTION_TELEMETRY = 0x02
+OPTION_ACK = 0x04
+
+DELTA_SPAN_HEADER_SIZE = 4
+# Unchanged pixels between two spans are cheaper to resend than a new span header
+DELTA_SPAN_MERGE_GAP = 1
+
+RLE_REPEAT_FLAG = 0x80
+RLE_MAX_RUN = 128
+
+
+def pack_header(command: int, length: int, channel: int = OPC_CHANNEL) -> bytes:
+    """OPC header: [channel][command][length_hi][length_lo]"""
+    return struct.pack('>BBH', channel, command, length)
+
+
+def pack_options(flags: int, channel: int = OPC_CHANNEL) -> bytes:
+    """Complete set-options message"""
+    return pack_header(OPC_COMMAND_SET_OPTIONS, 1, channel) + bytes((flags,))
+
+
+def encode_delta(current, previous, out, width: int) -> int:
+    """Encode the pixels of current that differ from previous into out
+
+    current and previous are packed RGB frames of equal size, width is the
+    matrix width in pixels. Each changed row becomes one span from its first
+    to its last changed pixel, and neighbouring spans are merged.
+
+    Returns the payload length written to out, or -1 if the delta would not
+    be smaller than sending current as a full frame.
+    """
+    cur = np.frombuffer(current, dtype=np.uint8)
+    prev = np.frombuffer(previous, dtype=np.uint8)
+    frame_size = cur.size
+
+    changed = (cur != prev).reshape(-1, width, 3).any(axis=2)
+    rows = np.flatnonzero(changed.any(axis=1))
+    if rows.size == 0:
+        return 0
+
+    row_changes = changed[rows]
+    first = row_changes.argmax(axis=1)
+    last = width - row_changes[:, ::-1].argmax(axis=1)
+    starts = rows * width + first
+    ends = rows * width + last
+
+    # Merge spans whose gap is too small to be worth a span header
+    begins = np.flatnonzero(np.concatenate(([True], starts[1:] - ends[:-1] > DELTA_SPAN_MERGE_GAP)))
+    starts = starts[begins]
+    ends = ends[np.concatenate((begins[1:] - 1, [ends.size - 1]))]
+
+    length = int(DELTA_SPAN_HEADER_SIZE * starts.size + 3 * (ends - starts).sum())
+    if length >= frame_size:
+        return -1
+
+    source = memoryview(current).cast('B')
+    pos = 0
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        count = end - start
+        struct.pack_into('>HH', out, pos, start, count)
+        pos += DELTA_SPAN_HEADER_SIZE
+        out[pos:pos + count * 3] = source[start * 3:end * 3]
+        pos += count * 3
+    return pos
+
+
+def encode_rle(frame, out, limit: int = None) -> int:
+    """Run-length encode a packed RGB frame into out
+
+    Runs of two or more identical pixels become repeat chunks, everything
+    in between is sent as literal chunks, each chunk at most RLE_MAX_RUN
+    pixels. The size is worked out before anything is written.
+
+    Returns the payload length written to out, or -1 if it would not be
+    smaller than limit (by default the size of the raw frame).
+    """
+    px = np.frombuffer(frame, dtype=np.uint8).reshape(-1, 3)
+    num_pixels = len(px)
+    if limit is None:
+        limit = num_pixels * 3
+
+    packed = (px[:, 0].astype(np.uint32) << 16) | (px[:, 1].astype(np.uint32) << 8) | px[:, 2]
+    run_starts = np.flatnonzero(np.concatenate(([True], packed[1:] != packed[:-1])))
+    run_lengths = np.diff(np.append(run_starts, num_pixels))
+
+    # Every repeat run is a segment; consecutive single pixels form one literal segment
+    single = run_lengths == 1
+    seg_index = np.flatnonzero(~single | np.concatenate(([True], ~single[:-1])))
+    seg_start = run_starts[seg_index]
+    seg_length = np.add.reduceat(run_lengths, seg_index)
+    seg_repeat = ~single[seg_index]
+
+    # Split segments into chunks that fit a control byte
+    chunks_per_seg = (seg_length + RLE_MAX_RUN - 1) // RLE_MAX_RUN
+    chunk_seg = np.repeat(np.arange(seg_index.size), chunks_per_seg)
+    chunk_no = np.arange(chunk_seg.size) - np.repeat(np.cumsum(chunks_per_seg) - chunks_per_seg, chunks_per_seg)
+    chunk_start = seg_start[chunk_seg] + chunk_no * RLE_MAX_RUN
+    chunk_length = np.minimum(seg_length[chunk_seg] - chunk_no * RLE_MAX_RUN, RLE_MAX_RUN)
+    chunk_repeat = seg_repeat[chunk_seg]
+    chunk_pixels = np.where(chunk_repeat, 1, chunk_length)
+
+    chunk_size = 1 + 3 * chunk_pixels
+    length = int(chunk_size.sum())
+    if length >= limit:
+        return -1
+
+    o = np.frombuffer(out, dtype=np.uint8, count=length)
+    offsets = np.cumsum(chunk_size) - chunk_size
+    o[offsets] = np.where(chunk_repeat, RLE_REPEAT_FLAG, 0) | (chunk_length - 1)
+
+    # Gather the pixels each chunk carries into place after its control byte
+    first = np.cumsum(chunk_pixels) - chunk_pixels
+    k = np.arange(int(chunk_pixels.sum())) - np.repeat(first, chunk_pixels)
+    src = np.repeat(chunk_start, chunk_pixels) + k
+    dst = np.repeat(offsets + 1, chunk_pixels) + 3 * k
+    o[dst[:, None] + np.arange(3)] = px[src]
+    return length
+
+
+def apply_delta(frame: bytearray, payload) -> bool:
+    """Reference decoder: apply a delta payload to frame in place
+
+    Mirrors applyDelta() in smartmatrix-serial-5panel.ino and returns False
+    for a malformed payload.
+    """
+    num_pixels = len(frame) // 3
+    pos = 0
+    while pos + DELTA_SPAN_HEADER_SIZE <= len(payload):
+        start, count = struct.unpack_from('>HH', payload, pos)
+        pos += DELTA_SPAN_HEADER_SIZE
+        if start + count > num_pixels or pos + count * 3 > len(payload):
+            return False
+        frame[start * 3:(start + count) * 3] = payload[pos:pos + count * 3]
+        pos += count * 3
+    return pos == len(payload)
+
+
+def decode_rle(frame: bytearray, payload) -> bool:
+    """Reference decoder: decode an RLE payload into frame
+
+    Mirrors decodeRle() in smartmatrix-serial-5panel.ino and returns False
+    for a malformed payload or one that does not fill the frame exactly.
+    """
+    num_pixels = len(frame) // 3
+    pos = 0
+    pixel = 0
+    while pos < len(payload):
+        control = payload[pos]
+        pos += 1
+        count = (control & 0x7F) + 1
+        if pixel + count > num_pixels:
+            return False
+        if control & RLE_REPEAT_FLAG:
+            if pos + 3 > len(payload):
+                return False
+            frame[pixel * 3:(pixel + count) * 3] = bytes(payload[pos:pos + 3]) * count
+            pos += 3
+        else:
+            if pos + count * 3 > len(payload):
+                return False
+            frame[pixel * 3:(pixel + count) * 3] = payload[pos:pos + count * 3]
+            pos += count * 3
+        pixel += count
+    return pixel == num_pixels
+
+
+def decode_message(frame: bytearray, command: int, payload, has_keyframe: bool = True) -> bool:
+    """Reference decoder: apply one OPC message to frame in place
+
+    Returns False for messages the firmware would reject as invalid, and
+    for set-options messages, which don't carry a frame.
+    """
+    if command == OPC_COMMAND_SET_PIXELS:
+        if len(payload) != len(frame):
+            return False
+        frame[:] = payload
+        return True
+    if command == OPC_COMMAND_SET_PIXELS_DELTA:
+        return has_keyframe and apply_delta(frame, payload)
+    if command == OPC_COMMAND_SET_PIXELS_RLE:
+        return decode_rle(frame, payload)
+    return False
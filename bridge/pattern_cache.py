@@ -0,0 +1,102 @@
+"""
+Pre-rendered frame rings for periodic test patterns
+
+A pattern that repeats every `period` frames is rendered once into a
+contiguous (period, H, W, 3) ring; after that, frame n is just ring[n %
+period], with no per-frame compute. Rings larger than spill_bytes are
+written to a memory-mapped file instead of RAM. The cache holds at most
+max_bytes of rings and evicts the least recently used ones first.
+
+A pattern's period is either declared by the caller or found with
+detect_period(), which renders frames until the first two come back.
+"""
+
+import mmap
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_SPILL_BYTES = 64 * 1024 * 1024
+
+
+def _matches(frame, reference, tolerance: int) -> bool:
+    if not tolerance:
+        return np.array_equal(frame, reference)
+    return int(np.abs(frame.astype(np.int16) - reference).max()) <= tolerance
+
+
+def detect_period(render, max_period: int, tolerance: int = 0):
+    """Smallest p <= max_period with frames p, p+1 matching frames 0, 1; None if there is none
+
+    render(t) returns the frame for animation time t. Frames match when no
+    channel differs by more than tolerance, which lets float rounding in a
+    pattern's time term through.
+    """
+    first = render(0).copy()
+    second = render(1).copy()
+    for period in range(1, max_period + 1):
+        if _matches(render(period), first, tolerance) and _matches(render(period + 1), second, tolerance):
+            return period
+    return None
+
+
+class PatternCache:
+    """LRU cache of rendered frame rings, keyed by pattern name"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, spill_bytes: int = DEFAULT_SPILL_BYTES,
+                 spill_dir: str = None):
+        self.max_bytes = max_bytes
+        self.spill_bytes = spill_bytes
+        self.spill_dir = spill_dir
+        self.rings = OrderedDict()  # key -> ring array, in RAM or over a mapped temporary file
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def ring(self, key, render, period: int, shape):
+        """The ring for key, rendering it with render(t) for t in 0..period-1 if needed
+
+        shape is the frame shape, e.g. (H, W, 3). Returns None when a ring
+        for this period would not fit in max_bytes at all.
+        """
+        if key in self.rings:
+            self.rings.move_to_end(key)
+            self.hits += 1
+            return self.rings[key]
+
+        self.misses += 1
+        size = period * int(np.prod(shape))
+        if size > self.max_bytes:
+            return None
+        while self.rings and self.total_bytes + size > self.max_bytes:
+            self._evict()
+
+        ring = self._allocate((period,) + tuple(shape), size)
+        for t in range(period):
+            ring[t] = render(t)
+
+        self.rings[key] = ring
+        self.total_bytes += size
+        return ring
+
+    def _allocate(self, shape, size: int):
+        if size <= self.spill_bytes:
+            return np.empty(shape, dtype=np.uint8)
+        # The mapping keeps its own handle on the file, which is deleted once the
+        # ring is garbage collected (Windows won't delete a mapped file before that)
+        with tempfile.TemporaryFile(prefix="pattern-ring-", suffix=".u8", dir=self.spill_dir) as f:
+            f.truncate(size)
+            mapping = mmap.mmap(f.fileno(), size)
+        return np.frombuffer(mapping, dtype=np.uint8).reshape(shape)
+
+    def _evict(self):
+        _, ring = self.rings.popitem(last=False)
+        self.total_bytes -= ring.nbytes
+        self.evictions += 1
+
+    def clear(self):
+        while self.rings:
+            self._evict()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+SD Card Player
+Plays a show-mode output.bin on the interactive firmware over OPC, to
+preview it without copying it to the SD card and reflashing the Teensy
+
+Usage:
+    python sdcard-player.py FILE [COM_PORT] [options]
+
+Examples:
+    python sdcard-player.py output.bin COM3
+    python sdcard-player.py output.bin /dev/ttyACM0 --start 90 --loop 0
+    python sdcard-player.py output.bin /dev/ttyACM0 --max
+
+Frames are shown on the schedule set by their microsecond fields, measured
+from the start of playback, so a frame that goes out late doesn't delay the
+ones after it. --max ignores the timing and reports how fast the serial link
+takes the file, which tells whether it keeps up with the file's frame rate.
+"""
+
+import argparse
+import sys
+import time
+
+from bridge_util import load_script, wait_until
+from sdcard_format import SdcardFormatError, SdcardVideo
+
+LATE_THRESHOLD = 0.002  # a frame going out later than this counts as late
+STATUS_INTERVAL = 5.0
+
+
+bridge = load_script("artnet-to-serial-sender")
+
+
+class PlaybackStats:
+    """Frames sent and how far behind schedule they went out"""
+
+    def __init__(self):
+        self.frames = 0
+        self.late_frames = 0
+        self.worst_late = 0.0
+        self.start = time.perf_counter()
+
+    def sent(self, lateness: float):
+        self.frames += 1
+        if lateness > LATE_THRESHOLD:
+            self.late_frames += 1
+        self.worst_late = max(self.worst_late, lateness)
+
+    def rate(self) -> float:
+        return self.frames / max(time.perf_counter() - self.start, 1e-9)
+
+
+def play(video: SdcardVideo, sender, start_frame: int = 0, speed: float = 1.0, stats: PlaybackStats = None):
+    """Send frames start_frame.. once, on the file's schedule (speed 0 sends as fast as possible)
+
+    Returns the PlaybackStats for this pass.
+    """
+    stats = stats or PlaybackStats()
+    times = video.times_us
+    origin = time.perf_counter() - times[start_frame] / 1e6 / speed if speed else 0.0
+    last_status = time.perf_counter()
+
+    for index in range(start_frame, len(video)):
+        lateness = 0.0
+        if speed:
+            due = origin + times[index] / 1e6 / speed
+            wait_until(due)
+            lateness = time.perf_counter() - due
+        frame = video.frame(index)
+        try:
+            sender.send_frame(frame)
+        finally:
+            frame.release()
+        stats.sent(lateness)
+
+        if time.perf_counter() - last_status > STATUS_INTERVAL:
+            print(f"At {times[index] / 1e6:.1f}s (frame {index}), {stats.rate():.1f} fps, "
+                  f"{stats.late_frames} late, worst {stats.worst_late * 1000:.1f} ms")
+            last_status = time.perf_counter()
+    return stats
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Play a show-mode output.bin on the Teensy over OPC")
+    parser.add_argument("file", help="output.bin from video-to-sdcard.py or --capture-sd")
+    parser.add_argument("port", nargs="?",
+                        help="serial port, e.g. COM3 or /dev/ttyACM0 (auto-detected if omitted)")
+    parser.add_argument("--start", type=float, default=0.0, metavar="SECONDS",
+                        help="start playback this far into the file (default: %(default)s)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="playback rate, 2 plays twice as fast (default: %(default)s)")
+    parser.add_argument("--max", action="store_true",
+                        help="send as fast as the link takes frames, ignoring the file's timing")
+    parser.add_argument("--loop", type=int, default=1,
+                        help="times to play the file, 0 repeats until stopped (default: %(default)s)")
+    parser.add_argument("--delta", action="store_true",
+                        help="send only changed pixels between keyframes (needs delta-capable firmware)")
+    parser.add_argument("--compress", action="store_true",
+                        help="run-length encode frames when that is smaller (needs RLE-capable firmware)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        video = SdcardVideo(args.file)
+    except (OSError, SdcardFormatError) as e:
+        print(f"Could not open {args.file}: {e}")
+        return 1
+
+    if video.frame_size != bridge.FRAME_SIZE:
+        print(f"{args.file} has {video.num_leds} LEDs per frame, the matrix has {bridge.NUM_PIXELS}")
+        video.close()
+        return 1
+    if not len(video):
+        print(f"{args.file} has no frames")
+        video.close()
+        return 1
+
+    port = args.port
+    if not port:
+        print("No port specified, scanning for Teensy...\n")
+        port = bridge.find_teensy_ports()
+        if not port:
+            print("No ports found. Make sure Teensy is connected.")
+            video.close()
+            return 1
+
+    file_fps = (len(video) - 1) / video.duration if video.duration else 0.0
+    start_frame = video.frame_at(args.start)
+    speed = 0 if args.max else args.speed
+    print("\nSD Card Player")
+    print(f"File: {args.file}, {len(video)} frames, {video.duration:.1f}s, {file_fps:.1f} fps"
+          f"{' (truncated)' if video.truncated else ''}")
+    print(f"Serial Port: {port}")
+    print(f"Playback: {'max speed' if args.max else f'{args.speed:g}x'}"
+          f"{f', from {args.start:g}s (frame {start_frame})' if start_frame else ''}")
+    print("Press Ctrl+C to stop\n")
+
+    sender = bridge.OPCSender(port, delta=args.delta, compress=args.compress)
+    if not sender.connect():
+        video.close()
+        return 1
+
+    passes = 0
+    stats = PlaybackStats()
+    try:
+        while not args.loop or passes < args.loop:
+            play(video, sender, start_frame if passes == 0 else 0, speed, stats)
+            passes += 1
+    except KeyboardInterrupt:
+        print("\nStopping...")
+    finally:
+        elapsed = time.perf_counter() - stats.start
+        print(f"Sent {stats.frames} frames in {elapsed:.1f}s ({stats.rate():.1f} fps, "
+              f"{stats.late_frames} late, worst {stats.worst_late * 1000:.1f} ms late)")
+        if args.max and file_fps:
+            verdict = "keeps up with" if stats.rate() >= file_fps else "is too slow for"
+            print(f"The link {verdict} the file's {file_fps:.1f} fps")
+        sender.send_black_frame()
+        sender.disconnect()
+        video.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
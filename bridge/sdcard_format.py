@@ -0,0 +1,232 @@
+"""
+output.bin format played by videosdcard-smartmatrix-5panel.ino
+
+The file is a sequence of frames, each a 5-byte header and the packed RGB
+pixels of the 64x192 drawing area (panels 1-3; the firmware mirrors panels
+1-2 onto 4-5 itself). Header fields are little-endian, as the sketch reads
+them:
+
+    frame: ['*'][LED count u16][microseconds per frame u16][LED count * 3 bytes of RGB]
+    end:   [0x7E][LED count u16][microseconds per frame u16]
+
+The end marker carries a full header so the sketch's 5-byte read succeeds
+before it sees the marker. The sketch waits each frame's microseconds after
+showing the previous frame, so frames can carry their own timing. A frame
+waits at most 65535 us; longer pauses are stored as repeats of the previous
+frame.
+
+SdcardWriter builds such a file from live frames (the bridge's --capture-sd)
+and SdcardVideo reads one back through a memory map.
+"""
+
+import mmap
+import os
+import queue
+import struct
+import threading
+
+import numpy as np
+
+FRAME_MARKER = ord('*')
+END_MARKER = 0x7E
+HEADER = struct.Struct('<BHH')
+HEADER_SIZE = HEADER.size
+MAX_FRAME_USEC = 0xFFFF
+MAX_LEDS = 0xFFFF
+CAPTURE_QUEUE_FRAMES = 64  # frames the writer thread may fall behind before frames are dropped
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+class SdcardFormatError(ValueError):
+    """Frame geometry or timing the sketch can't represent"""
+
+
+def frame_usec(fps: float) -> int:
+    """Microseconds per frame for a frame rate, as stored in the header"""
+    if fps <= 0:
+        raise SdcardFormatError(f"frame rate must be positive, got {fps:g}")
+    usec = round(1e6 / fps)
+    if usec > MAX_FRAME_USEC:
+        raise SdcardFormatError(f"{fps:g} fps is {usec} us per frame, the header holds at most {MAX_FRAME_USEC}")
+    return usec
+
+
+def pack_frame_header(num_leds: int, usec: int) -> bytes:
+    if num_leds > MAX_LEDS:
+        raise SdcardFormatError(f"{num_leds} LEDs don't fit in the header, at most {MAX_LEDS}")
+    return HEADER.pack(FRAME_MARKER, num_leds, usec)
+
+
+def pack_end_marker(num_leds: int, usec: int) -> bytes:
+    return HEADER.pack(END_MARKER, num_leds, usec)
+
+
+class SdcardWriter:
+    """Writes frames to a new output.bin, timed by when they arrived
+
+    write() is called from the bridge's encode path. It only copies the
+    frame into a preallocated slot and never blocks: if the writer thread
+    has fallen CAPTURE_QUEUE_FRAMES behind, the frame is dropped and the
+    next one carries the time of both.
+    """
+
+    def __init__(self, path: str, num_leds: int, queue_frames: int = CAPTURE_QUEUE_FRAMES):
+        pack_frame_header(num_leds, 0)  # validates num_leds
+        self.path = path
+        self.num_leds = num_leds
+        self.file = open(path, "xb", buffering=WRITE_BUFFER_SIZE)
+        record_size = HEADER_SIZE + num_leds * 3
+        self.slots = [memoryview(bytearray(record_size)) for _ in range(max(queue_frames, 2))]
+        self.free_slots = queue.SimpleQueue()
+        for slot in self.slots:
+            self.free_slots.put(slot)
+        self.filled_slots = queue.SimpleQueue()
+        self.last_time_us = None
+        self.last_usec = 0
+        self.frames = 0        # frames queued
+        self.frames_written = 0  # frames in the file, including repeats for long pauses
+        self.dropped = 0
+        self.error = None
+        self.thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.thread.start()
+
+    def write(self, frame, timestamp: float) -> bool:
+        """Queue a frame (num_leds * 3 bytes of RGB) completed at monotonic timestamp, in seconds"""
+        try:
+            slot = self.free_slots.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return False
+
+        # Absolute microseconds, so rounding never adds up to drift over a long capture
+        time_us = round(timestamp * 1e6)
+        usec = 0 if self.last_time_us is None else max(time_us - self.last_time_us, 0)
+        self.last_time_us = time_us
+        self.last_usec = usec
+
+        slot[0] = FRAME_MARKER
+        slot[1:3] = self.num_leds.to_bytes(2, "little")
+        slot[3:5] = min(usec, MAX_FRAME_USEC).to_bytes(2, "little")
+        slot[HEADER_SIZE:] = frame
+        self.filled_slots.put((slot, usec))
+        self.frames += 1
+        return True
+
+    def close(self):
+        """Write the queued frames and the end marker, then close the file"""
+        self.filled_slots.put(None)
+        self.thread.join()
+        try:
+            if self.error is None:
+                self.file.write(pack_end_marker(self.num_leds, min(self.last_usec, MAX_FRAME_USEC)))
+        finally:
+            self.file.close()
+
+    def _writer_loop(self):
+        # The previous frame's slot is held back so a long pause can repeat it
+        previous = None
+        while True:
+            item = self.filled_slots.get()
+            if item is None:
+                break
+            slot, usec = item
+            if self.error is None:
+                try:
+                    if previous is not None:
+                        while usec > MAX_FRAME_USEC:
+                            previous[3:5] = MAX_FRAME_USEC.to_bytes(2, "little")
+                            self.file.write(previous)
+                            self.frames_written += 1
+                            usec -= MAX_FRAME_USEC
+                        slot[3:5] = usec.to_bytes(2, "little")
+                    self.file.write(slot)
+                    self.frames_written += 1
+                except OSError as e:
+                    self.error = e  # keep taking frames so write() never blocks
+            if previous is not None:
+                self.free_slots.put(previous)
+            previous = slot
+        if previous is not None:
+            self.free_slots.put(previous)
+
+
+class SdcardVideo:
+    """Read-only, memory-mapped output.bin with its frames indexed up front
+
+    Every frame must have the LED count of the first one, as written by
+    video-to-sdcard.py and --capture-sd. The index is built in one pass over
+    the headers; reading stops at the end marker, or at a frame the file
+    ends in the middle of (truncated is then set).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            # mmap can't map an empty file
+            if os.fstat(f.fileno()).st_size < HEADER_SIZE:
+                raise SdcardFormatError(f"{path}: too short for an output.bin")
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        try:
+            self._index()
+        except SdcardFormatError:
+            self.close()
+            raise
+
+    def _index(self):
+        size = len(self.map)
+        if size < HEADER_SIZE:
+            raise SdcardFormatError(f"{self.path}: too short for an output.bin")
+        marker, self.num_leds, _ = HEADER.unpack_from(self.map, 0)
+        if marker != FRAME_MARKER:
+            raise SdcardFormatError(f"{self.path}: no frame header at the start of the file")
+        self.frame_size = self.num_leds * 3
+        self.record_size = HEADER_SIZE + self.frame_size
+
+        # All headers at once, as a strided view into the map
+        count = size // self.record_size
+        headers = np.ndarray((count, HEADER_SIZE), dtype=np.uint8, buffer=self.map,
+                             strides=(self.record_size, 1))
+        leds = headers[:, 1].astype(np.uint16) | (headers[:, 2].astype(np.uint16) << 8)
+        bad = np.flatnonzero((headers[:, 0] != FRAME_MARKER) | (leds != self.num_leds))
+
+        frames = int(bad[0]) if len(bad) else count
+        end = frames * self.record_size
+        self.truncated = False
+        if frames < count or end + HEADER_SIZE <= size:
+            marker, num_leds, _ = HEADER.unpack_from(self.map, end)
+            if marker == FRAME_MARKER and num_leds != self.num_leds:
+                raise SdcardFormatError(f"{self.path}: frame {frames} has {num_leds} LEDs, "
+                                        f"the first frame has {self.num_leds}")
+            if marker == FRAME_MARKER:
+                self.truncated = True  # a whole header, but the file ends inside its pixels
+            elif marker != END_MARKER:
+                raise SdcardFormatError(f"{self.path}: unknown header 0x{marker:02X} at byte {end}")
+        elif end < size:
+            self.truncated = True
+
+        self.frame_count = frames
+        self.usec = (headers[:frames, 3].astype(np.int64) | (headers[:frames, 4].astype(np.int64) << 8))
+        # When each frame is shown, counted from the first frame, as the sketch paces them
+        self.times_us = np.cumsum(self.usec) - self.usec[0] if frames else self.usec
+
+    def __len__(self) -> int:
+        return self.frame_count
+
+    @property
+    def duration(self) -> float:
+        """Seconds from the first frame to the last"""
+        return float(self.times_us[-1]) / 1e6 if self.frame_count else 0.0
+
+    def frame(self, index: int) -> memoryview:
+        """RGB pixels of a frame, a view into the map"""
+        start = index * self.record_size + HEADER_SIZE
+        return self.view[start:start + self.frame_size]
+
+    def frame_at(self, seconds: float) -> int:
+        """Index of the frame showing at a time from the start"""
+        return max(int(np.searchsorted(self.times_us, seconds * 1e6, side="right")) - 1, 0)
+
+    def close(self):
+        self.view.release()
+        self.map.close()
@@ -0,0 +1,420 @@
+"""
+Telemetry the serial firmware sends back to the bridge
+
+smartmatrix-serial-5panel.ino reports on the same serial port that carries
+the frames: PERF: lines with its frame rate and the microseconds updateLeds()
+took for each frame, and a line for every invalid OPC frame and every OPC
+buffer overflow. With OPTION_TELEMETRY set it prints the PERF: lines even
+when it was built without showFps and showTiming.
+
+With OPTION_ACK set it also acknowledges every frame it displays:
+
+    ACK <frame count> <microseconds from receiving the frame to swapping it on screen>
+
+TelemetryReader parses those lines into a DeviceTelemetry on a background
+thread. RateController turns the telemetry into a cap on the frame rate
+sent to the device, so the bridge backs off before it overruns the
+firmware's opcBuffer instead of after. AckWindow matches acks to the frames
+written, so the sender can keep a bounded number of frames in flight.
+"""
+
+import math
+import re
+import threading
+import time
+from collections import deque
+
+from bridge_metrics import LatencyHistogram
+
+PERF_FPS = re.compile(rb"PERF:\s+([\d.]+) fps, frame count: (\d+)")
+PERF_ELAPSED = re.compile(rb"PERF:\s+elapsed microseconds: (\d+)")
+ACK = re.compile(rb"ACK (\d+) (\d+)")
+INVALID_FRAME = b"Invalid OPC frame"
+OVERFLOW = b"OPC buffer overflow"
+
+READ_SIZE = 4096
+MAX_LINE = 256            # longer runs without a line ending are noise, not telemetry
+FRAME_TIME_SMOOTHING = 0.1  # weight of each frame's processing time in the running average
+STOP_TIMEOUT = 2.0
+ACK_TIMEOUT = 0.5         # a frame not acknowledged within this is counted as lost
+EXPIRED_MEMORY = 16       # timed out frames remembered to recognize their late acks
+
+# Rate control
+MIN_FPS = 10.0          # never throttle below this
+HEADROOM = 0.85         # send at most this fraction of what the processing time allows
+DECREASE = 0.75         # rate multiplier after an overflow or invalid frame
+INCREASE = 2.0          # fps per second the cap recovers by
+RECOVERY_DELAY = 2.0    # seconds without errors before the cap starts to recover
+BEHIND_RATIO = 0.9      # the device completing fewer than this fraction of the frames sent is falling behind
+SEND_RATE_SMOOTHING = 0.05
+
+
+class DeviceTelemetry:
+    """What the firmware reported last, updated by a TelemetryReader
+
+    With an AckWindow in acks, acks and lost frames are passed on to it.
+    """
+
+    def __init__(self, acks: "AckWindow" = None):
+        self.acks = acks
+        self.fps = None           # PERF fps, over the device's last 100 frames
+        self.fps_reports = 0
+        self.device_frames = 0    # the device's frame count at the last fps report
+        self.frame_us = None      # running average of updateLeds() microseconds
+        self.frame_us_max = 0
+        self.invalid_frames = 0
+        self.overflows = 0
+        self.lines = 0
+        self.last_status = None   # last STATUS: or INFO: line
+        self.last_line_time = None
+
+    @property
+    def errors(self) -> int:
+        """Frames the device threw away"""
+        return self.invalid_frames + self.overflows
+
+    def handle_line(self, line: bytes, now: float) -> bool:
+        """Update from one line of firmware output, returns True if it reports a lost frame"""
+        self.lines += 1
+        self.last_line_time = now
+
+        match = ACK.match(line)
+        if match:
+            if self.acks:
+                self.acks.acknowledged(int(match[1]), int(match[2]), now)
+            return False
+
+        match = PERF_ELAPSED.match(line)
+        if match:
+            elapsed = int(match[1])
+            if self.frame_us is None:
+                self.frame_us = float(elapsed)
+            else:
+                self.frame_us += (elapsed - self.frame_us) * FRAME_TIME_SMOOTHING
+            self.frame_us_max = max(self.frame_us_max, elapsed)
+            return False
+
+        match = PERF_FPS.match(line)
+        if match:
+            self.fps = float(match[1])
+            self.device_frames = int(match[2])
+            self.fps_reports += 1
+            return False
+
+        if line.startswith(OVERFLOW):
+            self.overflows += 1
+        elif line.startswith(INVALID_FRAME):
+            self.invalid_frames += 1
+        else:
+            if line.startswith((b"STATUS:", b"INFO:")):
+                self.last_status = line.decode(errors="replace")
+            return False
+        if self.acks:
+            self.acks.lost(now)
+        return True
+
+    def summary(self) -> str:
+        fps = f"{self.fps:.1f} fps" if self.fps is not None else "fps n/a"
+        frame_time = f"{self.frame_us / 1000:.1f} ms/frame" if self.frame_us is not None else "frame time n/a"
+        return f"{fps}, {frame_time}, {self.overflows} overflows, {self.invalid_frames} invalid frames"
+
+
+class TelemetryReader:
+    """Background thread that reads firmware output from a serial port into a DeviceTelemetry
+
+    on_error is called from the reader thread whenever the device reports
+    a frame it threw away.
+    """
+
+    def __init__(self, serial_port, telemetry: DeviceTelemetry, on_error=None):
+        self.serial = serial_port
+        self.telemetry = telemetry
+        self.on_error = on_error
+        self.running = False
+        self.thread = None
+        self.error = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._read_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the thread, it notices within the port's read timeout"""
+        self.running = False
+        if self.thread:
+            self.thread.join(STOP_TIMEOUT)
+
+    def _read_loop(self):
+        pending = bytearray()
+        while self.running:
+            try:
+                # Blocks for up to the port's timeout when nothing is waiting
+                data = self.serial.read(min(max(self.serial.in_waiting, 1), READ_SIZE))
+            except Exception as e:
+                if self.running:
+                    self.error = e
+                break
+            if not data:
+                continue
+
+            pending += data
+            now = time.monotonic()
+            while True:
+                end = pending.find(b"\n")
+                if end < 0:
+                    break
+                line = bytes(pending[:end]).rstrip(b"\r ")
+                del pending[:end + 1]
+                if self.telemetry.handle_line(line, now) and self.on_error:
+                    self.on_error()
+            if len(pending) > MAX_LINE:
+                pending.clear()
+
+
+class RateController:
+    """Closed-loop cap on the frame rate sent to one device
+
+    The cap never goes above what the device's reported processing time
+    allows, with some headroom, nor above max_fps (0 for no fixed limit).
+    When the firmware reports an overflow or an invalid frame, the cap drops
+    to DECREASE times the rate frames were actually going out at; when its
+    fps reports show it completing fewer frames than were sent in between,
+    the cap drops to the device's rate. After RECOVERY_DELAY seconds without errors
+    it climbs back by INCREASE fps per second.
+    """
+
+    def __init__(self, telemetry: DeviceTelemetry = None, max_fps: float = 0.0, min_fps: float = MIN_FPS):
+        self.telemetry = telemetry
+        self.max_fps = max_fps
+        self.min_fps = min(min_fps, max_fps) if max_fps else min_fps
+        self.limit = max_fps or math.inf
+        self.send_fps = 0.0
+        self.frames_sent = 0
+        self.last_send = None
+        self.last_update = None
+        self.last_backoff = -math.inf
+        self.errors_seen = 0
+        self.fps_reports_seen = 0
+        self.report_frames_sent = None  # frames_sent and the device's count at the previous fps report
+        self.report_device_frames = 0
+        self.backoffs = 0
+
+    def ceiling(self) -> float:
+        """Fastest rate the fixed limit and the device's processing time allow"""
+        ceiling = self.max_fps or math.inf
+        if self.telemetry and self.telemetry.frame_us:
+            ceiling = min(ceiling, HEADROOM * 1e6 / self.telemetry.frame_us)
+        return max(ceiling, self.min_fps)
+
+    def delay(self, now: float) -> float:
+        """Seconds to wait at now before the next frame may be sent"""
+        self._update(now)
+        if self.last_send is None or math.isinf(self.limit):
+            return 0.0
+        return max(self.last_send + 1.0 / self.limit - now, 0.0)
+
+    def sent(self, now: float):
+        """Record that a frame went out at now"""
+        if self.last_send is not None and now > self.last_send:
+            fps = 1.0 / (now - self.last_send)
+            if self.send_fps:
+                self.send_fps += (fps - self.send_fps) * SEND_RATE_SMOOTHING
+            else:
+                self.send_fps = fps
+        self.frames_sent += 1
+        self.last_send = now
+
+    def _backoff(self, rate: float, now: float):
+        self.limit = max(min(self.limit, rate), self.min_fps)
+        self.last_backoff = now
+        self.backoffs += 1
+
+    def _update(self, now: float):
+        elapsed = now - self.last_update if self.last_update is not None else 0.0
+        self.last_update = now
+        telemetry = self.telemetry
+        if telemetry:
+            if telemetry.errors != self.errors_seen:
+                self.errors_seen = telemetry.errors
+                rate = self.send_fps or self.limit
+                self._backoff(rate * DECREASE if not math.isinf(rate) else self.min_fps, now)
+            elif telemetry.fps_reports != self.fps_reports_seen:
+                self.fps_reports_seen = telemetry.fps_reports
+                if self.report_frames_sent is not None:
+                    sent = self.frames_sent - self.report_frames_sent
+                    completed = telemetry.device_frames - self.report_device_frames
+                    if telemetry.fps and 0 <= completed < sent * BEHIND_RATIO:
+                        self._backoff(telemetry.fps, now)
+                self.report_frames_sent = self.frames_sent
+                self.report_device_frames = telemetry.device_frames
+
+        if not math.isinf(self.limit) and now - self.last_backoff > RECOVERY_DELAY:
+            self.limit += INCREASE * elapsed
+        ceiling = self.ceiling()
+        if math.isinf(ceiling) and self.send_fps and self.limit > 2 * self.send_fps:
+            self.limit = ceiling  # recovered well past the rate frames arrive at, stop limiting
+        self.limit = min(self.limit, ceiling)
+
+    def summary(self) -> str:
+        limit = "none" if math.isinf(self.limit) else f"{self.limit:.1f} fps"
+        return f"send cap {limit}, sending {self.send_fps:.1f} fps, {self.backoffs} backoffs"
+
+
+class AckWindow:
+    """Frames written to the device and not acknowledged yet, at most size of them
+
+    The sender calls sent() right before it writes a frame, cancel() if the
+    write fails, and wait_for_slot() before the next one. Every frame in
+    flight carries the frame count the device will ack it with, numbered
+    from the first ack on. An ack retires the frames up to its count, so
+    frames whose ack lines went missing are retired along with the next one.
+    A frame the device reports as invalid is counted as lost, and the frames
+    after it are renumbered since the device doesn't count it. A frame still
+    unacknowledged after timeout seconds frees its slot as well, so
+    wait_for_slot() never blocks for longer than timeout.
+
+    A late ack for a frame that already timed out is ignored. An ack behind
+    the frames in flight that matches none of them resynchronizes the count
+    to the device's, and so does an ignored late ack when the frame after it
+    times out too: the ack was that frame's, and the device never counted
+    the one before.
+    """
+
+    def __init__(self, size: int, timeout: float = ACK_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self.condition = threading.Condition()
+        self.in_flight = deque()   # [device frame count or None until known, write time], oldest first
+        self.expired = deque(maxlen=EXPIRED_MEMORY)  # frame counts that timed out, for late acks
+        self.next_frame = None     # the device's frame count for the next frame sent, once known
+        self.late_ack = False      # an ack was taken as late since the window last drained
+        self.acked = 0
+        self.lost_frames = 0
+        self.timeouts = 0
+        self.device_us = None      # device time of the last acknowledged frame
+        self.round_trips = LatencyHistogram()  # write to displayed
+        self.on_slot_free = None   # called from the reader thread when an ack frees a slot
+
+    @property
+    def frames_in_flight(self) -> int:
+        return len(self.in_flight)
+
+    def reset(self):
+        """Forget the frames in flight, for a new connection"""
+        with self.condition:
+            self.in_flight.clear()
+            self.expired.clear()
+            self.next_frame = None
+            self.late_ack = False
+            self.condition.notify_all()
+
+    def sent(self, now: float):
+        with self.condition:
+            self.in_flight.append([self.next_frame, now])
+            if self.next_frame is not None:
+                self.next_frame += 1
+
+    def cancel(self):
+        """Take back the frame registered last, its write failed"""
+        with self.condition:
+            if self.in_flight:
+                self.in_flight.pop()
+                if self.next_frame is not None:
+                    self.next_frame -= 1
+                self.condition.notify_all()
+        if self.on_slot_free:
+            self.on_slot_free()
+
+    def has_slot(self, now: float) -> bool:
+        with self.condition:
+            self._expire(now)
+            return len(self.in_flight) < self.size
+
+    def wait_for_slot(self):
+        """Block until fewer than size frames are in flight"""
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                if len(self.in_flight) < self.size:
+                    return
+                self.condition.wait(self.in_flight[0][1] + self.timeout - now)
+
+    def acknowledged(self, frame: int, device_us: int, now: float):
+        """The device displayed its frame number frame, device_us after receiving it"""
+        with self.condition:
+            if self.next_frame is None:
+                # The first ack is for the oldest frame in flight
+                for number, entry in enumerate(self.in_flight, frame):
+                    entry[0] = number
+                self.next_frame = frame + max(len(self.in_flight), 1)
+
+            oldest = self.in_flight[0][0] if self.in_flight else self.next_frame
+            if frame < oldest:
+                if frame in self.expired:
+                    self.late_ack = True
+                    return  # a frame that already timed out
+                # Frames we counted that the device never did, its count is the truth
+                if not self.in_flight:
+                    self.next_frame = frame + 1
+                    return
+                self._renumber(frame - oldest)
+
+            retired = 0
+            while self.in_flight and self.in_flight[0][0] <= frame:
+                written = self.in_flight.popleft()[1]
+                retired += 1
+            if frame >= self.next_frame:
+                # More frames than we know of, lost track: start over from this ack
+                self.next_frame = frame + 1
+            while self.expired and self.expired[0] <= frame:
+                self.expired.popleft()
+            if retired:
+                self.acked += retired
+                self.device_us = device_us
+                self.round_trips.record(now - written)
+            if not self.in_flight:
+                self.late_ack = False
+            self.condition.notify_all()
+        if self.on_slot_free:
+            self.on_slot_free()
+
+    def lost(self, now: float):
+        """The device threw the oldest frame in flight away"""
+        with self.condition:
+            if self.in_flight:
+                number = self.in_flight.popleft()[0]
+                if number is not None:
+                    self._renumber(-1)
+                self.lost_frames += 1
+                self.condition.notify_all()
+        if self.on_slot_free:
+            self.on_slot_free()
+
+    def _renumber(self, shift: int):
+        """Move the frame counts of the frames in flight, and the next one, by shift"""
+        for entry in self.in_flight:
+            entry[0] += shift
+        self.next_frame += shift
+        self.expired.clear()
+
+    def _expire(self, now: float):
+        while self.in_flight and now - self.in_flight[0][1] > self.timeout:
+            number = self.in_flight.popleft()[0]
+            self.timeouts += 1
+            if number is None:
+                continue
+            if self.late_ack:
+                # The ack taken as late was this frame's
+                self.late_ack = False
+                self._renumber(-1)
+            else:
+                self.expired.append(number)
+
+    def summary(self) -> str:
+        interval = self.round_trips.take_interval()
+        device = f", device {self.device_us / 1000:.1f} ms" if self.device_us is not None else ""
+        return (f"{self.frames_in_flight}/{self.size} in flight, round trip p50/p99/max "
+                f"{interval.percentile(0.5) * 1000:.1f}/{interval.percentile(0.99) * 1000:.1f}/"
+                f"{interval.max * 1000:.1f} ms{device}, {self.lost_frames} lost, {self.timeouts} timed out")
@@ -4,30 +4,40 @@ OPC (Open Pixel Control) Serial Sender
 Sends demo patterns to Teensy running smartmatrix-serial.ino
 
 Usage:
-    python artnet-to-serial-sender.py [COM_PORT] [PATTERN]
+    python test-serial-sender.py [COM_PORT] [PATTERN] [--fps FPS]
 
 Examples:
-    python artnet-to-serial-sender.py COM3 rainbow
-    python artnet-to-serial-sender.py /dev/ttyACM0 solid
+    python test-serial-sender.py COM3 rainbow
+    python test-serial-sender.py /dev/ttyACM0 solid
+    python test-serial-sender.py /dev/ttyACM0 plasma --fps 0
+    python test-serial-sender.py /dev/ttyACM0 checker --fps 0 --cache
 """
 
 import serial
 import serial.tools.list_ports
 import time
 import math
-import sys
 import struct
+import itertools
+import argparse
+import colorsys
 from typing import Tuple, List
 
+import numpy as np
+
+from pattern_cache import PatternCache, detect_period
+
 # Matrix configuration (must match Teensy code)
 MATRIX_WIDTH = 64
 MATRIX_HEIGHT = 64*3
 NUM_PIXELS = MATRIX_WIDTH * MATRIX_HEIGHT
+FRAME_SIZE = NUM_PIXELS * 3
 
 # OPC Protocol constants
 OPC_CHANNEL = 0
 OPC_COMMAND_SET_PIXELS = 0
 OPC_HEADER_SIZE = 4
+BLACK_FRAME = bytes(FRAME_SIZE)
 
 def find_teensy_ports():
     """Find all available serial ports and identify likely Teensy ports"""
@@ -80,6 +90,31 @@ def test_port_connection(port: str, baudrate: int = 115200):
         print(f"✗ Port {port} - Error: {e}")
         return False
 
+def pixels_to_bytes(pixels: List[Tuple[int, int, int]]) -> bytes:
+    """Pack a list of (r, g, b) tuples into RGB bytes, padded or truncated to NUM_PIXELS"""
+    if len(pixels) != NUM_PIXELS:
+        print(f"Warning: Expected {NUM_PIXELS} pixels, got {len(pixels)}")
+        if len(pixels) < NUM_PIXELS:
+            pixels = pixels + [(0, 0, 0)] * (NUM_PIXELS - len(pixels))
+        else:
+            pixels = pixels[:NUM_PIXELS]
+
+    try:
+        return bytes(itertools.chain.from_iterable(pixels))
+    except ValueError:
+        # Out of range channel values, wrap them like a uint8 would
+        return bytes(c & 0xFF for c in itertools.chain.from_iterable(pixels))
+
+def frame_payload(pixels) -> memoryview:
+    """Flat byte view of a frame without copying it
+
+    NumPy arrays that are not contiguous uint8 are converted first.
+    """
+    if hasattr(pixels, '__array_interface__'):
+        if pixels.dtype != 'uint8' or not pixels.flags.c_contiguous:
+            pixels = pixels.astype('uint8', order='C')
+    return memoryview(pixels).cast('B')
+
 class OPCSender:
     def __init__(self, port: str, baudrate: int = 115200):
         """Initialize OPC sender with serial connection"""
@@ -87,6 +122,8 @@ class OPCSender:
         self.baudrate = baudrate
         self.serial = None
         self.frame_count = 0
+        # Header: [channel][command][length_hi][length_lo]
+        self.header = struct.pack('>BBH', OPC_CHANNEL, OPC_COMMAND_SET_PIXELS, FRAME_SIZE)
 
     def connect(self):
         """Connect to the serial port"""
@@ -105,33 +142,26 @@ class OPCSender:
             self.serial.close()
             print("Disconnected")
 
-    def send_frame(self, pixels: List[Tuple[int, int, int]]):
-        """Send OPC frame with RGB pixel data"""
+    def send_frame(self, pixels) -> bool:
+        """Send OPC frame with RGB pixel data
+
+        Accepts packed RGB bytes (any bytes-like object), a NumPy uint8 array
+        of shape (H, W, 3), or a list of (r, g, b) tuples for compatibility.
+        """
         if not self.serial or not self.serial.is_open:
             return False
 
-        # Ensure we have the right number of pixels
-        if len(pixels) != NUM_PIXELS:
-            print(f"Warning: Expected {NUM_PIXELS} pixels, got {len(pixels)}")
-            # Pad or truncate as needed
-            if len(pixels) < NUM_PIXELS:
-                pixels.extend([(0, 0, 0)] * (NUM_PIXELS - len(pixels)))
-            else:
-                pixels = pixels[:NUM_PIXELS]
-
-        # Build OPC frame
-        # Header: [channel][command][length_hi][length_lo]
-        pixel_data_length = NUM_PIXELS * 3
-        header = struct.pack('>BBH', OPC_CHANNEL, OPC_COMMAND_SET_PIXELS, pixel_data_length)
+        if isinstance(pixels, list):
+            pixels = pixels_to_bytes(pixels)
 
-        # Convert pixel data to bytes
-        pixel_bytes = bytearray()
-        for r, g, b in pixels:
-            pixel_bytes.extend([r & 0xFF, g & 0xFF, b & 0xFF])
+        payload = frame_payload(pixels)
+        if payload.nbytes != FRAME_SIZE:
+            print(f"Warning: Expected {FRAME_SIZE} bytes, got {payload.nbytes}")
+            return False
 
-        # Send complete frame
-        frame = header + pixel_bytes
-        self.serial.write(frame)
+        # Header and payload go out back to back, no concatenated copy
+        self.serial.write(self.header)
+        self.serial.write(payload)
         self.serial.flush()
 
         self.frame_count += 1
@@ -143,135 +173,204 @@ class OPCSender:
             return False
 
         print("Clearing display (sending all black)...")
-        black_pixels = [(0, 0, 0)] * NUM_PIXELS
-        return self.send_frame(black_pixels)
+        return self.send_frame(BLACK_FRAME)
+
+# HSV sector -> which of (v, q, p, t) each RGB channel takes, as in colorsys.hsv_to_rgb
+HSV_SECTOR_CHANNELS = np.array([
+    [0, 3, 2],  # red -> yellow:   v, t, p
+    [1, 0, 2],  # yellow -> green: q, v, p
+    [2, 0, 3],  # green -> cyan:   p, v, t
+    [2, 1, 0],  # cyan -> blue:    p, q, v
+    [3, 2, 0],  # blue -> magenta: t, p, v
+    [0, 2, 1],  # magenta -> red:  v, p, q
+])
+
+def hsv_to_rgb_array(h, s, v, out: np.ndarray = None) -> np.ndarray:
+    """Vectorized colorsys.hsv_to_rgb for arrays (or scalars) in 0-1, returns (..., 3) uint8
+
+    Channels are truncated to 0-255 like int(c * 255) in the per-pixel version.
+    """
+    h, s, v = np.broadcast_arrays(np.asarray(h, dtype=np.float64),
+                                  np.asarray(s, dtype=np.float64),
+                                  np.asarray(v, dtype=np.float64))
+    h6 = h * 6.0
+    sector = h6.astype(np.int64)
+    f = h6 - sector
+    components = np.stack([v, v * (1.0 - s * f), v * (1.0 - s), v * (1.0 - s * (1.0 - f))], axis=-1)
+    channels = HSV_SECTOR_CHANNELS[sector % 6]
+    rgb = np.take_along_axis(components, channels, axis=-1) * 255
+    if out is None:
+        return rgb.astype(np.uint8)
+    np.copyto(out, rgb, casting='unsafe')
+    return out
 
 class PatternGenerator:
-    """Generate various demo patterns for the LED matrix"""
+    """Generate various demo patterns for the LED matrix
+
+    Patterns are computed over precomputed coordinate grids and returned as
+    (height, width, 3) uint8 arrays. The returned array is reused by the
+    next pattern call, so send it (or copy it) before asking for another.
+    """
 
     def __init__(self, width: int, height: int):
         self.width = width
         self.height = height
         self.time = 0
 
+        # Coordinate grids shared by all patterns
+        self.y, self.x = np.mgrid[0:height, 0:width].astype(np.float64)
+        self.nx = self.x / width
+        self.ny = self.y / height
+        self.radius = np.sqrt(self.nx * self.nx + self.ny * self.ny)
+        self.frame = np.zeros((height, width, 3), dtype=np.uint8)
+
     def xy_to_index(self, x: int, y: int) -> int:
         """Convert x,y coordinates to linear pixel index"""
         return y * self.width + x
 
     def hsv_to_rgb(self, h: float, s: float, v: float) -> Tuple[int, int, int]:
         """Convert HSV to RGB (0-255 range)"""
-        import colorsys
         r, g, b = colorsys.hsv_to_rgb(h, s, v)
         return int(r * 255), int(g * 255), int(b * 255)
 
-    def solid_color(self, r: int = 255, g: int = 0, b: int = 0) -> List[Tuple[int, int, int]]:
+    def solid_color(self, r: int = 255, g: int = 0, b: int = 0) -> np.ndarray:
         """Generate solid color pattern"""
-        return [(r, g, b)] * (self.width * self.height)
+        self.frame[:] = (r, g, b)
+        return self.frame
 
-    def rainbow_horizontal(self) -> List[Tuple[int, int, int]]:
+    def rainbow_horizontal(self) -> np.ndarray:
         """Generate horizontal rainbow pattern"""
-        pixels = []
-        for y in range(self.height):
-            for x in range(self.width):
-                hue = (x / self.width + self.time * 0.01) % 1.0
-                r, g, b = self.hsv_to_rgb(hue, 1.0, 1.0)
-                pixels.append((r, g, b))
-        return pixels
-
-    def rainbow_vertical(self) -> List[Tuple[int, int, int]]:
+        hue = (self.nx + self.time * 0.01) % 1.0
+        return hsv_to_rgb_array(hue, 1.0, 1.0, self.frame)
+
+    def rainbow_vertical(self) -> np.ndarray:
         """Generate vertical rainbow pattern"""
-        pixels = []
-        for y in range(self.height):
-            for x in range(self.width):
-                hue = (y / self.height + self.time * 0.01) % 1.0
-                r, g, b = self.hsv_to_rgb(hue, 1.0, 1.0)
-                pixels.append((r, g, b))
-        return pixels
-
-    def rainbow_diagonal(self) -> List[Tuple[int, int, int]]:
+        hue = (self.ny + self.time * 0.01) % 1.0
+        return hsv_to_rgb_array(hue, 1.0, 1.0, self.frame)
+
+    def rainbow_diagonal(self) -> np.ndarray:
         """Generate diagonal rainbow pattern"""
-        pixels = []
-        for y in range(self.height):
-            for x in range(self.width):
-                hue = ((x + y) / (self.width + self.height) + self.time * 0.01) % 1.0
-                r, g, b = self.hsv_to_rgb(hue, 1.0, 1.0)
-                pixels.append((r, g, b))
-        return pixels
-
-    def moving_wave(self) -> List[Tuple[int, int, int]]:
+        hue = ((self.x + self.y) / (self.width + self.height) + self.time * 0.01) % 1.0
+        return hsv_to_rgb_array(hue, 1.0, 1.0, self.frame)
+
+    def moving_wave(self) -> np.ndarray:
         """Generate moving sine wave pattern"""
-        pixels = []
-        for y in range(self.height):
-            for x in range(self.width):
-                # Create wave based on x position and time
-                wave = math.sin((x / self.width * 4 * math.pi) + (self.time * 0.1))
-                intensity = int((wave + 1) * 127.5)  # Convert -1,1 to 0,255
-
-                # Create color based on y position
-                hue = y / self.height
-                r, g, b = self.hsv_to_rgb(hue, 1.0, intensity / 255.0)
-                pixels.append((r, g, b))
-        return pixels
-
-    def plasma(self) -> List[Tuple[int, int, int]]:
+        # Wave based on x position and time, color based on y position
+        wave = np.sin((self.nx * 4 * math.pi) + (self.time * 0.1))
+        intensity = ((wave + 1) * 127.5).astype(np.int64)  # Convert -1,1 to 0,255
+        return hsv_to_rgb_array(self.ny, 1.0, intensity / 255.0, self.frame)
+
+    def plasma(self) -> np.ndarray:
         """Generate plasma effect"""
-        pixels = []
-        for y in range(self.height):
-            for x in range(self.width):
-                # Normalized coordinates
-                nx = x / self.width
-                ny = y / self.height
-
-                # Plasma calculation
-                v = math.sin(nx * 10 + self.time * 0.1)
-                v += math.sin(ny * 10 + self.time * 0.15)
-                v += math.sin((nx + ny) * 10 + self.time * 0.12)
-                v += math.sin(math.sqrt(nx * nx + ny * ny) * 10 + self.time * 0.08)
-
-                # Convert to color
-                hue = (v + 4) / 8  # Normalize to 0-1
-                r, g, b = self.hsv_to_rgb(hue % 1.0, 1.0, 1.0)
-                pixels.append((r, g, b))
-        return pixels
-
-    def checkerboard(self, size: int = 8) -> List[Tuple[int, int, int]]:
-        """Generate animated checkerboard pattern"""
-        pixels = []
-        offset = int(self.time * 0.5) % (size * 2)
+        v = np.sin(self.nx * 10 + self.time * 0.1)
+        v += np.sin(self.ny * 10 + self.time * 0.15)
+        v += np.sin((self.nx + self.ny) * 10 + self.time * 0.12)
+        v += np.sin(self.radius * 10 + self.time * 0.08)
 
-        for y in range(self.height):
-            for x in range(self.width):
-                checker_x = (x + offset) // size
-                checker_y = y // size
+        # Convert to color
+        hue = (v + 4) / 8  # Normalize to 0-1
+        return hsv_to_rgb_array(hue % 1.0, 1.0, 1.0, self.frame)
 
-                if (checker_x + checker_y) % 2 == 0:
-                    hue = (self.time * 0.01) % 1.0
-                    r, g, b = self.hsv_to_rgb(hue, 1.0, 1.0)
-                else:
-                    r, g, b = 0, 0, 0
+    def checkerboard(self, size: int = 8) -> np.ndarray:
+        """Generate animated checkerboard pattern"""
+        offset = int(self.time * 0.5) % (size * 2)
+        checker_x = (self.x.astype(np.int64) + offset) // size
+        checker_y = self.y.astype(np.int64) // size
+        lit = (checker_x + checker_y) % 2 == 0
 
-                pixels.append((r, g, b))
-        return pixels
+        hue = (self.time * 0.01) % 1.0
+        self.frame[:] = 0
+        self.frame[lit] = self.hsv_to_rgb(hue, 1.0, 1.0)
+        return self.frame
 
     def update(self):
         """Update animation time"""
         self.time += 1
 
+PATTERNS = {
+    "solid": lambda gen: gen.solid_color(255, 0, 0),  # Red
+    "rainbow": PatternGenerator.rainbow_horizontal,
+    "rainbow_v": PatternGenerator.rainbow_vertical,
+    "rainbow_d": PatternGenerator.rainbow_diagonal,
+    "wave": PatternGenerator.moving_wave,
+    "plasma": PatternGenerator.plasma,
+    "checker": PatternGenerator.checkerboard,
+}
+# Frames per animation cycle: the rainbow hues advance 0.01 per frame, the
+# checkerboard also shifts every 2 frames over 16 columns, so lcm(100, 32)
+PATTERN_PERIODS = {
+    "solid": 1,
+    "rainbow": 100,
+    "rainbow_v": 100,
+    "rainbow_d": 100,
+    "checker": 800,
+}
+PERIOD_TOLERANCE = 1  # float rounding of the hue moves a few channels by one step between cycles
+REPORT_INTERVAL = 100  # frames between rate reports
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Send demo patterns to the Teensy over OPC")
+    parser.add_argument("port", nargs="?",
+                        help="serial port, e.g. COM3 or /dev/ttyACM0 (auto-detected if omitted, 'scan' lists ports)")
+    parser.add_argument("pattern", nargs="?", default="rainbow", choices=list(PATTERNS),
+                        help="pattern to show (default: %(default)s)")
+    parser.add_argument("--scan", "-s", action="store_true",
+                        help="list available serial ports and exit")
+    parser.add_argument("--fps", type=float, default=30,
+                        help="target frame rate, 0 sends as fast as the link takes them (default: %(default)s)")
+    parser.add_argument("--cache", action="store_true",
+                        help="render one cycle of a periodic pattern up front and replay it")
+    parser.add_argument("--cache-mb", type=float, default=256,
+                        help="memory for cached cycles in MB (default: %(default)s)")
+    parser.add_argument("--spill-mb", type=float, default=64,
+                        help="cycles larger than this go to a memory-mapped file (default: %(default)s)")
+    parser.add_argument("--cache-dir",
+                        help="directory for memory-mapped cycles (default: the system temp directory)")
+    parser.add_argument("--max-period", type=int, default=300,
+                        help="longest cycle to look for in patterns without a known period (default: %(default)s)")
+    return parser.parse_args()
+
+def cache_pattern(cache: PatternCache, pattern_name: str, generator: PatternGenerator, max_period: int):
+    """Render one cycle of a pattern into the cache, returns the frame ring or None"""
+    draw = PATTERNS[pattern_name]
+
+    def render(t):
+        generator.time = t
+        return draw(generator)
+
+    start = time.perf_counter()
+    period = PATTERN_PERIODS.get(pattern_name)
+    if period is None:
+        period = detect_period(render, max_period, PERIOD_TOLERANCE)
+    ring = cache.ring(pattern_name, render, period, generator.frame.shape) if period else None
+    generator.time = 0
+
+    if not period:
+        print(f"Cache: {pattern_name} doesn't repeat within {max_period} frames, rendering live")
+    elif ring is None:
+        print(f"Cache: a {period} frame cycle doesn't fit in {cache.max_bytes / 1e6:.0f} MB, rendering live")
+    else:
+        where = "memory-mapped file" if ring.nbytes > cache.spill_bytes else "memory"
+        print(f"Cache: {period} frame cycle, {ring.nbytes / 1e6:.1f} MB in {where}, "
+              f"rendered in {time.perf_counter() - start:.2f}s")
+    return ring
+
 def main():
     # Parse command line arguments
-    if len(sys.argv) > 1:
-        if sys.argv[1] in ["--scan", "-s", "scan"]:
-            # Just scan for ports and exit
-            print("Scanning for available serial ports...\n")
-            find_teensy_ports()
-
-            print("\nTesting port connections:")
-            ports = serial.tools.list_ports.comports()
-            for port in ports:
-                test_port_connection(port.device)
-            return
-        else:
-            port = sys.argv[1]
+    args = parse_args()
+    if args.scan or args.port == "scan":
+        # Just scan for ports and exit
+        print("Scanning for available serial ports...\n")
+        find_teensy_ports()
+
+        print("\nTesting port connections:")
+        ports = serial.tools.list_ports.comports()
+        for port in ports:
+            test_port_connection(port.device)
+        return
+    elif args.port:
+        port = args.port
     else:
         # Auto-detect port
         print("No port specified, scanning for Teensy...\n")
@@ -281,64 +380,78 @@ def main():
             print(f"\nAuto-detected port: {port}")
             if not test_port_connection(port):
                 print("Auto-detected port failed connection test. Please specify port manually.")
-                print("Use: python artnet-to-serial-sender.py --scan to see all ports")
+                print("Use: python test-serial-sender.py --scan to see all ports")
                 return
         else:
             print("No ports found. Make sure Teensy is connected.")
-            print("Use: python artnet-to-serial-sender.py --scan to see all ports")
+            print("Use: python test-serial-sender.py --scan to see all ports")
             return
 
-    pattern_name = sys.argv[2] if len(sys.argv) > 2 else "rainbow"
+    pattern_name = args.pattern
+    draw = PATTERNS[pattern_name]
 
     print(f"\nOPC Serial Sender")
     print(f"Matrix: {MATRIX_WIDTH}x{MATRIX_HEIGHT} ({NUM_PIXELS} pixels)")
     print(f"Port: {port}")
     print(f"Pattern: {pattern_name}")
-    print("Press Ctrl+C to stop\n")
+    print(f"Target rate: {f'{args.fps:g} fps' if args.fps else 'unlimited'}")
 
     # Initialize
     sender = OPCSender(port)
     pattern_gen = PatternGenerator(MATRIX_WIDTH, MATRIX_HEIGHT)
+    ring = None
+    if args.cache:
+        cache = PatternCache(int(args.cache_mb * 1e6), int(args.spill_mb * 1e6), args.cache_dir)
+        ring = cache_pattern(cache, pattern_name, pattern_gen, args.max_period)
+    print("Press Ctrl+C to stop\n")
 
     # Connect
     if not sender.connect():
         print("\nConnection failed. Try:")
-        print("  python artnet-to-serial-sender.py --scan")
-        print("  python artnet-to-serial-sender.py COMx  (replace x with correct number)")
+        print("  python test-serial-sender.py --scan")
+        print("  python test-serial-sender.py COMx  (replace x with correct number)")
         return
 
+    frame_interval = 1 / args.fps if args.fps else 0
+    next_frame_time = time.perf_counter()
+    report_start = next_frame_time
+    pattern_time = 0.0
+    send_time = 0.0
     try:
         while True:
-            # Generate pattern based on name
-            if pattern_name == "solid":
-                pixels = pattern_gen.solid_color(255, 0, 0)  # Red
-            elif pattern_name == "rainbow":
-                pixels = pattern_gen.rainbow_horizontal()
-            elif pattern_name == "rainbow_v":
-                pixels = pattern_gen.rainbow_vertical()
-            elif pattern_name == "rainbow_d":
-                pixels = pattern_gen.rainbow_diagonal()
-            elif pattern_name == "wave":
-                pixels = pattern_gen.moving_wave()
-            elif pattern_name == "plasma":
-                pixels = pattern_gen.plasma()
-            elif pattern_name == "checker":
-                pixels = pattern_gen.checkerboard()
+            # Generate pattern, or pick it out of the cached cycle
+            begin = time.perf_counter()
+            if ring is not None:
+                pixels = ring[pattern_gen.time % len(ring)]
             else:
-                print(f"Unknown pattern: {pattern_name}")
-                print("Available patterns: solid, rainbow, rainbow_v, rainbow_d, wave, plasma, checker")
-                break
+                pixels = draw(pattern_gen)
+            generated = time.perf_counter()
 
             # Send frame
-            if sender.send_frame(pixels):
-                if sender.frame_count % 100 == 0:
-                    print(f"Sent {sender.frame_count} frames")
+            sender.send_frame(pixels)
+            sent = time.perf_counter()
+            pattern_time += generated - begin
+            send_time += sent - generated
+
+            if sender.frame_count % REPORT_INTERVAL == 0:
+                fps = REPORT_INTERVAL / (sent - report_start)
+                print(f"Sent {sender.frame_count} frames, {fps:.1f} fps "
+                      f"(pattern {pattern_time / REPORT_INTERVAL * 1000:.2f} ms, "
+                      f"send {send_time / REPORT_INTERVAL * 1000:.2f} ms per frame)")
+                report_start = sent
+                pattern_time = send_time = 0.0
 
             # Update animation
             pattern_gen.update()
 
-            # Control frame rate (30 FPS)
-            time.sleep(1/30)
+            # Hold the target frame rate, without drifting when a frame runs late
+            if frame_interval:
+                next_frame_time += frame_interval
+                delay = next_frame_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_frame_time = time.perf_counter()
 
     except KeyboardInterrupt:
         print("\nStopping...")
@@ -0,0 +1,20 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bridge_util import load_script  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def bridge():
+    """The artnet-to-serial-sender script"""
+    return load_script("artnet-to-serial-sender")
+
+
+@pytest.fixture(scope="session")
+def virtual_teensy():
+    """The virtual-teensy script"""
+    return load_script("virtual-teensy")
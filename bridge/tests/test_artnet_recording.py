@@ -0,0 +1,62 @@
+import pytest
+
+from artnet_recording import ArtnetRecorder, ArtnetRecording, RecordingError
+
+
+def test_recording_round_trip(tmp_path):
+    path = tmp_path / "show.artrec"
+    recorder = ArtnetRecorder(str(path))
+    packets = [bytes([n]) * (n + 1) for n in range(10)]
+    for packet in packets:
+        recorder.write(packet)
+    recorder.close()
+
+    recording = ArtnetRecording(str(path))
+    records = [(timestamp, bytes(packet)) for timestamp, packet in recording]
+    assert [packet for _, packet in records] == packets
+    assert [timestamp for timestamp, _ in records] == sorted(timestamp for timestamp, _ in records)
+    del records
+    recording.close()
+
+
+@pytest.mark.parametrize("contents", [b"", b"ARTREC", b"not a recording at all, just some text"])
+def test_bad_files_raise_recording_error(tmp_path, contents):
+    path = tmp_path / "bad.artrec"
+    path.write_bytes(contents)
+    with pytest.raises(RecordingError):
+        ArtnetRecording(str(path))
+
+
+class FailingFile:
+    """Takes the header, then fails like a full disk"""
+
+    def __init__(self, file):
+        self.file = file
+
+    def write(self, data):
+        raise OSError(28, "No space left on device")
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.file.close()
+
+
+def test_write_errors_stop_the_recording(tmp_path):
+    path = tmp_path / "show.artrec"
+    recorder = ArtnetRecorder(str(path))
+    recorder.file = FailingFile(recorder.file)
+    packet = bytes(530)
+    while recorder.error is None:
+        recorder.write(packet)
+        assert recorder.packets * len(packet) < 16 * 1024 * 1024, "the writer never failed"
+    recorder.write(packet)
+    recorder.close()
+
+    assert isinstance(recorder.error, OSError)
+    assert recorder.dropped >= 1
+    assert recorder.bytes_written == path.stat().st_size
+    recording = ArtnetRecording(str(path))
+    assert list(recording) == []
+    recording.close()
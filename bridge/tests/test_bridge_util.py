@@ -0,0 +1,30 @@
+import threading
+import time
+
+from bridge_util import wait_until
+
+
+def test_wait_until_is_precise_and_lets_other_threads_run():
+    counted = []
+    stop = threading.Event()
+
+    def count():
+        while not stop.is_set():
+            counted.append(None)
+            time.sleep(0)
+
+    thread = threading.Thread(target=count)
+    thread.start()
+    deadline = time.perf_counter() + 0.05
+    wait_until(deadline)
+    late = time.perf_counter() - deadline
+    stop.set()
+    thread.join()
+    assert 0 <= late < 0.02
+    assert counted
+
+
+def test_wait_until_past_deadline_returns_at_once():
+    start = time.monotonic()
+    wait_until(start - 1.0, clock=time.monotonic)
+    assert time.monotonic() - start < 0.01
@@ -0,0 +1,219 @@
+import struct
+
+import numpy as np
+import pytest
+
+from opc_protocol import (OPC_COMMAND_SET_OPTIONS, OPC_COMMAND_SET_PIXELS, OPC_COMMAND_SET_PIXELS_DELTA,
+                          OPC_HEADER_SIZE, OPC_MAX_LENGTH, RLE_MAX_RUN, RLE_REPEAT_FLAG, apply_delta,
+                          decode_message, decode_rle, encode_delta, encode_rle)
+
+WIDTH = 64
+HEIGHT = 32
+FRAME_SIZE = WIDTH * HEIGHT * 3
+
+
+def random_frame(rng) -> bytes:
+    return rng.integers(0, 256, FRAME_SIZE, dtype=np.uint8).tobytes()
+
+
+def changed_frame(rng, previous: bytes, pixels: int) -> bytes:
+    """previous with a few random pixels set to new colors"""
+    frame = np.frombuffer(previous, dtype=np.uint8).reshape(-1, 3).copy()
+    index = rng.choice(len(frame), pixels, replace=False)
+    frame[index] = rng.integers(0, 256, (pixels, 3), dtype=np.uint8)
+    return frame.tobytes()
+
+
+@pytest.mark.parametrize("pixels", [1, 5, 40, 300])
+def test_delta_round_trip(pixels):
+    rng = np.random.default_rng(pixels)
+    previous = random_frame(rng)
+    current = changed_frame(rng, previous, pixels)
+    out = bytearray(FRAME_SIZE)
+
+    length = encode_delta(current, previous, out, WIDTH)
+    assert 0 < length < FRAME_SIZE
+    frame = bytearray(previous)
+    assert apply_delta(frame, out[:length])
+    assert frame == current
+
+
+def test_delta_of_unchanged_frame_is_empty():
+    rng = np.random.default_rng(0)
+    previous = random_frame(rng)
+    out = bytearray(FRAME_SIZE)
+
+    assert encode_delta(previous, previous, out, WIDTH) == 0
+    frame = bytearray(previous)
+    assert apply_delta(frame, b"")
+    assert frame == previous
+
+
+def test_delta_of_full_frame_change_is_refused():
+    rng = np.random.default_rng(1)
+    previous = random_frame(rng)
+    current = bytes(255 - b for b in previous)
+
+    assert encode_delta(current, previous, bytearray(FRAME_SIZE), WIDTH) == -1
+
+
+def test_apply_delta_rejects_malformed_spans():
+    frame = bytearray(FRAME_SIZE)
+    num_pixels = FRAME_SIZE // 3
+    # Span past the end of the frame
+    assert not apply_delta(frame, struct.pack('>HH', num_pixels - 1, 2) + bytes(6))
+    # Span with fewer pixels than it announces
+    assert not apply_delta(frame, struct.pack('>HH', 0, 4) + bytes(9))
+    # Trailing bytes too short for a span header
+    assert not apply_delta(frame, struct.pack('>HH', 0, 1) + bytes(3) + b"\x00")
+
+
+def test_decode_message_rejects_truncated_input():
+    rng = np.random.default_rng(2)
+    previous = random_frame(rng)
+    current = changed_frame(rng, previous, 20)
+    out = bytearray(FRAME_SIZE)
+    length = encode_delta(current, previous, out, WIDTH)
+
+    frame = bytearray(previous)
+    assert not decode_message(frame, OPC_COMMAND_SET_PIXELS, current[:-3])
+    assert not decode_message(frame, OPC_COMMAND_SET_PIXELS_DELTA, out[:length - 1])
+    assert not decode_message(frame, OPC_COMMAND_SET_PIXELS_DELTA, out[:length], has_keyframe=False)
+    assert not decode_message(frame, OPC_COMMAND_SET_OPTIONS, b"\x01")
+    assert decode_message(frame, OPC_COMMAND_SET_PIXELS_DELTA, out[:length])
+    assert frame == current
+
+
+def decode_wire(frame: bytearray, sender, payload: bytes) -> bool:
+    """Choose the wire message for payload like the sender does and decode it into frame"""
+    message, keyframe = sender.prepare_message(memoryview(payload))
+    if message is None:
+        command, data = OPC_COMMAND_SET_PIXELS, payload
+    else:
+        command, data = message[1], message[OPC_HEADER_SIZE:]
+        assert struct.unpack_from('>H', message, 2)[0] == len(data)
+    sender.frame_written(memoryview(payload), keyframe, OPC_HEADER_SIZE + len(data))
+    return decode_message(frame, command, data)
+
+
+def test_delta_sender_falls_back_to_keyframes(bridge):
+    rng = np.random.default_rng(3)
+    sender = bridge.OPCSender("unused", delta=True, keyframe_interval=3, frame_size=FRAME_SIZE)
+    first = random_frame(rng)
+    frame = bytearray(FRAME_SIZE)
+
+    # The first frame has nothing to be a delta against
+    assert sender.prepare_message(memoryview(first))[0] is None
+    assert decode_wire(frame, sender, first)
+    assert sender.keyframes_sent == 1
+
+    # Small changes go out as deltas until the keyframe interval is up
+    current = first
+    for _ in range(3):
+        current = changed_frame(rng, current, 10)
+        assert decode_wire(frame, sender, current)
+        assert frame == current
+    assert sender.keyframes_sent == 1
+    current = changed_frame(rng, current, 10)
+    assert decode_wire(frame, sender, current)
+    assert sender.keyframes_sent == 2
+
+    # A frame that changes everywhere goes out whole
+    current = random_frame(rng)
+    assert decode_wire(frame, sender, current)
+    assert frame == current
+    assert sender.keyframes_sent == 3
+
+    # After a lost frame the next one is a keyframe, however small the change
+    sender.need_keyframe = True
+    current = changed_frame(rng, current, 1)
+    assert sender.prepare_message(memoryview(current))[0] is None
+
+
+def rle_round_trip(frame: bytes) -> int:
+    out = bytearray(len(frame) * 2)
+    length = encode_rle(frame, out, limit=len(out))
+    decoded = bytearray(len(frame))
+    assert decode_rle(decoded, out[:length])
+    assert decoded == frame
+    return length
+
+
+def test_rle_round_trip_random_frame():
+    rng = np.random.default_rng(4)
+    frame = random_frame(rng)
+    rle_round_trip(frame)
+    # Random pixels don't compress, so the default limit refuses them
+    assert encode_rle(frame, bytearray(FRAME_SIZE * 2)) == -1
+
+
+def test_rle_round_trip_mixed_runs():
+    rng = np.random.default_rng(5)
+    pixels = np.repeat(rng.integers(0, 256, (300, 3), dtype=np.uint8), rng.integers(1, 20, 300), axis=0)
+    frame = pixels[:FRAME_SIZE // 3].tobytes()
+    frame += bytes(FRAME_SIZE - len(frame))
+    assert rle_round_trip(frame) < FRAME_SIZE
+
+
+@pytest.mark.parametrize("run", [RLE_MAX_RUN, RLE_MAX_RUN + 1, 256, 300, 70000])
+def test_rle_long_runs(run):
+    rng = np.random.default_rng(run)
+    frame = bytes((10, 20, 30)) * run + random_frame(rng)[:3 * 7]
+    length = rle_round_trip(frame)
+    chunks = -(-run // RLE_MAX_RUN)
+    assert length == 4 * chunks + 1 + 7 * 3
+
+
+def test_decode_rle_rejects_malformed_input():
+    frame = bytearray(FRAME_SIZE)
+    num_pixels = FRAME_SIZE // 3
+    # Not enough pixels to fill the frame
+    assert not decode_rle(frame, bytes((RLE_REPEAT_FLAG | 0x7F, 1, 2, 3)))
+    # Truncated repeat and literal chunks
+    assert not decode_rle(frame, bytes((RLE_REPEAT_FLAG | 0x7F, 1, 2)))
+    assert not decode_rle(frame, bytes((3,)) + bytes(9))
+    # More pixels than the frame holds
+    chunks = -(-num_pixels // RLE_MAX_RUN) + 1
+    assert not decode_rle(frame, bytes((RLE_REPEAT_FLAG | 0x7F, 1, 2, 3)) * chunks)
+
+
+def test_compressing_sender_round_trip(bridge):
+    rng = np.random.default_rng(6)
+    sender = bridge.OPCSender("unused", delta=True, compress=True, frame_size=FRAME_SIZE)
+    frame = bytearray(FRAME_SIZE)
+
+    flat = bytes(FRAME_SIZE)
+    assert decode_wire(frame, sender, flat)
+    assert sender.compressed_frames == 1
+    noisy = random_frame(rng)
+    assert decode_wire(frame, sender, noisy)
+    assert frame == noisy
+    assert decode_wire(frame, sender, changed_frame(rng, noisy, 3))
+    assert sender.compressed_frames == 1
+
+
+def test_outputs_too_large_for_an_opc_message_are_refused(bridge):
+    panel_size = bridge.MATRIX_WIDTH * bridge.PANEL_HEIGHT * 3
+    assert bridge.MAX_PANELS_PER_OUTPUT * panel_size <= OPC_MAX_LENGTH < (bridge.MAX_PANELS_PER_OUTPUT + 1) * panel_size
+
+    panels = bridge.MAX_PANELS_PER_OUTPUT + 1
+    assert bridge.split_panels(panels, ["COM3", "COM4"]) == [("COM3", 0, panels - panels // 2),
+                                                             ("COM4", panels - panels // 2, panels // 2)]
+    with pytest.raises(ValueError):
+        bridge.split_panels(panels, ["COM3"])
+    with pytest.raises(ValueError):
+        bridge.split_panels(panels, ["COM3:1", f"COM4:{panels - 1}", "COM5"])
+
+
+def test_delta_long_span_round_trip():
+    rng = np.random.default_rng(7)
+    previous = random_frame(rng)
+    current = bytearray(previous)
+    current[300 * 3:(300 + 700) * 3] = bytes(700 * 3)
+    out = bytearray(FRAME_SIZE)
+
+    length = encode_delta(current, previous, out, WIDTH)
+    assert 0 < length < FRAME_SIZE
+    frame = bytearray(previous)
+    assert apply_delta(frame, out[:length])
+    assert frame == current
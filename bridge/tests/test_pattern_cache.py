@@ -0,0 +1,32 @@
+import numpy as np
+
+from pattern_cache import PatternCache, detect_period
+
+SHAPE = (8, 8, 3)
+
+
+def render(t):
+    return np.full(SHAPE, t % 5 * 10, dtype=np.uint8)
+
+
+def test_detect_period():
+    assert detect_period(render, 10) == 5
+    assert detect_period(render, 4) is None
+
+
+def test_spilled_rings_are_released_on_eviction(tmp_path):
+    ring_bytes = 5 * int(np.prod(SHAPE))
+    cache = PatternCache(max_bytes=ring_bytes, spill_bytes=0, spill_dir=str(tmp_path))
+    ring = cache.ring("a", render, 5, SHAPE)
+    assert [int(frame[0, 0, 0]) for frame in ring] == [0, 10, 20, 30, 40]
+    assert cache.ring("a", render, 5, SHAPE) is ring
+    assert cache.hits == 1
+
+    cache.ring("b", render, 5, SHAPE)
+    assert cache.evictions == 1
+    assert list(cache.rings) == ["b"]
+    assert int(ring[3, 0, 0, 0]) == 30  # still readable while referenced
+    del ring
+    cache.clear()
+    assert cache.total_bytes == 0
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,29 @@
+import pytest
+
+from sdcard_format import SdcardFormatError, SdcardVideo, SdcardWriter
+
+NUM_LEDS = 16
+
+
+def test_capture_round_trip(tmp_path):
+    path = tmp_path / "output.bin"
+    writer = SdcardWriter(str(path), NUM_LEDS)
+    frames = [bytes([n]) * (NUM_LEDS * 3) for n in range(5)]
+    for n, frame in enumerate(frames):
+        assert writer.write(frame, 10.0 + n * 0.02)
+    writer.close()
+
+    video = SdcardVideo(str(path))
+    assert len(video) == len(frames)
+    assert not video.truncated
+    assert [bytes(video.frame(n)) for n in range(len(video))] == frames
+    assert video.duration == pytest.approx(0.08)
+    video.close()
+
+
+@pytest.mark.parametrize("contents", [b"", b"\x01\x02", b"\x00" * 64])
+def test_bad_files_raise_format_error(tmp_path, contents):
+    path = tmp_path / "output.bin"
+    path.write_bytes(contents)
+    with pytest.raises(SdcardFormatError):
+        SdcardVideo(str(path))
@@ -0,0 +1,171 @@
+import threading
+import time
+
+import pytest
+
+from serial_telemetry import DECREASE, HEADROOM, INCREASE, RECOVERY_DELAY, AckWindow, DeviceTelemetry, RateController
+
+
+def test_acks_retire_frames_in_order():
+    acks = AckWindow(2)
+    acks.sent(0.0)
+    acks.sent(0.01)
+    assert not acks.has_slot(0.02)
+    acks.acknowledged(1, 800, 0.03)
+    assert acks.frames_in_flight == 1
+    # The ack for frame 2 went missing, frame 3's retires it too
+    acks.sent(0.04)
+    acks.acknowledged(3, 800, 0.05)
+    assert acks.frames_in_flight == 0
+    assert acks.acked == 3
+    assert acks.device_us == 800
+
+
+def test_late_ack_after_a_timeout_is_ignored():
+    acks = AckWindow(2, timeout=0.5)
+    acks.sent(0.0)
+    acks.acknowledged(1, 100, 0.01)
+    # Frame 2 times out, frame 3 goes out, then frame 2's ack turns up after all
+    acks.sent(0.1)
+    assert acks.has_slot(0.7) and acks.timeouts == 1
+    acks.sent(0.7)
+    acks.acknowledged(2, 600000, 0.75)
+    assert acks.frames_in_flight == 1
+    assert acks.acked == 1
+    acks.acknowledged(3, 100, 0.8)
+    assert acks.frames_in_flight == 0
+    assert acks.acked == 2
+    assert acks.round_trips.take_interval().max == pytest.approx(0.1)
+
+
+def test_acks_resync_after_a_frame_the_device_never_counted():
+    acks = AckWindow(1, timeout=0.5)
+    acks.sent(0.0)
+    acks.acknowledged(1, 100, 0.01)
+    # Lost on the link: it times out, but the device's count doesn't move
+    acks.sent(0.02)
+    assert acks.has_slot(1.0)
+    # The next frame's ack looks like a late one for the lost frame, until it times out too
+    acks.sent(1.0)
+    acks.acknowledged(2, 100, 1.01)
+    assert not acks.has_slot(1.2)
+    assert acks.has_slot(1.6)
+    assert acks.timeouts == 2
+
+    for frame in range(3, 7):
+        now = frame * 0.1 + 2.0
+        acks.sent(now)
+        acks.acknowledged(frame, 100, now + 0.01)
+        assert acks.frames_in_flight == 0
+    assert acks.timeouts == 2
+
+
+def test_ack_behind_the_window_resyncs_at_once():
+    acks = AckWindow(3)
+    acks.sent(0.0)
+    acks.acknowledged(5, 100, 0.01)
+    for now in (0.1, 0.2, 0.3):
+        acks.sent(now)
+    # The device counted fewer frames than we numbered, without any timing out
+    acks.acknowledged(5, 100, 0.31)
+    assert acks.frames_in_flight == 2
+    acks.acknowledged(7, 100, 0.4)
+    assert acks.frames_in_flight == 0
+
+
+def test_ack_past_the_window_counts_what_it_retires():
+    acks = AckWindow(3)
+    acks.sent(0.0)
+    acks.acknowledged(1, 100, 0.01)
+    acks.sent(0.1)
+    acks.sent(0.2)
+    acks.acknowledged(9, 700, 0.3)
+    assert acks.frames_in_flight == 0
+    assert acks.acked == 3
+    assert acks.device_us == 700
+    acks.sent(0.4)
+    acks.acknowledged(10, 100, 0.41)
+    assert acks.frames_in_flight == 0
+
+
+def test_cancel_takes_back_a_failed_write():
+    acks = AckWindow(1)
+    freed = []
+    acks.on_slot_free = lambda: freed.append(True)
+    acks.sent(0.0)
+    acks.acknowledged(1, 100, 0.01)
+    acks.sent(0.02)
+    acks.cancel()
+    assert acks.has_slot(0.03) and freed
+    # The next frame written is the device's frame 2
+    acks.sent(0.04)
+    acks.acknowledged(2, 100, 0.05)
+    assert acks.frames_in_flight == 0
+    assert acks.acked == 2
+
+
+@pytest.mark.parametrize("release", ["ack", "ack past the window", "cancel", "lost"])
+def test_waiting_writer_is_woken(release):
+    acks = AckWindow(1, timeout=10.0)
+    now = time.monotonic()
+    acks.sent(now)
+    acks.acknowledged(1, 100, now)
+    acks.sent(now)
+    freed = threading.Event()
+    acks.on_slot_free = freed.set
+    waiter = threading.Thread(target=acks.wait_for_slot)
+    waiter.start()
+
+    if release == "ack":
+        acks.acknowledged(2, 100, now)
+    elif release == "ack past the window":
+        acks.acknowledged(5, 100, now)
+    elif release == "cancel":
+        acks.cancel()
+    else:
+        acks.lost(now)
+    waiter.join(2.0)
+    assert not waiter.is_alive()
+    assert freed.is_set()
+
+
+def test_telemetry_lines_reach_the_ack_window():
+    acks = AckWindow(2)
+    telemetry = DeviceTelemetry(acks)
+    acks.sent(0.0)
+    acks.sent(0.0)
+    assert telemetry.handle_line(b"Invalid OPC frame: cmd=16, length=0", 0.01)
+    assert not telemetry.handle_line(b"ACK 1 900", 0.02)
+    assert acks.lost_frames == 1 and acks.acked == 1
+    assert acks.frames_in_flight == 0
+
+
+def test_rate_controller_backs_off_and_recovers():
+    telemetry = DeviceTelemetry()
+    rate = RateController(telemetry, max_fps=100.0)
+    now = 0.0
+    for _ in range(50):
+        assert rate.delay(now) == pytest.approx(0.0, abs=1e-9)
+        rate.sent(now)
+        now += 0.02
+    assert rate.send_fps == pytest.approx(50.0)
+
+    telemetry.handle_line(b"OPC buffer overflow, resetting", now)
+    rate.delay(now)
+    assert rate.backoffs == 1
+    assert rate.limit == pytest.approx(50.0 * DECREASE)
+
+    # Errors keep the cap down, quiet time lets it climb back
+    rate.delay(now + RECOVERY_DELAY / 2)
+    assert rate.limit == pytest.approx(50.0 * DECREASE)
+    rate.delay(now + RECOVERY_DELAY + 1.0)
+    assert rate.limit > 50.0 * DECREASE
+    rate.delay(now + RECOVERY_DELAY + 1.0 + 100.0 / INCREASE)
+    assert rate.limit == 100.0
+
+
+def test_rate_controller_respects_device_processing_time():
+    telemetry = DeviceTelemetry()
+    rate = RateController(telemetry)
+    telemetry.handle_line(b"PERF:   elapsed microseconds: 20000 ", 0.0)
+    assert rate.ceiling() == pytest.approx(HEADROOM * 50.0)
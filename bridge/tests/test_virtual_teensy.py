@@ -0,0 +1,114 @@
+import os
+import select
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from opc_protocol import OPC_COMMAND_SET_PIXELS, OPC_COMMAND_SET_PIXELS_DELTA, pack_header
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs Linux pseudo-terminals")
+
+PANELS = 1
+TIMEOUT = 5.0
+
+
+def wait_for(condition, timeout: float = TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def device(virtual_teensy):
+    """A virtual Teensy on a pty, fed from a background thread"""
+    device = virtual_teensy.VirtualTeensy(process_us=0, blit_us=0,
+                                          memory_height=PANELS * virtual_teensy.PANEL_HEIGHT)
+    device.open()
+    stop = threading.Event()
+
+    def pump():
+        while not stop.is_set():
+            ready, _, _ = select.select([device.master], [], [], 0.02)
+            if ready:
+                device.receive(os.read(device.master, virtual_teensy.READ_SIZE))
+
+    thread = threading.Thread(target=pump, daemon=True)
+    thread.start()
+    yield device
+    stop.set()
+    thread.join()
+    device.close()
+
+
+@pytest.fixture
+def sender(bridge, device):
+    """A delta and RLE sender with telemetry and a one frame ack window, connected to device"""
+    sender = bridge.OPCSender(device.path, delta=True, compress=True, telemetry=True, ack_window=1,
+                              frame_size=device.frame_size)
+    assert sender.connect()
+    wait_for(lambda: device.ack_frames)
+    yield sender
+    sender.disconnect()
+
+
+def test_frames_round_trip(device, sender):
+    rng = np.random.default_rng(0)
+    size = device.frame_size
+    noisy = rng.integers(0, 256, size, dtype=np.uint8)
+    changed = noisy.copy()
+    changed[300:330] = 7
+    frames = [bytes(size), noisy.tobytes(), changed.tobytes(), bytes(size)]
+
+    for count, frame in enumerate(frames, 1):
+        assert sender.send_frame(frame)
+        wait_for(lambda: device.frame_count == count)
+        assert device.current_frame == frame
+
+    # One frame of each kind went out: RLE, raw, delta, and RLE again
+    assert sender.compressed_frames == 2
+    assert sender.keyframes_sent == 3
+    assert sender.bytes_sent < sender.raw_bytes
+    assert device.invalid_frames == device.overflows == 0
+
+    wait_for(lambda: sender.acks.acked == len(frames))
+    assert sender.acks.frames_in_flight == 0
+    assert sender.acks.timeouts == sender.acks.lost_frames == 0
+
+
+def test_invalid_frames_and_overflows_are_reported(bridge, device, sender):
+    size = device.frame_size
+    rate = bridge.RateController(sender.telemetry)
+    rate.sent(time.monotonic())
+    assert sender.send_frame(bytes(size))
+    wait_for(lambda: sender.acks.frames_in_flight == 0)
+
+    # A raw frame of the wrong size is invalid, one longer than opcBuffer overflows it
+    sender.serial.write(pack_header(OPC_COMMAND_SET_PIXELS, size - 3) + bytes(size - 3))
+    sender.serial.write(pack_header(OPC_COMMAND_SET_PIXELS, size + 1) + bytes(size + 1))
+    sender.serial.flush()
+    wait_for(lambda: device.invalid_frames == 1 and device.overflows == 1)
+    wait_for(lambda: sender.telemetry.errors == 2)
+    assert sender.telemetry.invalid_frames == 1
+    assert sender.telemetry.overflows == 1
+
+    # The sender keyframes after lost frames, and the rate controller backs off
+    assert sender.need_keyframe
+    rate.delay(time.monotonic())
+    assert rate.backoffs == 1
+
+    # The device still takes frames, and a delta without a keyframe is rejected
+    device.has_keyframe = False
+    sender.serial.write(pack_header(OPC_COMMAND_SET_PIXELS_DELTA, 0))
+    sender.serial.flush()
+    wait_for(lambda: device.invalid_frames == 2)
+    # The sender takes the invalid frame out of its window, let that happen before sending
+    wait_for(lambda: sender.telemetry.invalid_frames == 2)
+    frame = bytes(range(256)) * (size // 256)
+    assert sender.send_frame(frame)
+    wait_for(lambda: device.current_frame == frame)
+    assert device.frame_count == 2
+    wait_for(lambda: sender.acks.acked == 2)
@@ -0,0 +1,160 @@
+"""
+Batched UDP receive for the Art-Net receiver
+
+Resolume sends all universes of a frame in one burst. Instead of one
+recvfrom() per universe, UDPBatchReceiver waits once and then pulls every
+queued datagram into preallocated buffers: with recvmmsg() on Linux (one
+syscall for the whole burst), elsewhere by draining the non-blocking socket
+with recv_into() until it is empty.
+"""
+
+import ctypes
+import errno
+import os
+import select
+import socket
+import sys
+
+MAX_PACKET_SIZE = 1024
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_RCVBUF = 4 * 1024 * 1024
+
+MSG_DONTWAIT = 0x40  # Linux value, only used with recvmmsg
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [("msg_name", ctypes.c_void_p), ("msg_namelen", ctypes.c_uint32),
+                ("msg_iov", ctypes.POINTER(_IOVec)), ("msg_iovlen", ctypes.c_size_t),
+                ("msg_control", ctypes.c_void_p), ("msg_controllen", ctypes.c_size_t),
+                ("msg_flags", ctypes.c_int)]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+def _load_recvmmsg():
+    """recvmmsg from libc, or None where it isn't available"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        recvmmsg = libc.recvmmsg
+    except (OSError, AttributeError):
+        return None
+    recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    recvmmsg.restype = ctypes.c_int
+    return recvmmsg
+
+
+_recvmmsg = _load_recvmmsg()
+
+
+def set_receive_buffer(sock: socket.socket, size: int) -> int:
+    """Ask for a SO_RCVBUF of size bytes, returns what the OS actually granted
+
+    Linux caps the request at net.core.rmem_max.
+    """
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+    return sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+
+
+def kernel_drop_count(sock: socket.socket):
+    """Datagrams the kernel dropped for this socket (Linux only, None elsewhere)"""
+    try:
+        inode = str(os.fstat(sock.fileno()).st_ino)
+        with open("/proc/net/udp") as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if fields[9] == inode:
+                    return int(fields[-1])
+    except (OSError, ValueError, IndexError, StopIteration):
+        pass
+    return None
+
+
+class UDPBatchReceiver:
+    """Receives bursts of datagrams into preallocated buffers
+
+    receive() returns how many packets arrived; packet(i) is a memoryview of
+    the i-th one, valid until the next receive().
+    """
+
+    def __init__(self, sock: socket.socket, batch_size: int = DEFAULT_BATCH_SIZE,
+                 packet_size: int = MAX_PACKET_SIZE, use_recvmmsg: bool = True):
+        self.socket = sock
+        self.socket.setblocking(False)
+        self.batch_size = max(1, batch_size)
+        self.packet_size = packet_size
+        self.buffer = bytearray(self.batch_size * packet_size)
+        self.view = memoryview(self.buffer)
+        self.lengths = [0] * self.batch_size
+
+        # Counters
+        self.packets_received = 0
+        self.wakeups = 0
+        self.max_batch = 0
+
+        self.use_recvmmsg = use_recvmmsg and _recvmmsg is not None and self.batch_size > 1
+        if self.use_recvmmsg:
+            base = ctypes.addressof((ctypes.c_char * len(self.buffer)).from_buffer(self.buffer))
+            self._iovecs = (_IOVec * self.batch_size)()
+            self._msgs = (_MMsgHdr * self.batch_size)()
+            for i in range(self.batch_size):
+                self._iovecs[i].iov_base = base + i * packet_size
+                self._iovecs[i].iov_len = packet_size
+                self._msgs[i].msg_hdr.msg_iov = ctypes.pointer(self._iovecs[i])
+                self._msgs[i].msg_hdr.msg_iovlen = 1
+
+    @property
+    def mode(self) -> str:
+        return "recvmmsg" if self.use_recvmmsg else "drain"
+
+    def packet(self, index: int) -> memoryview:
+        """The index-th packet of the last batch"""
+        start = index * self.packet_size
+        return self.view[start:start + self.lengths[index]]
+
+    def receive(self, timeout: float) -> int:
+        """Wait up to timeout for packets, then take everything queued (up to batch_size)"""
+        readable, _, _ = select.select([self.socket], [], [], timeout)
+        if not readable:
+            return 0
+
+        if self.use_recvmmsg:
+            count = self._receive_recvmmsg()
+        else:
+            count = self._receive_drain()
+
+        if count:
+            self.wakeups += 1
+            self.packets_received += count
+            self.max_batch = max(self.max_batch, count)
+        return count
+
+    def _receive_recvmmsg(self) -> int:
+        count = _recvmmsg(self.socket.fileno(), self._msgs, self.batch_size, MSG_DONTWAIT, None)
+        if count < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return 0
+            raise OSError(err, os.strerror(err))
+        for i in range(count):
+            self.lengths[i] = self._msgs[i].msg_len
+        return count
+
+    def _receive_drain(self) -> int:
+        count = 0
+        while count < self.batch_size:
+            start = count * self.packet_size
+            try:
+                self.lengths[count] = self.socket.recv_into(self.view[start:start + self.packet_size])
+            except (BlockingIOError, InterruptedError):
+                break
+            count += 1
+        return count
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Video to SD Card
+Encodes a video into the output.bin played by videosdcard-smartmatrix-5panel.ino
+
+Usage:
+    python video-to-sdcard.py VIDEO [options]
+
+Examples:
+    python video-to-sdcard.py show.mp4
+    python video-to-sdcard.py show.mp4 -o /media/sdcard/output.bin --fps 30
+    python video-to-sdcard.py 170x80-smartled-matrix-content.mp4 --universes
+
+Frames are decoded by ffmpeg (ffmpeg and ffprobe must be on the PATH). A
+normal video is stretched to the 64x192 drawing area with an area-average
+resize. With --universes every row of the video is one Art-Net universe of
+170 pixels, like a Lightjams recording, and is mapped onto the matrix with
+the same Resolume preset as the bridge.
+
+The video is cut into segments that a pool of worker processes decode and
+convert in parallel, each with its own ffmpeg. Finished segments are written
+to the output in order, and only a few segments per worker are in flight at
+once, so memory stays bounded however long the video is.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from artnet_layout import DEFAULT_PRESET, LayoutError, PixelLayout, load_layout
+from sdcard_format import (HEADER_SIZE, SdcardFormatError, frame_usec, pack_end_marker,
+                           pack_frame_header)
+
+# Drawing area of the sketch (drawingMemoryHeight), panels 4-5 mirror 1-2 on the device
+MATRIX_WIDTH = 64
+MATRIX_HEIGHT = 64*3
+NUM_PIXELS = MATRIX_WIDTH * MATRIX_HEIGHT
+FRAME_SIZE = NUM_PIXELS * 3
+RECORD_SIZE = HEADER_SIZE + FRAME_SIZE
+LEDS_PER_UNIVERSE = 170
+
+DEFAULT_SEGMENT_FRAMES = 240
+SEGMENTS_PER_WORKER = 2  # segments queued per worker, bounds memory
+WRITE_BUFFER_SIZE = 8 * 1024 * 1024
+
+
+class AxisResampler:
+    """Area-average resize of one image axis, for both shrinking and stretching
+
+    Each output sample is the mean of the input over its footprint, with
+    partly covered input samples weighted by coverage. Computed from a
+    running sum, so the cost is one pass over the input whatever the ratio.
+    """
+
+    def __init__(self, size_in: int, size_out: int):
+        edges = np.arange(size_out + 1) * (size_in / size_out)
+        self.index = np.minimum(edges.astype(np.intp), size_in - 1)
+        self.frac = edges - self.index
+        self.scale = size_out / size_in
+
+    def __call__(self, image: np.ndarray, axis: int) -> np.ndarray:
+        dtype = np.uint32 if image.dtype == np.uint8 else np.float64
+        running = np.cumsum(image, axis=axis, dtype=dtype)
+        shape = [1] * image.ndim
+        shape[axis] = -1
+        frac = self.frac.reshape(shape)
+        # Integral of the input up to each edge: everything before index, plus frac of index
+        below = (np.take(running, self.index, axis=axis)
+                 - (1 - frac) * np.take(image, self.index, axis=axis))
+        return np.diff(below, axis=axis) * self.scale
+
+
+class FrameConverter:
+    """Decoded RGB frame -> matrix frame, for one source geometry"""
+
+    def __init__(self, width: int, height: int, layout: PixelLayout = None):
+        self.width = width
+        self.height = height
+        self.layout = layout
+        if layout is not None:
+            # Rows are universes: copy them into the stream the layout gathers from
+            self.stream = np.zeros((layout.stream_pixels + 1, 3), dtype=np.uint8)
+            universes = self.stream[:-1].reshape(layout.num_universes, layout.leds_per_universe, 3)
+            first = min(layout.first_universe, height)
+            rows = min(height - first, layout.num_universes)
+            columns = min(width, layout.leds_per_universe)
+            self.source_rows = slice(first, first + rows)
+            self.source_columns = slice(0, columns)
+            self.stream_view = universes[:rows, :columns]
+        else:
+            self.resize_x = AxisResampler(width, MATRIX_WIDTH) if width != MATRIX_WIDTH else None
+            self.resize_y = AxisResampler(height, MATRIX_HEIGHT) if height != MATRIX_HEIGHT else None
+
+    def convert(self, source: np.ndarray, out: np.ndarray):
+        """Convert a (height, width, 3) uint8 frame into out, FRAME_SIZE bytes"""
+        if self.layout is not None:
+            self.stream_view[:] = source[self.source_rows, self.source_columns]
+            self.layout.remap(self.stream, out)
+            return
+
+        image = source
+        if self.resize_x:
+            image = self.resize_x(image, axis=1)
+        if self.resize_y:
+            image = self.resize_y(image, axis=0)
+        if image is source:
+            out[:] = source.reshape(-1)
+        else:
+            np.copyto(out.reshape(MATRIX_HEIGHT, MATRIX_WIDTH, 3), np.rint(image), casting='unsafe')
+
+
+def probe_video(path: str, ffprobe: str = "ffprobe") -> dict:
+    """Width, height, frame rate and frame count of the first video stream"""
+    command = [ffprobe, "-v", "error", "-select_streams", "v:0", "-show_entries",
+               "stream=width,height,avg_frame_rate,r_frame_rate,nb_frames,duration",
+               "-of", "json", path]
+    stream = json.loads(subprocess.run(command, capture_output=True, check=True, text=True).stdout)["streams"][0]
+
+    rate = stream.get("avg_frame_rate", "0/0")
+    if rate in ("0/0", "0/1"):
+        rate = stream["r_frame_rate"]
+    numerator, denominator = rate.split("/")
+    fps = int(numerator) / int(denominator)
+
+    frames = stream.get("nb_frames")
+    if not frames or frames == "N/A":
+        # Not in the container header, count the packets instead (demux only, no decoding)
+        command = [ffprobe, "-v", "error", "-select_streams", "v:0", "-count_packets",
+                   "-show_entries", "stream=nb_read_packets", "-of", "csv=p=0", path]
+        frames = subprocess.run(command, capture_output=True, check=True, text=True).stdout.strip().rstrip(",")
+    return {"width": int(stream["width"]), "height": int(stream["height"]), "fps": fps, "frames": int(frames)}
+
+
+# Per-process state of the pool workers, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(path: str, ffmpeg: str, width: int, height: int, fps: float, usec: int,
+                 layout: PixelLayout):
+    _worker.update(path=path, ffmpeg=ffmpeg, width=width, height=height, fps=fps,
+                   header=np.frombuffer(pack_frame_header(NUM_PIXELS, usec), dtype=np.uint8),
+                   converter=FrameConverter(width, height, layout))
+
+
+def encode_segment(start: int, count: int) -> np.ndarray:
+    """Decode frames start..start+count-1 and return them as output.bin records
+
+    Returns a (frames, RECORD_SIZE) uint8 array; fewer than count rows if
+    the video ended early.
+    """
+    w = _worker
+    frame_size = w["width"] * w["height"] * 3
+    # Seek half a frame early so rounding can't skip the first frame of the segment
+    seek = max(0.0, (start - 0.5) / w["fps"])
+    command = [w["ffmpeg"], "-v", "error", "-nostdin", "-threads", "1", "-ss", f"{seek:.6f}",
+               "-i", w["path"], "-map", "0:v:0", "-frames:v", str(count),
+               "-f", "rawvideo", "-pix_fmt", "rgb24", "-"]
+
+    records = np.empty((count, RECORD_SIZE), dtype=np.uint8)
+    records[:, :HEADER_SIZE] = w["header"]
+    source = np.empty((w["height"], w["width"], 3), dtype=np.uint8)
+    source_view = memoryview(source).cast('B')
+    converter = w["converter"]
+
+    frames = 0
+    with subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=frame_size) as decoder:
+        while frames < count:
+            received = 0
+            while received < frame_size:
+                n = decoder.stdout.readinto(source_view[received:])
+                if not n:
+                    break
+                received += n
+            if received < frame_size:
+                break
+            converter.convert(source, records[frames, HEADER_SIZE:])
+            frames += 1
+        decoder.stdout.close()
+    # Closing the pipe early can make ffmpeg exit with an error, only a short read counts
+    if frames < count and decoder.returncode:
+        raise subprocess.CalledProcessError(decoder.returncode, command)
+    return records[:frames]
+
+
+def encode_video(path: str, output: str, info: dict, usec: int, layout: PixelLayout = None,
+                 workers: int = None, segment_frames: int = DEFAULT_SEGMENT_FRAMES,
+                 ffmpeg: str = "ffmpeg") -> int:
+    """Write output.bin for a probed video, returns the number of frames written"""
+    workers = workers or os.cpu_count() or 1
+    segments = [(start, min(segment_frames, info["frames"] - start))
+                for start in range(0, info["frames"], segment_frames)]
+    pending = {}
+    next_submit = 0
+    written = 0
+    started = time.perf_counter()
+    temp_path = output + ".part"
+
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(path, ffmpeg, info["width"], info["height"], info["fps"],
+                                           usec, layout)) as pool, \
+                open(temp_path, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+            for index in range(len(segments)):
+                # Keep a bounded window of segments in flight, written strictly in order
+                while next_submit < len(segments) and next_submit < index + workers * SEGMENTS_PER_WORKER:
+                    pending[next_submit] = pool.submit(encode_segment, *segments[next_submit])
+                    next_submit += 1
+                records = pending.pop(index).result()
+                f.write(memoryview(records).cast('B'))
+                written += len(records)
+
+                elapsed = time.perf_counter() - started
+                rate = written / max(elapsed, 1e-9)
+                remaining = (info["frames"] - written) / max(rate, 1e-9)
+                print(f"\r{written}/{info['frames']} frames, {rate:.0f} fps, {remaining:.0f}s left ",
+                      end="", flush=True)
+            f.write(pack_end_marker(NUM_PIXELS, usec))
+    except BaseException:
+        for future in pending.values():
+            future.cancel()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    os.replace(temp_path, output)
+    print()
+    return written
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Encode a video into output.bin for videosdcard-smartmatrix-5panel.ino")
+    parser.add_argument("video", help="video file, anything ffmpeg can decode")
+    parser.add_argument("--output", "-o", default="output.bin",
+                        help="file to write (default: %(default)s)")
+    parser.add_argument("--fps", type=float,
+                        help="playback rate stored in the file (default: the video's frame rate)")
+    parser.add_argument("--universes", action="store_true",
+                        help="video rows are Art-Net universes of 170 pixels, map them with --layout")
+    parser.add_argument("--layout", default=str(DEFAULT_PRESET), metavar="PRESET",
+                        help="Resolume Advanced Output preset for --universes (default: the cube map)")
+    parser.add_argument("--no-layout", action="store_true",
+                        help="with --universes, fill the matrix with universes in order")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="worker processes (default: %(default)s)")
+    parser.add_argument("--segment-frames", type=int, default=DEFAULT_SEGMENT_FRAMES,
+                        help="frames per work item (default: %(default)s)")
+    parser.add_argument("--ffmpeg", default="ffmpeg", help="ffmpeg executable (default: %(default)s)")
+    parser.add_argument("--ffprobe", default="ffprobe", help="ffprobe executable (default: %(default)s)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        info = probe_video(args.video, args.ffprobe)
+    except (OSError, subprocess.CalledProcessError, KeyError, IndexError, ValueError) as e:
+        print(f"Could not read {args.video}: {e}")
+        return 1
+
+    fps = args.fps or info["fps"]
+    try:
+        usec = frame_usec(fps)
+    except SdcardFormatError as e:
+        print(e)
+        return 1
+
+    layout = None
+    if args.universes:
+        if args.no_layout:
+            layout = PixelLayout.linear(NUM_PIXELS, LEDS_PER_UNIVERSE)
+        else:
+            try:
+                layout = load_layout(args.layout, MATRIX_WIDTH, MATRIX_HEIGHT, LEDS_PER_UNIVERSE)
+            except (OSError, ET.ParseError, LayoutError) as e:
+                print(f"Could not load layout {args.layout}: {e}")
+                print("Use --no-layout to fill the matrix with universes in order")
+                return 1
+
+    print(f"Video: {args.video}, {info['width']}x{info['height']}, {info['fps']:g} fps, {info['frames']} frames")
+    if layout is not None:
+        print(f"Source: universes, layout {layout.name} ({'linear' if layout.is_identity else 'remapped'})")
+    else:
+        print(f"Source: video, resized to {MATRIX_WIDTH}x{MATRIX_HEIGHT}")
+    print(f"Output: {args.output}, {fps:g} fps ({usec} us per frame), "
+          f"{info['frames'] * RECORD_SIZE / 1e6:.0f} MB")
+    print(f"Workers: {args.workers}\n")
+
+    started = time.perf_counter()
+    try:
+        frames = encode_video(args.video, args.output, info, usec, layout, args.workers,
+                              args.segment_frames, args.ffmpeg)
+    except KeyboardInterrupt:
+        print("\nStopped, output not written")
+        return 1
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"\nEncoding failed: {e}")
+        return 1
+
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {frames} frames to {args.output} in {elapsed:.1f}s ({frames / max(elapsed, 1e-9):.0f} fps)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
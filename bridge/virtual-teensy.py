@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Virtual Teensy
+Stands in for a Teensy running smartmatrix-serial-5panel.ino on a Linux
+pseudo-terminal, so the bridge can be measured without hardware
+
+Usage:
+    python virtual-teensy.py [options]
+
+Examples:
+    python virtual-teensy.py
+    python virtual-teensy.py --link /tmp/ttyTEENSY --bandwidth 12 --show-fps
+    python artnet-to-serial-sender.py /tmp/ttyTEENSY
+
+OPC messages are parsed byte for byte like the firmware's loop(): the
+4-byte header, the 16-bit expected length, "Invalid OPC frame" for
+messages it would reject and "OPC buffer overflow, resetting" when a
+message doesn't fit in opcBuffer. The firmware's INFO:, STATUS: and PERF:
+lines are written back to the host and echoed here.
+
+--bandwidth limits how fast bytes are taken off the link and
+--process-us / --blit-us stall reading while a frame is "drawn", so the
+host sees the same back pressure it would from the real device.
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+import tty
+
+from opc_protocol import (OPC_COMMAND_SET_PIXELS, OPC_COMMAND_SET_PIXELS_DELTA,
+                          OPC_COMMAND_SET_PIXELS_RLE, OPC_COMMAND_SET_OPTIONS, OPTION_HOST_COLOR,
+                          OPTION_TELEMETRY, OPTION_ACK, apply_delta, decode_rle)
+
+# Matrix configuration (must match Teensy code)
+MATRIX_WIDTH = 64
+PANEL_HEIGHT = 64
+MATRIX_HEIGHT = 64*5       # kMatrixHeight, panels 4-5 mirror panels 1-2
+MEMORY_HEIGHT = 64*3       # drawingMemoryHeight
+NUM_LEDS = MATRIX_WIDTH * MATRIX_HEIGHT
+
+FIRMWARE_VERSION = "2025.10"
+READ_SIZE = 65536
+SUMMARY_INTERVAL = 5.0
+
+# Rough Teensy 4.1 timings for updateLeds() with the default enhancements
+# and for the plain blit used with host color processing
+DEFAULT_PROCESS_US = 4000
+DEFAULT_BLIT_US = 800
+
+
+class VirtualTeensy:
+    """The OPC side of smartmatrix-serial-5panel.ino, fed from a pty"""
+
+    def __init__(self, bandwidth: float = 0, process_us: int = DEFAULT_PROCESS_US,
+                 blit_us: int = DEFAULT_BLIT_US, show_fps: bool = False, show_timing: bool = False,
+                 memory_height: int = MEMORY_HEIGHT):
+        """bandwidth is in bytes per second, 0 means unlimited
+
+        memory_height is drawingMemoryHeight, the rows a frame carries.
+        """
+        self.bandwidth = bandwidth
+        self.process_time = process_us / 1e6
+        self.blit_time = blit_us / 1e6
+        self.show_fps = show_fps
+        self.show_timing = show_timing
+
+        self.master = None
+        self.slave = None
+        self.path = None
+
+        # Firmware state
+        self.frame_size = MATRIX_WIDTH * memory_height * 3
+        self.opc_buffer_size = 4 + self.frame_size
+        self.opc_buffer = bytearray(self.opc_buffer_size)
+        self.opc_view = memoryview(self.opc_buffer)
+        self.opc_buffer_pos = 0
+        self.current_frame = bytearray(self.frame_size)
+        self.has_keyframe = False
+        self.host_color = False
+        self.telemetry = False
+        self.ack_frames = False
+        self.frame_count = 0
+        self.frame_ms = 0
+
+        # Link model and statistics
+        self.link_time = 0.0
+        self.start_time = time.monotonic()
+        self.message_start = None
+        self.bytes_received = 0
+        self.invalid_frames = 0
+        self.overflows = 0
+        self.lines_dropped = 0
+        self.receive_time_total = 0.0
+        self.receive_time_max = 0.0
+
+    def open(self) -> str:
+        """Create the pseudo-terminal, returns the path the host should open"""
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        # Keeping the slave open means reads don't fail while no host is connected
+        os.set_blocking(self.master, True)
+        self.path = os.ttyname(self.slave)
+        return self.path
+
+    def close(self):
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                os.close(fd)
+        self.master = self.slave = None
+
+    def millis(self) -> int:
+        return int((time.monotonic() - self.start_time) * 1000)
+
+    def println(self, line: str = ""):
+        """Serial.print to the host; like USB serial, output is dropped when nobody reads it"""
+        print(line)
+        data = (line + "\r\n").encode()
+        try:
+            os.set_blocking(self.master, False)
+            os.write(self.master, data)
+        except BlockingIOError:
+            self.lines_dropped += 1
+        finally:
+            os.set_blocking(self.master, True)
+
+    def setup(self):
+        """The lines setup() prints"""
+        self.println(f"INFO:   Version: {FIRMWARE_VERSION}")
+        self.println(f"INFO:   Matrix dimensions: {MATRIX_WIDTH}x{MATRIX_HEIGHT} pixels ")
+        self.println(f"INFO:   Expected OPC data size: {4 + NUM_LEDS * 3} bytes per frame")
+        self.println(f"INFO:   Virtual device on {self.path}")
+        self.println()
+        self.println("SmartMatrix initialized")
+        self.println("STATUS: Listening for OPC data on Serial port.")
+
+    def run(self):
+        """Read from the pty until interrupted"""
+        last_summary = time.monotonic()
+        while True:
+            try:
+                data = os.read(self.master, READ_SIZE)
+            except OSError:
+                break
+            if not data:
+                break
+            now = time.monotonic()
+            self._pace(len(data), now)
+            self.receive(data)
+
+            if now - last_summary >= SUMMARY_INTERVAL:
+                self.print_summary()
+                last_summary = now
+
+    def _pace(self, nbytes: int, now: float):
+        """Hold reading back to the modelled link bandwidth"""
+        self.bytes_received += nbytes
+        if not self.bandwidth:
+            return
+        self.link_time = max(self.link_time, now) + nbytes / self.bandwidth
+        if self.link_time > now:
+            time.sleep(self.link_time - now)
+
+    def receive(self, data: bytes):
+        """loop(): feed bytes through the OPC parser"""
+        pos = 0
+        size = len(data)
+        while pos < size:
+            if self.opc_buffer_pos >= self.opc_buffer_size:
+                # Buffer overflow - the byte that didn't fit is lost
+                self.println("OPC buffer overflow, resetting")
+                self.overflows += 1
+                self.opc_buffer_pos = 0
+                self.message_start = None
+                pos += 1
+                continue
+
+            if self.opc_buffer_pos == 0 and self.message_start is None:
+                self.message_start = time.monotonic()
+
+            if self.opc_buffer_pos < 4:
+                take = min(4 - self.opc_buffer_pos, size - pos)
+            else:
+                take = min(self._expected_size() - self.opc_buffer_pos, self.opc_buffer_size - self.opc_buffer_pos,
+                           size - pos)
+            if take > 0:
+                self.opc_view[self.opc_buffer_pos:self.opc_buffer_pos + take] = data[pos:pos + take]
+                self.opc_buffer_pos += take
+                pos += take
+
+            if self.opc_buffer_pos >= 4 and self.opc_buffer_pos >= self._expected_size():
+                self._handle_message()
+                self.opc_buffer_pos = 0
+
+    def _expected_size(self) -> int:
+        # uint16_t in the firmware, so a huge length wraps around
+        length, = struct.unpack_from('>H', self.opc_buffer, 2)
+        return (4 + length) & 0xFFFF
+
+    def _handle_message(self):
+        handled = time.perf_counter()
+        command = self.opc_buffer[1]
+        length, = struct.unpack_from('>H', self.opc_buffer, 2)
+        payload = self.opc_view[4:4 + length]
+
+        received = time.monotonic() - self.message_start
+        self.message_start = None
+
+        if command == OPC_COMMAND_SET_OPTIONS:
+            if length >= 1:
+                self.host_color = bool(payload[0] & OPTION_HOST_COLOR)
+                self.telemetry = bool(payload[0] & OPTION_TELEMETRY)
+                self.ack_frames = bool(payload[0] & OPTION_ACK)
+                self.println(f"STATUS: host color processing {'on' if self.host_color else 'off'}")
+                self.println(f"STATUS: telemetry {'on' if self.telemetry else 'off'}, "
+                             f"frame acks {'on' if self.ack_frames else 'off'}")
+            return
+
+        if not self._decode_frame(command, length, payload):
+            self.invalid_frames += 1
+            self.println(f"Invalid OPC frame: cmd={command}, length={length} "
+                         f"(expected {self.frame_size}, keyframe {'yes' if self.has_keyframe else 'no'})")
+            return
+
+        self.frame_count += 1
+        self.receive_time_total += received
+        self.receive_time_max = max(self.receive_time_max, received)
+
+        # updateLeds(): nothing is read from the link meanwhile
+        begin = time.perf_counter()
+        time.sleep(self.blit_time if self.host_color else self.process_time)
+        if self.show_timing or self.telemetry:
+            self.println(f"PERF:   elapsed microseconds: {int((time.perf_counter() - begin) * 1e6)} ")
+        if self.ack_frames:
+            self.println(f"ACK {self.frame_count} {int((time.perf_counter() - handled) * 1e6)}")
+        if self.show_fps or self.telemetry:
+            self._print_fps()
+
+    def _decode_frame(self, command: int, length: int, payload) -> bool:
+        """decodeFrame()"""
+        if command == OPC_COMMAND_SET_PIXELS and length == self.frame_size:
+            self.current_frame[:] = payload
+            self.has_keyframe = True
+            return True
+
+        if command == OPC_COMMAND_SET_PIXELS_RLE:
+            self.has_keyframe = decode_rle(self.current_frame, payload)
+            return self.has_keyframe
+
+        if command == OPC_COMMAND_SET_PIXELS_DELTA and self.has_keyframe:
+            if apply_delta(self.current_frame, payload):
+                return True
+            self.has_keyframe = False
+
+        return False
+
+    def _print_fps(self):
+        """printFps()"""
+        if self.frame_count % 100 == 0:
+            now = self.millis()
+            if self.frame_ms > 0 and now > self.frame_ms:
+                fps = 100000. / (now - self.frame_ms)
+                self.println(f"PERF:   {fps:.2f} fps, frame count: {self.frame_count}")
+            self.frame_ms = now
+
+    def print_summary(self):
+        """Throughput and frame statistics, on the console only"""
+        elapsed = max(time.monotonic() - self.start_time, 1e-9)
+        receive_avg = self.receive_time_total / self.frame_count * 1000 if self.frame_count else 0
+        print(f"Summary: {self.frame_count} frames ({self.frame_count / elapsed:.1f} fps), "
+              f"{self.bytes_received / elapsed / 1e6:.2f} MB/s, "
+              f"{self.invalid_frames} invalid, {self.overflows} overflows, "
+              f"receive {receive_avg:.2f} ms avg / {self.receive_time_max * 1000:.2f} ms max")
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Pseudo-terminal stand-in for a Teensy running smartmatrix-serial-5panel.ino")
+    parser.add_argument("--link", metavar="PATH",
+                        help="also make the device available as a symlink at PATH")
+    parser.add_argument("--bandwidth", type=float, default=0,
+                        help="link bandwidth in Mbit/s, 0 for unlimited (default: %(default)s)")
+    parser.add_argument("--process-us", type=int, default=DEFAULT_PROCESS_US,
+                        help="microseconds to process a frame on the device (default: %(default)s)")
+    parser.add_argument("--blit-us", type=int, default=DEFAULT_BLIT_US,
+                        help="microseconds to draw a frame with host color processing (default: %(default)s)")
+    parser.add_argument("--panels", type=int, default=MEMORY_HEIGHT // PANEL_HEIGHT,
+                        help="panel rows a frame carries, drawingMemoryHeight in panels; set it to the rows "
+                             "the bridge's --outputs gives this device (default: %(default)s)")
+    parser.add_argument("--show-fps", action="store_true",
+                        help="print PERF fps lines like showFps in the firmware")
+    parser.add_argument("--show-timing", action="store_true",
+                        help="print PERF elapsed lines like showTiming in the firmware")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not sys.platform.startswith("linux"):
+        print("The virtual Teensy needs Linux pseudo-terminals")
+        return
+
+    device = VirtualTeensy(bandwidth=args.bandwidth * 1e6 / 8, process_us=args.process_us,
+                           blit_us=args.blit_us, show_fps=args.show_fps, show_timing=args.show_timing,
+                           memory_height=args.panels * PANEL_HEIGHT)
+    path = device.open()
+    if args.link:
+        if os.path.islink(args.link):
+            os.unlink(args.link)
+        os.symlink(path, args.link)
+        path = args.link
+
+    print(f"\nVirtual Teensy on {path}")
+    print(f"Link: {f'{args.bandwidth:g} Mbit/s' if args.bandwidth else 'unlimited'}, "
+          f"frame processing {args.process_us} us ({args.blit_us} us with host color)")
+    print("Press Ctrl+C to stop\n")
+
+    try:
+        device.setup()
+        device.run()
+    except KeyboardInterrupt:
+        print("\nStopping virtual Teensy...")
+    finally:
+        device.print_summary()
+        device.close()
+        if args.link and os.path.islink(args.link):
+            os.unlink(args.link)
+
+if __name__ == "__main__":
+    main()
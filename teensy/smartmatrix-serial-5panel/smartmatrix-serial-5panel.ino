@@ -73,6 +73,9 @@ float colorBoostFactor = 1.2;           // Color saturation multiplier
 const uint16_t kMatrixWidth = 64;       // Set to the width of your display, must be a multiple of 8
 const uint16_t kMatrixHeight = 64*5;      // Set to the height of your display
 const uint16_t drawingMemoryHeight = 64*3; // reading less memory from the SD card (3 panels worth)
+// Rows past drawingMemoryHeight repeat the drawing area from the top. When the
+// bridge fans out over several Teensys (--outputs), set drawingMemoryHeight to
+// the panel rows this Teensy is given so it shows its own band.
 const uint8_t kRefreshDepth = 36;       // Higher refresh depth for better color quality at high refresh rates. 36 is typically good, drop down to 24 if you need to.  On Teensy, multiples of 3, up to 48: 3, 6, 9, 12, 15, 18, 21, 24, 27, 30, 33, 36, 39, 42, 45, 48.  On ESP32: 24, 36, 48
 const uint8_t kDmaBufferRows = 4;       // known working: 2-4, use 2 to save RAM, more to keep from dropping frames and automatically lowering refresh rate.  (This isn't used on ESP32, leave as default)
 const uint8_t kPanelType = SM_PANELTYPE_HUB75_32ROW_MOD16SCAN;   // Choose the configuration that matches your panels.  See more details in MatrixCommonHub75.h and the docs: https://github.com/pixelmatix/SmartMatrix/wiki
@@ -90,9 +93,23 @@ byte timeOffset = 0;
 namespace Networking {
 
   // OPC (Open Pixel Control) protocol variables
+  // Commands: 0 = set pixels (full frame), 0x10 = set pixels delta, see applyDelta(),
+  // 0x11 = run-length encoded full frame, see decodeRle(),
+  // 0x20 = set options, one flags byte, see setOptions()
+  const uint8_t OPC_COMMAND_SET_PIXELS = 0;
+  const uint8_t OPC_COMMAND_SET_PIXELS_DELTA = 0x10;
+  const uint8_t OPC_COMMAND_SET_PIXELS_RLE = 0x11;
+  const uint8_t OPC_COMMAND_SET_OPTIONS = 0x20;
+  const uint8_t OPTION_HOST_COLOR = 0x01;  // frames arrive color processed, display them as-is
+  const uint8_t OPTION_TELEMETRY = 0x02;   // report fps and frame timing, as showFps and showTiming do
+  const uint8_t OPTION_ACK = 0x04;         // acknowledge every frame once it is on screen
   static uint8_t opcBuffer[4 + (numLedsMemory * 3)]; // 4-byte header + pixel data
   static int opcBufferPos = 0;
   static bool opcFrameReady = false;
+  static bool hasKeyframe = false;  // deltas need a full frame to apply to
+  static bool hostColorProcessing = false;  // set by the bridge with OPTION_HOST_COLOR
+  static bool telemetry = false;            // set by the bridge with OPTION_TELEMETRY
+  static bool ackFrames = false;            // set by the bridge with OPTION_ACK
   static uint32_t frameCount = 0;
   static uint32_t _frameMs = 0;
 
@@ -169,21 +186,34 @@ namespace Networking {
     return (uint8_t)constrain(dithered, 0, 255);
   }
 
+  // Draw currentFrame without any processing, for frames the host already
+  // interpolated, color corrected and dithered
+  void blitFrame() {
+    for (int led = 0; led < numLeds; led++) {
+      uint16_t x = led % kMatrixWidth;
+      uint16_t y = led / kMatrixWidth;
+      // Panels 4-5 mirror panels 1-2
+      int sourcePixel = (y % drawingMemoryHeight) * kMatrixWidth + x;
+      backgroundLayer.drawPixel(x, y, rgb24(currentFrame[sourcePixel * 3],
+                                            currentFrame[sourcePixel * 3 + 1],
+                                            currentFrame[sourcePixel * 3 + 2]));
+    }
+  }
+
   void updateLeds() {
+    if (hostColorProcessing) {
+      blitFrame();
+      return;
+    }
+
     // Initialize gamma LUT if needed
     if (enableGammaCorrection && !gammaLUTInitialized) {
       initializeGammaLUT();
     }
 
-    // Process OPC frame data (skip 4-byte header)
-    uint8_t *pixelData = &opcBuffer[4];
+    // currentFrame already holds the decoded frame, see decodeFrame()
     uint32_t currentTime = millis();
 
-    // Copy new frame data and apply initial processing
-    for (int i = 0; i < numLedsMemory * 3; i++) {
-      currentFrame[i] = pixelData[i];
-    }
-
     // Calculate interpolation factor for smooth motion
     float interpAlpha = 1.0;
     if (enableFrameInterpolation && hasPreviousFrame) {
@@ -206,15 +236,8 @@ namespace Networking {
       // Panel 1: y=0-63,   Panel 2: y=64-127,  Panel 3: y=128-191
       // Panel 4: y=192-255, Panel 5: y=256-319
 
-      uint16_t sourceY;
-
-      if (y < 192) {
-        // Panels 1-3: Use original data
-        sourceY = y;
-      } else {
-        // Panels 4-5: Mirror panels 1-2
-        sourceY = y - 192;
-      }
+      // Panels 1-3 use the original data, panels 4-5 mirror panels 1-2
+      uint16_t sourceY = y % drawingMemoryHeight;
 
       int sourcePixel = sourceY * kMatrixWidth + x;
       uint8_t r = currentFrame[sourcePixel * 3];
@@ -255,6 +278,99 @@ namespace Networking {
     }
   }
 
+  // Set-options message from the bridge: [flags]
+  void setOptions(const uint8_t *data, uint16_t length) {
+    if (length < 1) {
+      return;
+    }
+    hostColorProcessing = data[0] & OPTION_HOST_COLOR;
+    telemetry = data[0] & OPTION_TELEMETRY;
+    ackFrames = data[0] & OPTION_ACK;
+    // Interpolation would otherwise blend from a frame processed the other way
+    hasPreviousFrame = false;
+    Serial.printf("STATUS: host color processing %s\n", hostColorProcessing ? "on" : "off");
+    Serial.printf("STATUS: telemetry %s, frame acks %s\n", telemetry ? "on" : "off", ackFrames ? "on" : "off");
+  }
+
+  // Apply a delta frame to currentFrame. The payload is a list of spans:
+  // [start_hi][start_lo][count_hi][count_lo] followed by count RGB pixels,
+  // start and count in pixels. Returns false if the payload is malformed.
+  bool applyDelta(const uint8_t *data, uint16_t length) {
+    uint32_t pos = 0;
+    while (pos + 4 <= length) {
+      uint16_t start = (data[pos] << 8) | data[pos + 1];
+      uint16_t count = (data[pos + 2] << 8) | data[pos + 3];
+      pos += 4;
+      if ((uint32_t)start + count > numLedsMemory || pos + count * 3 > length) {
+        return false;
+      }
+      memcpy(&currentFrame[start * 3], &data[pos], count * 3);
+      pos += count * 3;
+    }
+    return pos == length;
+  }
+
+  // Decode a run-length encoded frame into currentFrame. Each chunk starts
+  // with a control byte: high bit set = the next RGB pixel repeated
+  // (control & 0x7F) + 1 times, high bit clear = (control + 1) literal RGB
+  // pixels follow. Returns false unless the payload fills the frame exactly.
+  bool decodeRle(const uint8_t *data, uint16_t length) {
+    uint32_t pos = 0;
+    uint32_t pixel = 0;
+    while (pos < length) {
+      uint8_t control = data[pos++];
+      uint16_t count = (control & 0x7F) + 1;
+      if (pixel + count > numLedsMemory) {
+        return false;
+      }
+      if (control & 0x80) {
+        if (pos + 3 > length) {
+          return false;
+        }
+        for (uint16_t i = 0; i < count; i++) {
+          memcpy(&currentFrame[(pixel + i) * 3], &data[pos], 3);
+        }
+        pos += 3;
+      } else {
+        if (pos + count * 3 > length) {
+          return false;
+        }
+        memcpy(&currentFrame[pixel * 3], &data[pos], count * 3);
+        pos += count * 3;
+      }
+      pixel += count;
+    }
+    return pixel == numLedsMemory;
+  }
+
+  // Decode the OPC message in opcBuffer into currentFrame.
+  // Returns false if the frame is invalid and should not be displayed.
+  bool decodeFrame(uint8_t command, uint16_t length) {
+    uint8_t *pixelData = &opcBuffer[4];
+
+    if (command == OPC_COMMAND_SET_PIXELS && length == (numLedsMemory * 3)) {
+      memcpy(currentFrame, pixelData, numLedsMemory * 3);
+      hasKeyframe = true;
+      return true;
+    }
+
+    if (command == OPC_COMMAND_SET_PIXELS_RLE) {
+      // A bad frame leaves currentFrame half written, so deltas must wait
+      hasKeyframe = decodeRle(pixelData, length);
+      return hasKeyframe;
+    }
+
+    if (command == OPC_COMMAND_SET_PIXELS_DELTA && hasKeyframe) {
+      if (applyDelta(pixelData, length)) {
+        return true;
+      }
+      // Partially applied, wait for the next keyframe
+      hasKeyframe = false;
+    }
+
+    return false;
+  }
+
   // https://www.arduino.cc/reference/en/libraries/ethernet/
   void setup()
   {
@@ -299,9 +415,14 @@ namespace Networking {
 
           // Check if we have a complete frame
           if (opcBufferPos >= expectedFrameSize) {
-            // Validate the frame
-            if (command == 0 && length == (numLedsMemory * 3)) {
-              // Valid OPC frame with correct pixel count
+            uint32_t receivedTime = micros();
+            // Options aren't a frame, nothing to display
+            if (command == OPC_COMMAND_SET_OPTIONS) {
+              setOptions(&opcBuffer[4], length);
+            }
+            // Validate and decode the frame
+            else if (decodeFrame(command, length)) {
+              // Valid OPC frame
               opcFrameReady = true;
               frameCount++;
 
@@ -311,7 +432,7 @@ namespace Networking {
               }
 
               // Process the frame
-              if (showTiming) {
+              if (showTiming || telemetry) {
                 uint32_t beginTime = micros();
                 updateLeds();
                 uint32_t elapsedTime = micros() - beginTime;
@@ -323,14 +444,18 @@ namespace Networking {
               // Update display
               backgroundLayer.swapBuffers();
 
-              if (showFps) {
+              if (ackFrames) {
+                Serial.printf("ACK %lu %lu\n", frameCount, micros() - receivedTime);
+              }
+
+              if (showFps || telemetry) {
                 printFps();
               }
 
               opcFrameReady = false;
             } else {
-              Serial.printf("Invalid OPC frame: cmd=%d, length=%d (expected %d)\n",
-                           command, length, numLedsMemory * 3);
+              Serial.printf("Invalid OPC frame: cmd=%d, length=%d (expected %d, keyframe %s)\n",
+                           command, length, numLedsMemory * 3, hasKeyframe ? "yes" : "no");
             }
 
             // Reset buffer for next frame